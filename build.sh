@@ -10,6 +10,9 @@ curl -sLO https://github.com/tailwindlabs/tailwindcss/releases/download/v3.4.1/t
 chmod +x tailwindcss-linux-x64
 ./tailwindcss-linux-x64 -i ./static/css/input.css -o ./static/css/output.css --minify
 
+echo "🖼️ Génération des miniatures..."
+python manage.py build_thumbnails
+
 echo "📦 Collecte des fichiers statiques..."
 python manage.py collectstatic --noinput
 
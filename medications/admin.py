@@ -1,21 +1,89 @@
 from django.contrib import admin
-from .models import Category, Medication, StockMovement
+from pharmanps_alou.large_tables import LargeTableAdminMixin
+from . import striping
+from .models import Category, Medication, StockMovement, StockReservation, StockStripe, ReorderSuggestion, MovementMonthlyRollup, MovementArchive
+from .stock import write_off_expired
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'description', 'created_at')
     search_fields = ('name',)
 
+class StockStripeInline(admin.TabularInline):
+    model = StockStripe
+    fields = ('index', 'quantity')
+    readonly_fields = ('index', 'quantity')
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Medication)
 class MedicationAdmin(admin.ModelAdmin):
-    list_display = ('name', 'dci', 'category', 'form', 'dosage', 'quantity', 'selling_price', 'expiry_date')
-    list_filter = ('category', 'form', 'requires_prescription')
+    list_display = ('name', 'dci', 'category', 'form', 'dosage', 'quantity', 'stripe_count', 'selling_price', 'expiry_date')
+    list_filter = ('low_stock', 'category', 'form', 'requires_prescription')
+    list_select_related = ('category',)
     search_fields = ('name', 'dci')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'stripe_count')
+    inlines = [StockStripeInline]
+    actions = ['sweep_expired', 'enable_striping', 'disable_striping']
+
+    @admin.action(description="Retirer le stock périmé des médicaments sélectionnés")
+    def sweep_expired(self, request, queryset):
+        count, units = write_off_expired(queryset, user=request.user)
+        self.message_user(request, f"{count} médicament(s) périmé(s) retiré(s) du stock ({units} unité(s)).")
+
+    @admin.action(description=f"Stock en bandes ({striping.DEFAULT_STRIPES}) : activer pour les médicaments très vendus sélectionnés")
+    def enable_striping(self, request, queryset):
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+        for pk in ids:
+            striping.enable(pk)
+        self.message_user(request, f"{len(ids)} médicament(s) en {striping.DEFAULT_STRIPES} bandes de stock.")
+
+    @admin.action(description="Stock en bandes : désactiver pour les médicaments sélectionnés")
+    def disable_striping(self, request, queryset):
+        ids = list(queryset.filter(stripe_count__gt=0).order_by('pk').values_list('pk', flat=True))
+        for pk in ids:
+            striping.disable(pk)
+        self.message_user(request, f"{len(ids)} médicament(s) ramené(s) à une seule ligne de stock.")
 
 @admin.register(StockMovement)
-class StockMovementAdmin(admin.ModelAdmin):
+class StockMovementAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('medication', 'movement_type', 'quantity', 'reason', 'reference', 'created_at', 'created_by')
-    list_filter = ('movement_type', 'medication')
+    list_filter = ('movement_type',)
+    list_select_related = ('medication', 'created_by')
     search_fields = ('medication__name', 'reason', 'reference')
     readonly_fields = ('created_at',)
+    autocomplete_fields = ('medication',)
+    raw_id_fields = ('created_by',)
+    date_hierarchy = 'created_at'
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('medication', 'quantity', 'cart', 'created_by', 'created_at', 'expires_at')
+    list_select_related = ('medication', 'created_by')
+    search_fields = ('medication__name', 'cart')
+    readonly_fields = ('cart', 'medication', 'quantity', 'created_by', 'created_at', 'expires_at')
+
+@admin.register(ReorderSuggestion)
+class ReorderSuggestionAdmin(admin.ModelAdmin):
+    list_display = ('medication', 'avg_daily_sales', 'days_of_cover', 'reorder_point', 'suggested_quantity', 'computed_at')
+    list_select_related = ('medication',)
+    search_fields = ('medication__name',)
+    autocomplete_fields = ('medication',)
+    readonly_fields = ('computed_at',)
+
+@admin.register(MovementMonthlyRollup)
+class MovementMonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('medication', 'month', 'movement_type', 'movements_count', 'quantity')
+    list_filter = ('movement_type',)
+    list_select_related = ('medication',)
+    search_fields = ('medication__name',)
+    autocomplete_fields = ('medication',)
+    date_hierarchy = 'month'
+
+@admin.register(MovementArchive)
+class MovementArchiveAdmin(admin.ModelAdmin):
+    list_display = ('month', 'path', 'row_count', 'first_id', 'last_id', 'created_at')
+    readonly_fields = ('month', 'path', 'row_count', 'first_id', 'last_id', 'created_at')
@@ -0,0 +1,196 @@
+"""
+Archivage de l'historique des mouvements de stock.
+
+Chaque ligne de vente écrit un StockMovement : la table grossit plus vite que
+les ventes. Les mois révolus (plus anciens que `keep_months`) sont sortis de
+la table, un mois à la fois et dans une transaction :
+
+- les mouvements sont écrits dans un segment JSONL compressé (gzip) sous
+  ARCHIVE_ROOT/movements/AAAA-MM/, relu et vérifié, puis référencé par une
+  ligne MovementArchive ;
+- leurs cumuls par (médicament, mois, type) sont ajoutés dans
+  MovementMonthlyRollup ;
+- puis ils sont supprimés de StockMovement.
+
+Rien n'est archivé tant qu'ARCHIVE_ROOT n'est pas défini explicitement
+(disque persistant) : les lignes supprimées n'existeraient plus que sur un
+disque éphémère.
+
+L'historique mensuel (monthly_history) lit les cumuls pour les mois archivés
+et agrège les mouvements encore en base pour les autres ; le détail d'un mois
+archivé n'est relu dans les segments qu'à la demande (read_archived).
+"""
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .constants import HISTORY_DAYS
+from .models import MovementArchive, MovementMonthlyRollup, StockMovement
+
+
+# Le moteur de réapprovisionnement relit HISTORY_DAYS jours de mouvements bruts
+MIN_KEEP_MONTHS = HISTORY_DAYS // 30 + 2
+
+INCOMING = ('entrée', 'retour', 'ajustement')   # même sens que StockMovement.save()
+FIELDS = ('id', 'medication_id', 'movement_type', 'quantity', 'reason', 'reference', 'created_at', 'created_by_id')
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Début et fin (exclue) du mois, en heure locale"""
+    start = timezone.make_aware(datetime(month.year, month.month, 1))
+    return start, timezone.make_aware(datetime.combine(add_months(month, 1), datetime.min.time()))
+
+
+def archive_root():
+    """Dossier des archives ; ImproperlyConfigured s'il n'est pas défini"""
+    if not settings.ARCHIVE_ROOT:
+        raise ImproperlyConfigured(
+            "ARCHIVE_ROOT n'est pas défini : indiquez un dossier sur un disque persistant avant d'archiver."
+        )
+    return settings.ARCHIVE_ROOT
+
+
+def verify_segment(path, ids):
+    """Relit un segment écrit et vérifie qu'il contient exactement les mouvements `ids`"""
+    with gzip.open(path, 'rt', encoding='utf-8') as segment:
+        stored = [json.loads(line)['id'] for line in segment]
+    if stored != ids:
+        raise OSError(f"Segment illisible ou incomplet : {path}")
+
+
+def archivable_months(keep_months):
+    """Mois (1er du mois) ayant encore des mouvements et plus anciens que `keep_months` mois"""
+    cutoff = add_months(timezone.localdate().replace(day=1), -keep_months)
+    oldest = StockMovement.objects.filter(created_at__lt=month_bounds(cutoff)[0]).aggregate(first=Min('created_at'))['first']
+    if oldest is None:
+        return []
+    month = timezone.localtime(oldest).date().replace(day=1)
+    months = []
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(month):
+    """
+    Archive les mouvements d'un mois. Retourne le nombre de mouvements archivés.
+    Le segment est écrit avant le commit et supprimé si la transaction échoue.
+    """
+    start, end = month_bounds(month)
+    with transaction.atomic():
+        movements = StockMovement.objects.filter(created_at__gte=start, created_at__lt=end)
+        rows = list(movements.order_by('id').values_list(*FIELDS))
+        if not rows:
+            return 0
+        first_id, last_id = rows[0][0], rows[-1][0]
+        relative = os.path.join('movements', f"{month:%Y-%m}", f"{first_id}-{last_id}.jsonl.gz")
+        path = os.path.join(archive_root(), relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        totals = {}
+        try:
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as segment:
+                for row in rows:
+                    record = dict(zip(FIELDS, row))
+                    record['created_at'] = record['created_at'].isoformat()
+                    segment.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    key = (record['medication_id'], record['movement_type'])
+                    count, quantity = totals.get(key, (0, 0))
+                    totals[key] = (count + 1, quantity + record['quantity'])
+            os.replace(path + '.tmp', path)
+            # Les lignes ne sont supprimées qu'une fois le segment relu
+            verify_segment(path, [row[0] for row in rows])
+
+            # Cumuls : ajoutés à ceux d'un éventuel archivage précédent du même mois
+            existing = {
+                (rollup.medication_id, rollup.movement_type): rollup
+                for rollup in MovementMonthlyRollup.objects.filter(month=month)
+            }
+            rollups = []
+            for (medication_id, movement_type), (count, quantity) in totals.items():
+                previous = existing.get((medication_id, movement_type))
+                rollups.append(MovementMonthlyRollup(
+                    medication_id=medication_id, month=month, movement_type=movement_type,
+                    movements_count=count + (previous.movements_count if previous else 0),
+                    quantity=quantity + (previous.quantity if previous else 0),
+                ))
+            MovementMonthlyRollup.objects.bulk_create(
+                rollups, batch_size=1000,
+                update_conflicts=True, unique_fields=['medication', 'month', 'movement_type'],
+                update_fields=['movements_count', 'quantity'],
+            )
+            MovementArchive.objects.create(
+                month=month, path=relative, row_count=len(rows), first_id=first_id, last_id=last_id,
+            )
+            movements.filter(id__lte=last_id).delete()
+        except BaseException:
+            for leftover in (path, path + '.tmp'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+    return len(rows)
+
+
+def archive_movements(keep_months=12):
+    """Archive tous les mois révolus plus anciens que `keep_months`. Retourne [(mois, mouvements)]."""
+    if keep_months < MIN_KEEP_MONTHS:
+        raise ValueError(f"Il faut garder au moins {MIN_KEEP_MONTHS} mois de mouvements (réapprovisionnement).")
+    archive_root()
+    return [(month, archive_month(month)) for month in archivable_months(keep_months)]
+
+
+def read_archived(month, medication_id=None):
+    """Mouvements bruts d'un mois archivé (dicts), relus dans ses segments"""
+    for archive in MovementArchive.objects.filter(month=month).order_by('first_id'):
+        with gzip.open(os.path.join(archive_root(), archive.path), 'rt', encoding='utf-8') as segment:
+            for line in segment:
+                record = json.loads(line)
+                if medication_id is None or record['medication_id'] == medication_id:
+                    record['created_at'] = datetime.fromisoformat(record['created_at'])
+                    yield record
+
+
+def monthly_history(medication, months=12):
+    """
+    Entrées et sorties mensuelles d'un médicament sur les `months` derniers
+    mois, du plus récent au plus ancien : cumuls pour les mois archivés,
+    agrégation des mouvements en base pour les autres.
+    """
+    since = add_months(timezone.localdate().replace(day=1), -(months - 1))
+    history = {}
+
+    def add(month, movement_type, count, quantity, archived):
+        line = history.setdefault(month, {'month': month, 'in': 0, 'out': 0, 'count': 0, 'archived': False})
+        line['in' if movement_type in INCOMING else 'out'] += quantity
+        line['count'] += count
+        line['archived'] |= archived
+
+    for rollup in MovementMonthlyRollup.objects.filter(medication=medication, month__gte=since):
+        add(rollup.month, rollup.movement_type, rollup.movements_count, rollup.quantity, True)
+
+    live = (
+        StockMovement.objects
+        .filter(medication=medication, created_at__gte=month_bounds(since)[0])
+        .annotate(month=TruncMonth('created_at'))
+        .values_list('month', 'movement_type')
+        .annotate(count=Count('id'), total=Sum('quantity'))
+        .order_by()
+    )
+    for month, movement_type, count, total in live:
+        add(timezone.localtime(month).date() if isinstance(month, datetime) else month, movement_type, count, total, False)
+
+    return sorted(history.values(), key=lambda line: line['month'], reverse=True)
@@ -0,0 +1,8 @@
+"""
+Constantes partagées sans dépendance lourde.
+
+medications.reorder charge NumPy ; les modules importés par les vues (archive,
+reporting) lisent leurs paramètres ici pour ne pas le charger au démarrage.
+"""
+
+HISTORY_DAYS = 90        # historique pris en compte par le réapprovisionnement
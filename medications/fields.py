@@ -0,0 +1,35 @@
+"""
+Champ image des médicaments, selon la configuration du stockage.
+
+- Cloudinary configuré (CLOUDINARY_ENABLED) : cloudinary.models.CloudinaryField,
+  l'image est envoyée à Cloudinary à l'enregistrement.
+- Sinon : LocalImageField, un ImageField sous MEDIA_ROOT ; le SDK Cloudinary
+  n'est alors jamais importé (démarrage des workers, commandes).
+
+Les deux champs ont la même colonne (varchar 255) et se déclarent sous le
+même chemin dans les migrations : celles-ci ne dépendent pas de la
+configuration, et makemigrations ne voit aucun changement d'un mode à l'autre.
+"""
+from django.conf import settings
+from django.db import models
+
+
+class LocalImageField(models.ImageField):
+    """ImageField local, interchangeable avec CloudinaryField dans les migrations"""
+
+    def __init__(self, verbose_name=None, folder='', **kwargs):
+        kwargs['max_length'] = 255
+        super().__init__(verbose_name, upload_to=folder, **kwargs)
+
+    def deconstruct(self):
+        name, _, args, kwargs = super().deconstruct()
+        kwargs.pop('upload_to', None)
+        return name, 'cloudinary.models.CloudinaryField', args, kwargs
+
+
+def image_field(*args, **kwargs):
+    """CloudinaryField si Cloudinary est configuré, LocalImageField sinon"""
+    if settings.CLOUDINARY_ENABLED:
+        from cloudinary.models import CloudinaryField
+        return CloudinaryField(*args, **kwargs)
+    return LocalImageField(*args, **kwargs)
@@ -0,0 +1,50 @@
+"""
+Archive les mouvements de stock des mois révolus plus anciens que
+--keep-months : segments JSONL compressés sous ARCHIVE_ROOT, cumuls mensuels
+par médicament conservés en base, lignes supprimées de StockMovement.
+Un mois à la fois, chacun dans sa transaction ; sans risque à relancer.
+Refuse de s'exécuter tant qu'ARCHIVE_ROOT (disque persistant) n'est pas défini.
+
+Usage :  python manage.py archive_movements [--keep-months 12] [--dry-run]
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from medications import archive
+from medications.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = "Archive les mouvements de stock anciens (segments compressés + cumuls mensuels)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=12, help="Mois gardés en base, mois en cours inclus (défaut : 12).")
+        parser.add_argument('--dry-run', action='store_true', help="Affiche ce qui serait archivé sans rien modifier.")
+
+    def handle(self, *args, **options):
+        keep_months = options['keep_months']
+        if keep_months < archive.MIN_KEEP_MONTHS:
+            raise CommandError(f"--keep-months doit valoir au moins {archive.MIN_KEEP_MONTHS} (historique du réapprovisionnement).")
+
+        if options['dry_run']:
+            months = archive.archivable_months(keep_months)
+            if months:
+                start, end = archive.month_bounds(months[0])[0], archive.month_bounds(months[-1])[1]
+                count = StockMovement.objects.filter(created_at__gte=start, created_at__lt=end).aggregate(n=Count('id'))['n']
+            else:
+                count = 0
+            self.stdout.write(self.style.WARNING(
+                f"{len(months)} mois, {count} mouvement(s) à archiver (aucune modification)."
+            ))
+            return
+
+        try:
+            archived = archive.archive_movements(keep_months)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        for month, count in archived:
+            self.stdout.write(f"  {month:%Y-%m} : {count} mouvement(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(count for _, count in archived)} mouvement(s) archivé(s) sur {len(archived)} mois."
+        ))
@@ -0,0 +1,42 @@
+"""
+Génère les miniatures WebP/JPEG des images statiques des médicaments et leur
+manifeste (voir medications/thumbnails.py). Lancée par build.sh avant
+collectstatic ; seules les miniatures manquantes ou périmées sont réécrites.
+
+Usage :  python manage.py build_thumbnails [--force]
+"""
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from medications.thumbnails import MANIFEST_NAME, SOURCE_DIR, build_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Génère les miniatures des images de médicaments et leur manifeste."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Régénère toutes les miniatures.")
+
+    def handle(self, *args, **options):
+        images, written = build_thumbnails(force=options['force'])
+
+        # Poids comparés : originaux vs plus petite miniature WebP de chaque image
+        root = Path(settings.STATICFILES_DIRS[0])
+        manifest = json.loads((root / MANIFEST_NAME).read_text())
+        originals = sum(
+            path.stat().st_size for path in (root / SOURCE_DIR).iterdir()
+            if path.stem in manifest and path.is_file()
+        )
+        smallest = sum(
+            (root / min(entry['webp'].items(), key=lambda item: int(item[0]))[1]).stat().st_size
+            for entry in manifest.values() if entry.get('webp')
+        )
+
+        self.stdout.write(f"  Originaux            : {originals / 1024:8.1f} Ko")
+        self.stdout.write(f"  Miniatures WebP (1x) : {smallest / 1024:8.1f} Ko")
+        self.stdout.write(self.style.SUCCESS(
+            f"{images} image(s) traitée(s), {written} miniature(s) écrite(s)."
+        ))
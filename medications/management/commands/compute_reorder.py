@@ -0,0 +1,40 @@
+"""
+Calcule les suggestions de réapprovisionnement de tout le catalogue
+(vitesse de vente, variabilité, couverture, point de commande, quantité
+suggérée) en une passe vectorisée, puis les enregistre en masse.
+
+Usage :  python manage.py compute_reorder [--days 90] [--lead-time 7] [--coverage 30]
+         python manage.py compute_reorder --benchmark [--skus 50000] [--days 730]
+"""
+from django.core.management.base import BaseCommand
+
+from medications import reorder
+
+
+class Command(BaseCommand):
+    help = "Calcule les points de commande et quantités suggérées pour tout le catalogue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Historique pris en compte, en jours (défaut : 90, ou 730 avec --benchmark).")
+        parser.add_argument('--lead-time', type=int, default=reorder.LEAD_TIME_DAYS, help="Délai de livraison en jours.")
+        parser.add_argument('--coverage', type=int, default=reorder.COVERAGE_DAYS, help="Couverture visée après réception, en jours.")
+        parser.add_argument('--benchmark', action='store_true', help="Mesure le calcul sur un catalogue synthétique, sans toucher à la base.")
+        parser.add_argument('--skus', type=int, default=50000, help="Taille du catalogue synthétique (avec --benchmark).")
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            days = options['days'] or 730
+            elapsed = reorder.benchmark(skus=options['skus'], history_days=days)
+            self.stdout.write(self.style.SUCCESS(
+                f"{options['skus']} références × {days} jours calculées en {elapsed:.2f} s."
+            ))
+            return
+
+        count, to_order, elapsed = reorder.run_reorder_engine(
+            history_days=options['days'] or reorder.HISTORY_DAYS,
+            lead_time=options['lead_time'],
+            coverage=options['coverage'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} médicament(s) analysé(s) en {elapsed:.2f} s — {to_order} à commander."
+        ))
@@ -0,0 +1,19 @@
+"""
+Purge les réservations de stock expirées des paniers POS (par paquets). Une
+réservation expirée ne compte déjà plus dans le stock disponible : la purge
+garde seulement la table et son index petits. À planifier toutes les heures
+par exemple ; sans risque à relancer.
+
+Usage :  python manage.py expire_reservations
+"""
+from django.core.management.base import BaseCommand
+
+from medications.reservations import expire_reservations
+
+
+class Command(BaseCommand):
+    help = "Supprime les réservations de stock expirées."
+
+    def handle(self, *args, **options):
+        deleted = expire_reservations()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} réservation(s) expirée(s) supprimée(s)."))
@@ -0,0 +1,34 @@
+"""
+Retire du stock, en une transaction, tous les médicaments périmés ayant une
+quantité positive (mouvements 'périmé' créés en masse, quantités remises à
+zéro). À planifier chaque nuit ; sans risque à relancer.
+
+Usage :  python manage.py sweep_expired [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+
+from medications.models import Medication
+from medications.stock import write_off_expired
+
+
+class Command(BaseCommand):
+    help = "Retire du stock tous les médicaments périmés."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Affiche ce qui serait retiré sans rien modifier.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            expired = Medication.objects.filter(expiry_date__lt=timezone.localdate(), quantity__gt=0)
+            stats = expired.aggregate(units=Sum('quantity'))
+            self.stdout.write(self.style.WARNING(
+                f"{expired.count()} médicament(s) périmé(s), {stats['units'] or 0} unité(s) à retirer (aucune modification)."
+            ))
+            return
+
+        count, units = write_off_expired()
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} médicament(s) périmé(s) retiré(s) du stock ({units} unité(s))."
+        ))
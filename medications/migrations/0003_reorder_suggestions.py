@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0002_alter_medication_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('medication', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reorder_suggestion', serialize=False, to='medications.medication', verbose_name='Médicament')),
+                ('avg_daily_sales', models.FloatField(default=0, verbose_name='Ventes moyennes / jour')),
+                ('std_daily_sales', models.FloatField(default=0, verbose_name='Écart-type / jour')),
+                ('days_of_cover', models.FloatField(blank=True, help_text='Vide si aucune vente sur la période', null=True, verbose_name='Couverture (jours)')),
+                ('reorder_point', models.IntegerField(default=0, verbose_name='Point de commande')),
+                ('suggested_quantity', models.IntegerField(db_index=True, default=0, verbose_name='Quantité suggérée')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculé le')),
+            ],
+            options={
+                'verbose_name': 'Suggestion de réapprovisionnement',
+                'verbose_name_plural': 'Suggestions de réapprovisionnement',
+                'ordering': ['days_of_cover'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_low_stock(apps, schema_editor):
+    Medication = apps.get_model('medications', 'Medication')
+    Medication.objects.filter(quantity__lte=models.F('min_quantity')).update(low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0003_reorder_suggestions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='low_stock',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Stock faible'),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='low_stock_changed_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Seuil franchi le'),
+        ),
+        migrations.AddIndex(
+            model_name='medication',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['-created_at'], name='medication_low_stock_idx'),
+        ),
+        migrations.RunPython(populate_low_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:39
+
+from django.db import migrations, models
+
+from medications.thumbnails import cloudinary_urls
+
+
+def populate_image_urls(apps, schema_editor):
+    Medication = apps.get_model('medications', 'Medication')
+    for medication in Medication.objects.exclude(image__isnull=True).exclude(image='').only('pk', 'image'):
+        Medication.objects.filter(pk=medication.pk).update(image_urls=cloudinary_urls(medication.image))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0005_movement_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='image_urls',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text="Calculées à l'enregistrement (voir thumbnails.cloudinary_urls)", verbose_name="URLs de l'image"),
+        ),
+        migrations.RunPython(populate_image_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0006_medication_image_urls'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovementArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(db_index=True, verbose_name='Mois')),
+                ('path', models.CharField(help_text='Relatif à ARCHIVE_ROOT', max_length=255, unique=True, verbose_name='Fichier')),
+                ('row_count', models.IntegerField(verbose_name='Mouvements')),
+                ('first_id', models.BigIntegerField(verbose_name='Premier id')),
+                ('last_id', models.BigIntegerField(verbose_name='Dernier id')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Archivé le')),
+            ],
+            options={
+                'verbose_name': 'Archive de mouvements',
+                'verbose_name_plural': 'Archives de mouvements',
+                'ordering': ['-month', 'path'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovementMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mois')),
+                ('movement_type', models.CharField(choices=[('entrée', 'Entrée'), ('sortie', 'Sortie'), ('ajustement', 'Ajustement'), ('retour', 'Retour'), ('perte', 'Perte'), ('périmé', 'Périmé')], max_length=20, verbose_name='Type de mouvement')),
+                ('movements_count', models.IntegerField(default=0, verbose_name='Nombre de mouvements')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantité')),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_movements', to='medications.medication', verbose_name='Médicament')),
+            ],
+            options={
+                'verbose_name': 'Cumul mensuel de mouvements',
+                'verbose_name_plural': 'Cumuls mensuels de mouvements',
+                'ordering': ['-month', 'movement_type'],
+                'constraints': [models.UniqueConstraint(fields=('medication', 'month', 'movement_type'), name='unique_movement_rollup')],
+            },
+        ),
+    ]
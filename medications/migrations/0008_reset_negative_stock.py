@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:01
+
+from django.db import migrations
+
+
+def reset_negative_stock(apps, schema_editor):
+    """Remet à zéro les stocks négatifs (ventes sans contrôle) par un mouvement d'ajustement"""
+    Medication = apps.get_model('medications', 'Medication')
+    StockMovement = apps.get_model('medications', 'StockMovement')
+    negative = list(Medication.objects.filter(quantity__lt=0).values_list('pk', 'quantity'))
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            medication_id=pk,
+            movement_type='ajustement',
+            quantity=-quantity,
+            reason="Stock négatif remis à zéro (contrainte quantity >= 0)",
+            reference='MIGRATION-0008',
+        )
+        for pk, quantity in negative
+    ])
+    Medication.objects.filter(quantity__lt=0).update(quantity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0007_movementarchive_movementmonthlyrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_negative_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0008_reset_negative_stock'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='medication',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 0)), name='medication_quantity_non_negative'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0009_medication_quantity_non_negative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='stripe_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='0 : stock sur la seule ligne du médicament (voir medications/striping.py)', verbose_name='Bandes de stock'),
+        ),
+        migrations.CreateModel(
+            name='StockStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField(verbose_name='Bande')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantité')),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stripes', to='medications.medication', verbose_name='Médicament')),
+            ],
+            options={
+                'verbose_name': 'Bande de stock',
+                'verbose_name_plural': 'Bandes de stock',
+                'ordering': ['medication', 'index'],
+                'constraints': [models.UniqueConstraint(fields=('medication', 'index'), name='unique_stock_stripe'), models.CheckConstraint(condition=models.Q(('quantity__gte', 0)), name='stock_stripe_quantity_non_negative')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0010_stock_stripes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart', models.CharField(max_length=32, verbose_name='Panier')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Quantité')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créée le')),
+                ('expires_at', models.DateTimeField(verbose_name='Expire le')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_reservations', to=settings.AUTH_USER_MODEL, verbose_name='Caissier')),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='medications.medication', verbose_name='Médicament')),
+            ],
+            options={
+                'verbose_name': 'Réservation de stock',
+                'verbose_name_plural': 'Réservations de stock',
+                'ordering': ['expires_at'],
+                'indexes': [models.Index(fields=['medication', 'expires_at', 'quantity'], name='reservation_active_idx'), models.Index(fields=['expires_at'], name='reservation_expiry_idx')],
+                'constraints': [models.UniqueConstraint(fields=('cart', 'medication'), name='unique_cart_reservation')],
+            },
+        ),
+    ]
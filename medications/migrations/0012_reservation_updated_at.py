@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0011_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockreservation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Modifiée le'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(fields=['updated_at'], name='reservation_updated_idx'),
+        ),
+    ]
@@ -1,7 +1,35 @@
-from django.db import models
+import unicodedata
+from functools import lru_cache
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
 from django.utils import timezone
-from cloudinary.models import CloudinaryField
+
+from .fields import image_field
+from .thumbnails import cloudinary_sources, cloudinary_urls, thumbnail_sources
+
+
+@lru_cache(maxsize=None)
+def static_image_url(name):
+    """
+    URL de l'image statique locale associée à un nom de médicament, ou None.
+    Le résultat est mis en cache : le parcours des dossiers statiques
+    (finders.find) n'est fait qu'une fois par nom et par processus.
+    """
+    rel_path = f"images/medicaments/{image_slug(name)}.jpg"
+    if finders.find(rel_path):
+        return static(rel_path)
+    return None
+
+
+def image_slug(name):
+    """Slug du fichier image : nom en minuscules, sans accents/espaces"""
+    slug = unicodedata.normalize('NFKD', name.lower())
+    slug = slug.encode('ascii', 'ignore').decode('ascii')
+    return slug.strip().replace(' ', '-')
 
 
 class Category(models.Model):
@@ -19,6 +47,54 @@ class Category(models.Model):
         return self.name
 
 
+class MedicationQuerySet(models.QuerySet):
+
+    def low_stock(self):
+        """Médicaments sous le seuil d'alerte (lu via l'index partiel sur low_stock)"""
+        return self.filter(low_stock=True)
+
+    def crossed_threshold_since(self, since):
+        """Médicaments passés sous le seuil, ou revenus au-dessus, depuis `since`"""
+        return self.filter(low_stock_changed_at__gte=since).order_by('-low_stock_changed_at')
+
+    def sync_low_stock(self):
+        """
+        Recalcule low_stock en deux UPDATE ensemblistes, après une mise à jour
+        de quantity qui ne passe pas par save() (update(), F()...).
+        """
+        now = timezone.now()
+        crossed_down = self.filter(low_stock=False, quantity__lte=models.F('min_quantity')).update(
+            low_stock=True, low_stock_changed_at=now,
+        )
+        crossed_up = self.filter(low_stock=True, quantity__gt=models.F('min_quantity')).update(
+            low_stock=False, low_stock_changed_at=now,
+        )
+        return crossed_down + crossed_up
+
+    def with_available(self, exclude_cart=None):
+        """
+        Annote `available` : stock moins les réservations actives des paniers
+        (voir medications/reservations.py), hors celles du panier `exclude_cart`.
+        """
+        reserved = StockReservation.objects.active()
+        if exclude_cart:
+            reserved = reserved.exclude(cart=exclude_cart)
+        return self.annotate(available=models.F('quantity') - reserved.reserved_quantity())
+
+    def with_recent_movements(self, n=10):
+        """
+        Médicaments avec leur catégorie et leurs `n` derniers mouvements
+        (auteur inclus) dans `recent_movements` : 2 requêtes quel que soit le volume.
+        """
+        return self.select_related('category').prefetch_related(
+            models.Prefetch(
+                'movements',
+                queryset=StockMovement.objects.select_related('created_by').order_by('-created_at')[:n],
+                to_attr='recent_movements',
+            )
+        )
+
+
 class Medication(models.Model):
     """Modèle pour les médicaments"""
     
@@ -52,6 +128,9 @@ class Medication(models.Model):
     # Stock
     quantity = models.IntegerField(default=0, verbose_name="Quantité en stock")
     min_quantity = models.IntegerField(default=10, verbose_name="Stock minimum", help_text="Seuil d'alerte")
+    low_stock = models.BooleanField(default=False, editable=False, verbose_name="Stock faible")
+    low_stock_changed_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True, verbose_name="Seuil franchi le")
+    stripe_count = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="Bandes de stock", help_text="0 : stock sur la seule ligne du médicament (voir medications/striping.py)")
     
     # Dates
     expiry_date = models.DateField(verbose_name="Date de péremption")
@@ -59,7 +138,8 @@ class Medication(models.Model):
     # Autres informations
     location = models.CharField(max_length=100, blank=True, null=True, verbose_name="Emplacement", help_text="Rayon, étagère...")
     requires_prescription = models.BooleanField(default=False, verbose_name="Prescription requise")
-    image = CloudinaryField('Image', blank=True, null=True, folder='medications')
+    image = image_field('Image', blank=True, null=True, folder='medications')
+    image_urls = models.JSONField(default=dict, blank=True, editable=False, verbose_name="URLs de l'image", help_text="Calculées à l'enregistrement (voir thumbnails.cloudinary_urls)")
     description = models.TextField(blank=True, null=True, verbose_name="Description")
     
     # Métadonnées
@@ -67,13 +147,72 @@ class Medication(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Modifié le")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='medications_created', verbose_name="Créé par")
     
+    objects = MedicationQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Médicament"
         verbose_name_plural = "Médicaments"
         ordering = ['-created_at']
+        indexes = [
+            # Index partiel : seules les lignes en stock faible y figurent
+            models.Index(fields=['-created_at'], condition=models.Q(low_stock=True), name='medication_low_stock_idx'),
+        ]
+        constraints = [
+            # Filet de sécurité de la vente sans verrou (medications.stock.withdraw)
+            models.CheckConstraint(condition=models.Q(quantity__gte=0), name='medication_quantity_non_negative'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.dosage})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Quantité lue : la variation saisie est reportée sur les bandes (save)
+        if 'quantity' in field_names:
+            instance._loaded_quantity = values[field_names.index('quantity')]
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Maintient le drapeau low_stock (et la date de franchissement du seuil)"""
+        low_stock = int(self.quantity) <= int(self.min_quantity)
+        if low_stock != self.low_stock:
+            self.low_stock = low_stock
+            self.low_stock_changed_at = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'low_stock', 'low_stock_changed_at'}
+
+        loaded_quantity = getattr(self, '_loaded_quantity', None)
+        if not self._state.adding and loaded_quantity is not None and kwargs.get('update_fields') is None:
+            # stripe_count n'appartient qu'à striping.enable / disable, et une
+            # quantité inchangée n'est pas réécrite : une instance périmée
+            # n'écrase ni la mise en bandes ni le stock replié depuis les bandes
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'stripe_count'
+                and (field.name != 'quantity' or int(self.quantity) != loaded_quantity)
+            ]
+        update_fields = kwargs.get('update_fields')
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Stock en bandes (la ligne est verrouillée par l'écriture) : la
+            # variation saisie est reportée sur les bandes, sans écraser les
+            # ventes validées depuis la lecture de l'instance
+            delta = int(self.quantity) - loaded_quantity if loaded_quantity is not None else 0
+            if delta and (update_fields is None or 'quantity' in update_fields) \
+                    and Medication.objects.filter(pk=self.pk, stripe_count__gt=0).exists():
+                from .striping import adjust
+                self.quantity = adjust(self.pk, delta)
+        self._loaded_quantity = int(self.quantity)
+
+        # URLs Cloudinary : calculées une fois par image (l'upload a lieu pendant save())
+        image = self._meta.get_field('image').to_python(self.image) if self.image else None
+        public_id = getattr(image, 'public_id', None)
+        if self.image_urls.get('public_id') != public_id:
+            self.image_urls = cloudinary_urls(image) if public_id else {}
+            Medication.objects.filter(pk=self.pk).update(image_urls=self.image_urls)
     
     @property
     def is_low_stock(self):
@@ -111,24 +250,27 @@ class Medication(models.Model):
         2. sinon une image statique locale nommée d'après le médicament
         3. sinon None (le template affiche alors un joli fallback coloré)
         """
-        # 1. Image Cloudinary uploadée
+        # 1. Image uploadée (URLs Cloudinary stockées à l'enregistrement, ou fichier local)
         if self.image:
+            if self.image_urls.get('original'):
+                return self.image_urls['original']
             try:
                 return self.image.url
-            except Exception:
+            except ValueError:  # pas de fichier associé
                 pass
-        # 2. Image statique locale (slug = nom en minuscules, sans accents/espaces)
-        import unicodedata
-        from django.templatetags.static import static
-        from django.contrib.staticfiles import finders
-        slug = unicodedata.normalize('NFKD', self.name.lower())
-        slug = slug.encode('ascii', 'ignore').decode('ascii')
-        slug = slug.strip().replace(' ', '-')
-        rel_path = f"images/medicaments/{slug}.jpg"
-        if finders.find(rel_path):
-            return static(rel_path)
-        # 3. Rien -> fallback template
-        return None
+        # 2. Image statique locale (3. sinon None -> fallback template)
+        return static_image_url(self.name)
+
+    @property
+    def image_sources(self):
+        """
+        Miniatures pour les cartes et tuiles : {'src', 'srcset', 'webp_srcset'},
+        ou None (image_display sera alors utilisée). Versions Cloudinary
+        redimensionnées si une image a été uploadée, sinon miniatures statiques.
+        """
+        if self.image:
+            return cloudinary_sources(self.image_urls)
+        return thumbnail_sources(image_slug(self.name))
 
     @property
     def stock_value(self):
@@ -136,6 +278,80 @@ class Medication(models.Model):
         return self.quantity * self.purchase_price
 
 
+class StockStripe(models.Model):
+    """
+    Part du stock d'un médicament très vendu (voir medications/striping.py).
+    Medication.quantity est la somme de ses bandes.
+    """
+
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='stripes', verbose_name="Médicament")
+    index = models.PositiveSmallIntegerField(verbose_name="Bande")
+    quantity = models.IntegerField(default=0, verbose_name="Quantité")
+
+    class Meta:
+        verbose_name = "Bande de stock"
+        verbose_name_plural = "Bandes de stock"
+        ordering = ['medication', 'index']
+        constraints = [
+            models.UniqueConstraint(fields=['medication', 'index'], name='unique_stock_stripe'),
+            models.CheckConstraint(condition=models.Q(quantity__gte=0), name='stock_stripe_quantity_non_negative'),
+        ]
+
+    def __str__(self):
+        return f"{self.medication_id} #{self.index} ({self.quantity})"
+
+
+class StockReservationQuerySet(models.QuerySet):
+
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def reserved_quantity(self):
+        """
+        Sous-requête : unités réservées pour le médicament de la requête
+        englobante (0 sans réservation), lue dans l'index
+        (medication, expires_at, quantity).
+        """
+        total = (
+            self.filter(medication=models.OuterRef('pk'))
+            .values('medication').annotate(total=models.Sum('quantity')).values('total')
+        )
+        return Coalesce(models.Subquery(total), 0)
+
+
+class StockReservation(models.Model):
+    """Unités mises de côté pour un panier ouvert au POS, jusqu'à expires_at (voir medications/reservations.py)"""
+
+    cart = models.CharField(max_length=32, verbose_name="Panier")
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='reservations', verbose_name="Médicament")
+    quantity = models.PositiveIntegerField(verbose_name="Quantité")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='stock_reservations', verbose_name="Caissier")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créée le")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Modifiée le")
+    expires_at = models.DateTimeField(verbose_name="Expire le")
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Réservation de stock"
+        verbose_name_plural = "Réservations de stock"
+        ordering = ['expires_at']
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'medication'], name='unique_cart_reservation'),
+        ]
+        indexes = [
+            # Somme des réservations actives d'un médicament sans lire la table
+            models.Index(fields=['medication', 'expires_at', 'quantity'], name='reservation_active_idx'),
+            # Purge des réservations expirées, échéances vues par les caisses
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+            # Réservations modifiées, vues par les caisses (stock_feed)
+            models.Index(fields=['updated_at'], name='reservation_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cart} : {self.medication_id} × {self.quantity}"
+
+
 class StockMovement(models.Model):
     """Historique des mouvements de stock"""
     
@@ -161,6 +377,10 @@ class StockMovement(models.Model):
         verbose_name = "Mouvement de stock"
         verbose_name_plural = "Mouvements de stock"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='movement_created_idx'),
+            models.Index(fields=['medication', '-created_at'], name='movement_med_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.movement_type} - {self.medication.name} ({self.quantity})"
@@ -174,8 +394,78 @@ class StockMovement(models.Model):
             if self.movement_type in ['entrée', 'retour', 'ajustement']:
                 self.medication.quantity += self.quantity
             elif self.movement_type in ['sortie', 'perte', 'périmé']:
+                if self.quantity > self.medication.quantity:
+                    raise ValueError(
+                        f'Stock insuffisant pour "{self.medication.name}" '
+                        f'(disponible : {self.medication.quantity}, demandé : {self.quantity}).'
+                    )
                 self.medication.quantity -= self.quantity
             
             self.medication.save()
         
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class MovementMonthlyRollup(models.Model):
+    """
+    Cumul mensuel des mouvements d'un médicament, par type (voir
+    medications/archive.py). Seul historique conservé en base pour les mois
+    archivés ; le détail est relu à la demande dans les segments.
+    """
+
+    medication = models.ForeignKey(Medication, on_delete=models.CASCADE, related_name='monthly_movements', verbose_name="Médicament")
+    month = models.DateField(verbose_name="Mois")
+    movement_type = models.CharField(max_length=20, choices=StockMovement.MOVEMENT_TYPES, verbose_name="Type de mouvement")
+    movements_count = models.IntegerField(default=0, verbose_name="Nombre de mouvements")
+    quantity = models.IntegerField(default=0, verbose_name="Quantité")
+
+    class Meta:
+        verbose_name = "Cumul mensuel de mouvements"
+        verbose_name_plural = "Cumuls mensuels de mouvements"
+        ordering = ['-month', 'movement_type']
+        constraints = [
+            models.UniqueConstraint(fields=['medication', 'month', 'movement_type'], name='unique_movement_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.medication_id} {self.month:%Y-%m} {self.movement_type} ({self.quantity})"
+
+
+class MovementArchive(models.Model):
+    """Segment compressé (JSONL gzip) de mouvements archivés pour un mois"""
+
+    month = models.DateField(db_index=True, verbose_name="Mois")
+    path = models.CharField(max_length=255, unique=True, verbose_name="Fichier", help_text="Relatif à ARCHIVE_ROOT")
+    row_count = models.IntegerField(verbose_name="Mouvements")
+    first_id = models.BigIntegerField(verbose_name="Premier id")
+    last_id = models.BigIntegerField(verbose_name="Dernier id")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Archivé le")
+
+    class Meta:
+        verbose_name = "Archive de mouvements"
+        verbose_name_plural = "Archives de mouvements"
+        ordering = ['-month', 'path']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} : {self.path} ({self.row_count})"
+
+
+class ReorderSuggestion(models.Model):
+    """Suggestion de réapprovisionnement calculée par medications/reorder.py"""
+
+    medication = models.OneToOneField(Medication, on_delete=models.CASCADE, primary_key=True, related_name='reorder_suggestion', verbose_name="Médicament")
+
+    avg_daily_sales = models.FloatField(default=0, verbose_name="Ventes moyennes / jour")
+    std_daily_sales = models.FloatField(default=0, verbose_name="Écart-type / jour")
+    days_of_cover = models.FloatField(null=True, blank=True, verbose_name="Couverture (jours)", help_text="Vide si aucune vente sur la période")
+    reorder_point = models.IntegerField(default=0, verbose_name="Point de commande")
+    suggested_quantity = models.IntegerField(default=0, db_index=True, verbose_name="Quantité suggérée")
+
+    computed_at = models.DateTimeField(verbose_name="Calculé le")
+
+    class Meta:
+        verbose_name = "Suggestion de réapprovisionnement"
+        verbose_name_plural = "Suggestions de réapprovisionnement"
+        ordering = ['days_of_cover']
+
+    def __str__(self):
+        return f"{self.medication.name} : commander {self.suggested_quantity}"
@@ -0,0 +1,102 @@
+"""
+Réservations de stock des paniers ouverts au POS.
+
+Chaque page de caisse ouvre un panier (jeton `cart`). Ajouter un produit ou
+changer sa quantité réserve les unités (reserve) pour TTL : deux caisses ne
+peuvent plus remplir leur panier avec les trois dernières boîtes, la seconde
+est refusée à l'ajout et non au paiement. Chaque réservation prolonge celles
+de tout le panier.
+
+Quantité disponible = stock - réservations actives (expires_at > maintenant),
+sommées par Medication.objects.with_available() dans l'index
+(medication, expires_at, quantity). Une réservation expirée ne compte plus
+dès son échéance ; expire_reservations ne fait que purger la table, par
+paquets (python manage.py expire_reservations).
+
+Réserver ne verrouille pas la ligne Medication (elle est la plus disputée
+aux heures de pointe) : le disponible est lu sans verrou, puis seule la
+ligne de réservation du panier est écrite (upsert). Deux caisses qui
+réservent au même instant les dernières unités peuvent donc toutes deux
+passer ; c'est le décrément conditionnel de l'encaissement qui fait foi.
+
+À l'encaissement, le panier consomme ses réservations (consume) dans la
+transaction de la vente : le décrément conditionnel (stock.withdraw) ne
+retient alors que les réservations des autres paniers, sans verrou préalable.
+
+Les caisses ouvertes voient le disponible changer (medications/stock_feed.py) :
+une réservation posée ou modifiée porte updated_at, une réservation libérée
+échoit (expires_at = maintenant) au lieu d'être supprimée, et une échéance
+se lit dans expires_at.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Medication, StockReservation
+
+
+TTL = timedelta(minutes=15)
+SWEEP_BATCH = 1000
+
+
+def reserve(cart, medication_id, quantity, user=None):
+    """
+    Fixe à `quantity` les unités réservées par le panier pour un médicament
+    (0 : libère). Retourne (unités encore réservables par ce panier, échéance).
+    Lève Medication.DoesNotExist ou ValueError (stock insuffisant).
+    """
+    now = timezone.now()
+    # Lecture sans verrou : le disponible n'est qu'indicatif (voir plus haut)
+    name, available = (
+        Medication.objects.with_available(exclude_cart=cart)
+        .values_list('name', 'available').get(pk=medication_id)
+    )
+    if quantity and quantity > available:
+        raise ValueError(
+            f'Stock insuffisant pour "{name}" '
+            f'(disponible : {max(available, 0)}, demandé : {quantity}).'
+        )
+    try:
+        with transaction.atomic():
+            # Seules les lignes de réservation du panier sont verrouillées
+            if quantity:
+                StockReservation.objects.update_or_create(
+                    cart=cart, medication_id=medication_id,
+                    defaults={'quantity': quantity, 'expires_at': now + TTL, 'created_by': user},
+                )
+            else:
+                # Échue plutôt que supprimée : les autres caisses voient l'unité revenir (stock_feed)
+                StockReservation.objects.filter(cart=cart, medication_id=medication_id).update(
+                    expires_at=now, updated_at=now,
+                )
+            StockReservation.objects.filter(cart=cart, expires_at__gt=now).update(expires_at=now + TTL)
+    except IntegrityError:
+        # Médicament supprimé depuis la lecture
+        raise Medication.DoesNotExist
+    return available, now + TTL
+
+
+def release(cart):
+    """Libère toutes les réservations d'un panier (vidé ou abandonné) : elles échoient, la purge les supprime"""
+    now = timezone.now()
+    return StockReservation.objects.active().filter(cart=cart).update(expires_at=now, updated_at=now)
+
+
+def consume(cart):
+    """
+    Retire les réservations d'un panier encaissé (dans la transaction de la
+    vente, dont les mouvements signalent les médicaments aux caisses)
+    """
+    return StockReservation.objects.filter(cart=cart).delete()[0]
+
+
+def expire_reservations(now=None):
+    """Supprime les réservations expirées, par paquets de SWEEP_BATCH. Retourne leur nombre."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        batch = list(StockReservation.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:SWEEP_BATCH])
+        if not batch:
+            return deleted
+        deleted += StockReservation.objects.filter(pk__in=batch).delete()[0]
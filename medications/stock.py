@@ -0,0 +1,176 @@
+"""
+Opérations de stock en masse.
+
+Contrairement à StockMovement.save(), qui met à jour le médicament ligne par
+ligne, ces fonctions écrivent les mouvements avec bulk_create et ajustent les
+quantités par UPDATE ensemblistes, dans une seule transaction et en un nombre
+de requêtes borné (par paquets de BATCH_SIZE médicaments).
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import striping
+from .models import Medication, StockMovement, StockReservation, StockStripe
+
+
+BATCH_SIZE = 500
+
+
+def _batches(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def write_off_expired(queryset=None, user=None, today=None):
+    """
+    Retire du stock tous les médicaments périmés (expiry_date passée) ayant
+    une quantité positive : un mouvement 'périmé' par médicament, quantité
+    remise à zéro. Retourne (nombre de médicaments, unités retirées).
+    """
+    today = today or timezone.localdate()
+    queryset = Medication.objects.all() if queryset is None else queryset
+    reference = f"PER{today.strftime('%Y%m%d')}"
+
+    with transaction.atomic():
+        # Les lignes sont verrouillées : les quantités lues sont celles retirées
+        expired = list(
+            queryset.select_for_update()
+            .filter(expiry_date__lt=today, quantity__gt=0)
+            .order_by('pk')
+            .values_list('pk', 'quantity')
+        )
+        if not expired:
+            return 0, 0
+
+        StockMovement.objects.bulk_create(
+            [
+                StockMovement(
+                    medication_id=pk,
+                    movement_type='périmé',
+                    quantity=quantity,
+                    reason="Retrait automatique : produit périmé",
+                    reference=reference,
+                    created_by=user,
+                )
+                for pk, quantity in expired
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        now = timezone.now()
+        for batch in _batches([pk for pk, _ in expired]):
+            Medication.objects.filter(pk__in=batch).update(quantity=0, updated_at=now)
+            StockStripe.objects.filter(medication_id__in=batch).update(quantity=0)
+            Medication.objects.filter(pk__in=batch).sync_low_stock()
+
+    return len(expired), sum(quantity for _, quantity in expired)
+
+
+def apply_entries(quantities, reference, reason='', user=None, movement_type='entrée'):
+    """
+    Ajoute en masse des quantités au stock, {medication_id: quantité} :
+    verrouillage des médicaments (dans l'ordre des identifiants), un bulk_create
+    des mouvements, puis un UPDATE ... SET quantity = quantity + CASE ... par
+    paquet. Doit être appelée dans une transaction.
+    """
+    ids = sorted(quantities)
+    for batch in _batches(ids):
+        list(Medication.objects.select_for_update().filter(pk__in=batch).order_by('pk').values_list('pk', flat=True))
+
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(
+                medication_id=pk,
+                movement_type=movement_type,
+                quantity=quantities[pk],
+                reason=reason,
+                reference=reference,
+                created_by=user,
+            )
+            for pk in ids
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    now = timezone.now()
+    for batch in _batches(ids):
+        increment = Case(
+            *[When(pk=pk, then=Value(quantities[pk])) for pk in batch],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        Medication.objects.filter(pk__in=batch).update(quantity=F('quantity') + increment, updated_at=now)
+        Medication.objects.filter(pk__in=batch).sync_low_stock()
+        striping.spread({pk: quantities[pk] for pk in batch})
+
+
+def withdraw(lines, reference, reason='', user=None, movement_type='sortie'):
+    """
+    Sort du stock les lignes [(medication_id, quantité)] sans verrou préalable :
+    un UPDATE conditionnel par médicament (dans l'ordre des identifiants),
+
+        UPDATE ... SET quantity = quantity - n WHERE id = ? AND quantity >= n + réservé
+
+    (réservé : réservations actives des paniers, voir reservations.py) et la
+    survente se lit dans le nombre de lignes modifiées. Le verrou de
+    ligne n'est pris qu'au moment de l'UPDATE : à appeler en fin de
+    transaction. Pour un médicament en bandes, l'UPDATE porte sur une bande
+    (striping.take) et Medication.quantity est recalculée après le commit.
+    Lève Medication.DoesNotExist ou ValueError (stock insuffisant) ; la
+    transaction de l'appelant est alors annulée.
+    """
+    quantities = {}
+    for pk, quantity in lines:
+        quantities[pk] = quantities.get(pk, 0) + quantity
+    # Disponible (stock - réservations des autres paniers) des médicaments en bandes
+    striped = dict(
+        Medication.objects.filter(pk__in=quantities, stripe_count__gt=0).with_available().values_list('pk', 'available')
+    )
+    reserved = StockReservation.objects.active().reserved_quantity()
+
+    now = timezone.now()
+    plain, folded = [], []
+    for pk in sorted(quantities):
+        wanted = quantities[pk]
+        if pk in striped and striped[pk] >= wanted and striping.take(pk, wanted):
+            folded.append(pk)
+            continue
+        updated = Medication.objects.filter(pk=pk, stripe_count=0, quantity__gte=Value(wanted) + reserved).update(
+            quantity=F('quantity') - wanted, updated_at=now,
+        )
+        if updated:
+            plain.append(pk)
+            continue
+        medication = Medication.objects.filter(pk=pk).with_available().values('name', 'available', 'stripe_count').first()
+        if medication is None:
+            raise Medication.DoesNotExist
+        if medication['stripe_count'] and pk not in striped and striping.take(pk, wanted):
+            # Mis en bandes depuis la lecture de `striped`
+            folded.append(pk)
+            continue
+        raise ValueError(
+            f'Stock insuffisant pour "{medication["name"]}" '
+            f'(disponible : {max(medication["available"], 0)}, demandé : {wanted}).'
+        )
+
+    StockMovement.objects.bulk_create(
+        [
+            StockMovement(
+                medication_id=pk,
+                movement_type=movement_type,
+                quantity=quantity,
+                reason=reason,
+                reference=reference,
+                created_by=user,
+            )
+            for pk, quantity in lines
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    for batch in _batches(plain):
+        Medication.objects.filter(pk__in=batch).sync_low_stock()
+    if folded:
+        transaction.on_commit(partial(striping.fold, folded), robust=True)
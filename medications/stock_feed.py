@@ -0,0 +1,92 @@
+"""
+Variations de stock pour les caisses (POS) ouvertes.
+
+Le journal StockMovement sert de file d'événements : chaque vente, réception
+ou ajustement y écrit une ligne dans la même transaction que la mise à jour
+du stock, et ne devient visible qu'au commit. Les réservations des paniers
+(medications/reservations.py) changent le disponible sans mouvement : on
+relit aussi celles modifiées (updated_at) ou échues (expires_at) depuis la
+dernière lecture. Le curseur d'un client, "<id de mouvement>:<horodatage>",
+porte le plus grand id de mouvement vu et l'heure de sa dernière lecture ;
+à chaque lecture on renvoie la quantité et le disponible actuels des
+médicaments touchés depuis.
+
+Les id sont attribués à l'insertion, pas au commit : une transaction longue
+peut rendre visible un id inférieur au curseur. On relit donc les REWIND
+derniers mouvements sous le curseur, et les réservations des
+RESERVATION_REWIND dernières secondes avant l'horodatage ; la caisse
+n'applique que les quantités qui ont réellement changé.
+
+La caisse interroge l'API (api/stock-changes/?cursor=...) toutes les
+POS_POLL secondes, page visible seulement : une requête courte, sans
+connexion longue qui tiendrait un worker gunicorn synchrone.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Medication, StockMovement, StockReservation
+
+
+REWIND = 200                # mouvements relus sous le curseur
+RESERVATION_REWIND = timedelta(seconds=30)  # réservations relues avant l'horodatage
+POS_POLL = 5                # secondes entre deux interrogations de la caisse
+
+
+def make_cursor(movement_id, now):
+    return f'{movement_id}:{int(now.timestamp())}'
+
+
+def parse_cursor(cursor):
+    """Retourne (id de mouvement, horodatage) ; lève ValueError si le curseur est invalide"""
+    movement_id, _, stamp = str(cursor).partition(':')
+    try:
+        seen = datetime.fromtimestamp(int(stamp), tz=dt_timezone.utc)
+    except (OverflowError, OSError):
+        raise ValueError(cursor)
+    return int(movement_id), seen
+
+
+def current_cursor():
+    """Curseur de départ : dernier mouvement enregistré, heure actuelle"""
+    last = StockMovement.objects.aggregate(last=Max('id'))['last'] or 0
+    return make_cursor(last, timezone.now())
+
+
+def changes_since(cursor):
+    """
+    Retourne (nouveau curseur, {id médicament: {quantity, available, low_stock}})
+    pour les médicaments ayant un mouvement d'id > id du curseur - REWIND, ou
+    une réservation posée, modifiée, libérée ou échue depuis l'horodatage du
+    curseur (available : stock moins les réservations des paniers).
+    Lève ValueError si le curseur est invalide.
+    """
+    last_seen, seen_at = parse_cursor(cursor)
+    now = timezone.now()
+    since = seen_at - RESERVATION_REWIND
+    touched = list(
+        StockMovement.objects
+        .filter(id__gt=max(last_seen - REWIND, 0))
+        .order_by()
+        .values_list('id', 'medication_id')
+    )
+    reserved = set(
+        StockReservation.objects
+        .filter(Q(updated_at__gt=since) | Q(expires_at__gt=since, expires_at__lte=now))
+        .order_by()
+        .values_list('medication_id', flat=True)
+    )
+    cursor = make_cursor(max([last_seen] + [pk for pk, _ in touched]), now)
+    med_ids = {med_id for _, med_id in touched} | reserved
+    if not med_ids:
+        return cursor, {}
+    levels = (
+        Medication.objects.filter(id__in=med_ids)
+        .with_available()
+        .values_list('id', 'quantity', 'available', 'low_stock')
+    )
+    return cursor, {
+        pk: {'quantity': quantity, 'available': available, 'low_stock': low_stock}
+        for pk, quantity, available, low_stock in levels
+    }
@@ -0,0 +1,154 @@
+"""
+Stock en bandes (striping) des médicaments les plus vendus.
+
+Le paracétamol ou les antipaludiques figurent dans une grande part des
+paniers : chaque vente décrémente la même ligne Medication, et les caisses
+s'y succèdent une à une. Pour un médicament « en bandes » (stripe_count > 0),
+son stock est réparti sur stripe_count lignes StockStripe :
+
+- une vente prend ses unités sur une bande tirée au hasard parmi celles qui
+  en ont assez (un UPDATE conditionnel, sans verrou préalable) ; si aucune
+  bande ne suffit seule, sur plusieurs, sous verrou et dans l'ordre des
+  bandes ;
+- Medication.quantity reste la somme des bandes : elle est recalculée après
+  le commit de la vente (fold), par un UPDATE court hors de sa transaction ;
+- les autres écritures de quantity sont reportées sur les bandes : les
+  réceptions en masse y répartissent leur hausse (spread), les retraits de
+  périmés les vident, et un enregistrement du médicament (saisie,
+  mouvement unitaire) y reporte sa variation par rapport à la quantité lue,
+  dans sa transaction (adjust) : une vente validée entre la lecture et
+  l'enregistrement n'est pas effacée.
+
+Activation et désactivation par médicament : actions de l'admin des
+médicaments. Mesure du gain : python manage.py loadtest_checkout --striping 8
+(à comparer à --striping 0, sur Postgres : SQLite sérialise de toute façon
+les écritures).
+"""
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from .models import Medication, StockStripe
+
+
+DEFAULT_STRIPES = 8
+
+
+def split(quantity, count):
+    """Quantités de `count` bandes se partageant `quantity` unités"""
+    share, extra = divmod(quantity, count)
+    return [share + 1 if index < extra else share for index in range(count)]
+
+
+def drain(stripes, quantity):
+    """Prend `quantity` unités sur les bandes (verrouillées) les plus pleines, sans descendre sous zéro"""
+    for stripe in sorted(stripes, key=lambda stripe: -stripe.quantity):
+        part = min(quantity, stripe.quantity)
+        stripe.quantity -= part
+        quantity -= part
+    StockStripe.objects.bulk_update(stripes, ['quantity'])
+
+
+def enable(medication_id, count=DEFAULT_STRIPES):
+    """Met (ou remet) le stock d'un médicament en `count` bandes égales"""
+    if count < 1:
+        raise ValueError("Il faut au moins une bande.")
+    with transaction.atomic():
+        medication = Medication.objects.select_for_update().get(pk=medication_id)
+        quantity = medication.quantity
+        if medication.stripe_count:
+            # Les bandes font foi : elles sont verrouillées (ventes en cours) puis relues
+            quantity = sum(StockStripe.objects.select_for_update().filter(medication=medication).values_list('quantity', flat=True))
+        StockStripe.objects.filter(medication=medication).delete()
+        StockStripe.objects.bulk_create([
+            StockStripe(medication=medication, index=index, quantity=part)
+            for index, part in enumerate(split(quantity, count))
+        ])
+        Medication.objects.filter(pk=medication_id).update(stripe_count=count, quantity=quantity, updated_at=timezone.now())
+        Medication.objects.filter(pk=medication_id).sync_low_stock()
+
+
+def disable(medication_id):
+    """Ramène le stock d'un médicament sur sa seule ligne (somme des bandes)"""
+    with transaction.atomic():
+        medication = Medication.objects.select_for_update().get(pk=medication_id)
+        if not medication.stripe_count:
+            return
+        quantity = sum(StockStripe.objects.select_for_update().filter(medication=medication).values_list('quantity', flat=True))
+        StockStripe.objects.filter(medication=medication).delete()
+        Medication.objects.filter(pk=medication_id).update(stripe_count=0, quantity=quantity, updated_at=timezone.now())
+        Medication.objects.filter(pk=medication_id).sync_low_stock()
+
+
+def take(medication_id, quantity):
+    """
+    Retire `quantity` unités des bandes d'un médicament. Retourne False si
+    elles n'y sont pas (ou si le médicament n'est plus en bandes). À appeler
+    dans une transaction.
+    """
+    candidates = list(
+        StockStripe.objects.filter(medication_id=medication_id, quantity__gte=quantity).values_list('id', flat=True)
+    )
+    random.shuffle(candidates)
+    for stripe_id in candidates:
+        if StockStripe.objects.filter(id=stripe_id, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+            return True
+
+    # Aucune bande ne suffit seule : prélèvement sur les plus pleines, sous verrou
+    stripes = list(StockStripe.objects.select_for_update().filter(medication_id=medication_id).order_by('index'))
+    if sum(stripe.quantity for stripe in stripes) < quantity:
+        return False
+    drain(stripes, quantity)
+    return True
+
+
+def spread(deltas):
+    """
+    Reporte des variations de stock {medication_id: delta} sur les bandes des
+    médicaments concernés qui en ont : hausse répartie à parts égales, baisse
+    prise sur les bandes les plus pleines (sans descendre sous zéro).
+    """
+    striped = dict(
+        Medication.objects.filter(pk__in=deltas, stripe_count__gt=0).values_list('pk', 'stripe_count')
+    )
+    with transaction.atomic():
+        for pk in sorted(striped):
+            delta = deltas[pk]
+            if delta > 0:
+                shares = split(delta, striped[pk])
+                StockStripe.objects.filter(medication_id=pk).update(quantity=F('quantity') + Case(
+                    *[When(index=index, then=Value(share)) for index, share in enumerate(shares) if share],
+                    default=Value(0),
+                ))
+            elif delta < 0:
+                drain(list(StockStripe.objects.select_for_update().filter(medication_id=pk).order_by('index')), -delta)
+
+
+def adjust(medication_id, delta):
+    """
+    Reporte sur les bandes une variation `delta` de la quantité d'un
+    médicament (Medication.save), puis y recale Medication.quantity.
+    Retourne la nouvelle quantité. À appeler dans la transaction de l'écriture.
+    """
+    spread({medication_id: delta})
+    fold([medication_id])
+    return Medication.objects.values_list('quantity', flat=True).get(pk=medication_id)
+
+
+def fold(medication_ids):
+    """
+    Medication.quantity = somme des bandes, médicament par médicament (ordre
+    des identifiants), hors transaction : la ligne n'est verrouillée que le
+    temps de l'UPDATE. Appelée après le commit des ventes ; rattrape aussi
+    tout écart antérieur.
+    """
+    total = Subquery(
+        StockStripe.objects.filter(medication=OuterRef('pk'))
+        .values('medication').annotate(total=Sum('quantity')).values('total')
+    )
+    now = timezone.now()
+    for pk in sorted(medication_ids):
+        Medication.objects.filter(pk=pk, stripe_count__gt=0).update(quantity=total, updated_at=now)
+    Medication.objects.filter(pk__in=medication_ids).sync_low_stock()
@@ -1,3 +1,463 @@
-from django.test import TestCase
+import io
+import math
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from sales.models import Sale, SaleItem
+from . import archive, reorder, reservations, stock, stock_feed, striping
+from .models import (
+    Category, Medication, MovementArchive, MovementMonthlyRollup, ReorderSuggestion,
+    StockMovement, StockReservation, StockStripe,
+)
+
+
+class MedicationDetailQueryCountTests(TestCase):
+    """Le nombre de requêtes de la fiche médicament ne dépend pas de l'historique"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pharmacien', password='x')
+        cls.category = Category.objects.create(name='Antibiotiques')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def make_medication(self, movements):
+        medication = Medication.objects.create(
+            name='Amoxicilline', dci='Amoxicilline', barcode=f'3400930{movements:06d}', category=self.category,
+            form='gélule', dosage='500mg', purchase_price=100, selling_price=150,
+            quantity=0, expiry_date=date(2030, 1, 1),
+        )
+        for _ in range(movements):
+            StockMovement.objects.create(
+                medication=medication, movement_type='entrée', quantity=5, created_by=self.user,
+            )
+        return medication
+
+    def test_with_recent_movements_is_limited_and_prefetched(self):
+        medication = self.make_medication(15)
+        with self.assertNumQueries(2):
+            medication = Medication.objects.with_recent_movements(10).get(pk=medication.pk)
+            medication.category.name
+            users = [movement.created_by.username for movement in medication.recent_movements]
+        self.assertEqual(len(users), 10)
+
+    def test_detail_page_is_constant_in_movement_count(self):
+        counts = []
+        for movements in (1, 15):
+            medication = self.make_medication(movements)
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('medication_detail', args=[medication.pk]), secure=True)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(context))
+        self.assertEqual(counts[0], counts[1])
+
+
+class StripingTests(TestCase):
+    """Le stock d'un médicament en bandes reste la somme de ses bandes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pharmacien', password='x')
+
+    def setUp(self):
+        self.medication = Medication.objects.create(
+            name='Paracétamol', dci='Paracétamol', barcode='3400930000001', form='comprimé', dosage='500mg',
+            purchase_price=100, selling_price=150, quantity=20, expiry_date=date(2030, 1, 1),
+        )
+        striping.enable(self.medication.pk, count=4)
+
+    def assertStripesMatch(self, expected):
+        quantity = Medication.objects.values_list('quantity', flat=True).get(pk=self.medication.pk)
+        stripes = list(StockStripe.objects.filter(medication=self.medication).values_list('quantity', flat=True))
+        self.assertEqual(quantity, expected)
+        self.assertEqual(sum(stripes), expected)
+        self.assertEqual(len(stripes), 4)
+
+    def test_saves_from_stale_instances_add_their_changes(self):
+        first = Medication.objects.get(pk=self.medication.pk)
+        second = Medication.objects.get(pk=self.medication.pk)
+        first.quantity = 30
+        first.save()
+        second.quantity = 25
+        second.save()
+        # +10 puis +5, chacun par rapport à la quantité lue
+        self.assertStripesMatch(35)
+
+    def test_save_keeps_a_sale_committed_after_loading(self):
+        medication = Medication.objects.get(pk=self.medication.pk)
+        self.withdraw(5)
+        medication.quantity += 10
+        medication.save()
+        self.assertStripesMatch(25)
+        self.assertEqual(medication.quantity, 25)
+
+    def test_save_from_instance_loaded_before_striping_keeps_stripes(self):
+        # self.medication a été lu avant enable() : stripe_count = 0 sur l'instance
+        self.medication.quantity = 12
+        self.medication.save()
+        self.assertEqual(Medication.objects.get(pk=self.medication.pk).stripe_count, 4)
+        self.assertStripesMatch(12)
+
+    def test_edit_form_sets_the_typed_quantity(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('medication_update', args=[self.medication.pk]), {
+            'name': 'Paracétamol', 'dci': 'Paracétamol', 'barcode': '3400930000001', 'form': 'comprimé',
+            'dosage': '500mg', 'purchase_price': '100', 'selling_price': '150', 'quantity': '26',
+            'min_quantity': '10', 'expiry_date': '2030-01-01',
+        }, secure=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertStripesMatch(26)
+
+    def withdraw(self, quantity):
+        # fold() recalcule Medication.quantity après le commit de la vente
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.withdraw([(self.medication.pk, quantity)], reference='V1', user=self.user)
+
+    def test_striped_checkout_takes_from_one_stripe(self):
+        self.withdraw(3)
+        self.assertStripesMatch(17)
+        stripes = sorted(StockStripe.objects.filter(medication=self.medication).values_list('quantity', flat=True))
+        self.assertEqual(stripes, [2, 5, 5, 5])
+
+    def test_striped_checkout_drains_several_stripes(self):
+        self.withdraw(12)
+        self.assertStripesMatch(8)
+
+    def test_striped_oversell_is_refused(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                stock.withdraw([(self.medication.pk, 21)], reference='V1', user=self.user)
+        self.assertStripesMatch(20)
+
+    def test_stock_movement_is_spread_over_stripes(self):
+        medication = Medication.objects.get(pk=self.medication.pk)
+        StockMovement.objects.create(medication=medication, movement_type='sortie', quantity=7, created_by=self.user)
+        self.assertStripesMatch(13)
+
+
+class MedicationSaveTests(TestCase):
+    """Enregistrement d'un médicament qui n'est pas en bandes"""
+
+    def test_unchanged_quantity_is_not_rewritten(self):
+        medication = Medication.objects.create(
+            name='Ibuprofène', dci='Ibuprofène', barcode='3400930000002', form='comprimé', dosage='400mg',
+            purchase_price=100, selling_price=150, quantity=3, expiry_date=date(2030, 1, 1),
+        )
+        medication = Medication.objects.get(pk=medication.pk)
+        Medication.objects.filter(pk=medication.pk).update(quantity=1)
+        medication.selling_price = 175
+        with CaptureQueriesContext(connection) as context:
+            medication.save()
+        # Ni relecture de la ligne, ni quantité périmée réécrite
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('SELECT')])
+        self.assertEqual(Medication.objects.values_list('quantity', flat=True).get(pk=medication.pk), 1)
+
+
+class StockWithdrawTests(TestCase):
+    """Sortie de stock par UPDATE conditionnel (medications.stock.withdraw)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('caisse', password='x')
+
+    def setUp(self):
+        self.medication = Medication.objects.create(
+            name='Ibuprofène', dci='Ibuprofène', barcode='3400930000002', form='comprimé', dosage='400mg',
+            purchase_price=100, selling_price=150, quantity=3, expiry_date=date(2030, 1, 1),
+        )
+
+    def quantity(self):
+        return Medication.objects.values_list('quantity', flat=True).get(pk=self.medication.pk)
+
+    def test_withdraw_decrements_and_records_movements(self):
+        stock.withdraw([(self.medication.pk, 2)], reference='V1', user=self.user)
+        self.assertEqual(self.quantity(), 1)
+        self.assertEqual(StockMovement.objects.filter(medication=self.medication, movement_type='sortie').count(), 1)
+
+    def test_oversell_is_refused(self):
+        with self.assertRaisesMessage(ValueError, 'disponible : 3, demandé : 4'):
+            with transaction.atomic():
+                stock.withdraw([(self.medication.pk, 4)], reference='V1', user=self.user)
+        self.assertEqual(self.quantity(), 3)
+        self.assertFalse(StockMovement.objects.filter(medication=self.medication).exists())
+
+    def test_unknown_medication_is_refused(self):
+        with self.assertRaises(Medication.DoesNotExist):
+            stock.withdraw([(self.medication.pk + 1000, 1)], reference='V1', user=self.user)
+
+
+class ExpiredWriteOffTests(TestCase):
+    """Retrait en masse des médicaments périmés (medications.stock.write_off_expired)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pharmacien', password='x')
+
+    def medication(self, barcode, quantity, expiry_date):
+        return Medication.objects.create(
+            name=f'Produit {barcode}', dci='Amoxicilline', barcode=barcode, form='gélule', dosage='500mg',
+            purchase_price=100, selling_price=150, quantity=quantity, expiry_date=expiry_date,
+        )
+
+    def test_expired_stock_is_written_off_with_a_dated_reference(self):
+        expired = self.medication('3400930000301', 7, date(2026, 3, 14))
+        striped = self.medication('3400930000302', 8, date(2026, 1, 1))
+        striping.enable(striped.pk, count=4)
+        valid = self.medication('3400930000303', 5, date(2026, 3, 15))
+        empty = self.medication('3400930000304', 0, date(2025, 1, 1))
+
+        self.assertEqual(stock.write_off_expired(user=self.user, today=date(2026, 3, 15)), (2, 15))
+        self.assertEqual(
+            set(StockMovement.objects.values_list('medication', 'movement_type', 'quantity', 'reference', 'created_by')),
+            {(expired.pk, 'périmé', 7, 'PER20260315', self.user.pk), (striped.pk, 'périmé', 8, 'PER20260315', self.user.pk)},
+        )
+        quantities = dict(Medication.objects.values_list('pk', 'quantity'))
+        self.assertEqual([quantities[m.pk] for m in (expired, striped, valid, empty)], [0, 0, 5, 0])
+        self.assertEqual(sum(StockStripe.objects.filter(medication=striped).values_list('quantity', flat=True)), 0)
+
+        # Un second passage ne retire plus rien
+        self.assertEqual(stock.write_off_expired(today=date(2026, 3, 15)), (0, 0))
+        self.assertEqual(StockMovement.objects.count(), 2)
+
+
+class ReservationTests(TestCase):
+    """Réservations de stock des paniers ouverts au POS"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('caisse', password='x')
+
+    def setUp(self):
+        self.medication = Medication.objects.create(
+            name='Artéméther', dci='Artéméther', barcode='3400930000003', form='comprimé', dosage='20mg',
+            purchase_price=100, selling_price=150, quantity=5, expiry_date=date(2030, 1, 1),
+        )
+
+    def available(self, exclude_cart=None):
+        return Medication.objects.with_available(exclude_cart=exclude_cart).get(pk=self.medication.pk).available
+
+    def test_reservation_is_held_against_other_carts(self):
+        reservations.reserve('panier-a', self.medication.pk, 4, self.user)
+        self.assertEqual(self.available(), 1)
+        self.assertEqual(self.available(exclude_cart='panier-a'), 5)
+        with self.assertRaisesMessage(ValueError, 'disponible : 1, demandé : 2'):
+            reservations.reserve('panier-b', self.medication.pk, 2, self.user)
+
+    def test_expired_reservation_frees_stock(self):
+        reservations.reserve('panier-a', self.medication.pk, 4, self.user)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.available(), 5)
+        reservations.reserve('panier-b', self.medication.pk, 5, self.user)
+        self.assertEqual(reservations.expire_reservations(), 1)
+        self.assertEqual(list(StockReservation.objects.values_list('cart', flat=True)), ['panier-b'])
+
+    def test_checkout_cannot_take_units_reserved_by_another_cart(self):
+        reservations.reserve('panier-a', self.medication.pk, 4, self.user)
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                stock.withdraw([(self.medication.pk, 2)], reference='V1', user=self.user)
+        self.assertEqual(Medication.objects.get(pk=self.medication.pk).quantity, 5)
+
+    def test_checkout_consumes_its_own_reservations(self):
+        reservations.reserve('panier-a', self.medication.pk, 4, self.user)
+        with transaction.atomic():
+            reservations.consume('panier-a')
+            stock.withdraw([(self.medication.pk, 4)], reference='V1', user=self.user)
+        self.assertEqual(Medication.objects.get(pk=self.medication.pk).quantity, 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_other_tills_see_reservations_change(self):
+        cursor = stock_feed.current_cursor()
+        reservations.reserve('panier-a', self.medication.pk, 4, self.user)
+        cursor, changes = stock_feed.changes_since(cursor)
+        self.assertEqual(changes[self.medication.pk]['available'], 1)
+
+        reservations.release('panier-a')
+        cursor, changes = stock_feed.changes_since(cursor)
+        self.assertEqual(changes[self.medication.pk]['available'], 5)
+
+    def test_other_tills_see_reservations_expire(self):
+        reservations.reserve('panier-a', self.medication.pk, 4, self.user)
+        now = timezone.now()
+        StockReservation.objects.update(updated_at=now - timedelta(hours=1), expires_at=now - timedelta(minutes=5))
+        last, _ = stock_feed.parse_cursor(stock_feed.current_cursor())
+        _, changes = stock_feed.changes_since(stock_feed.make_cursor(last, now - timedelta(minutes=1)))
+        self.assertNotIn(self.medication.pk, changes)
+        _, changes = stock_feed.changes_since(stock_feed.make_cursor(last, now - timedelta(minutes=10)))
+        self.assertEqual(changes[self.medication.pk]['available'], 5)
+
+    def test_stock_changes_api_restarts_on_invalid_cursor(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('stock_changes'), {'cursor': 'abc'}, secure=True)
+        self.assertEqual(response.json()['changes'], {})
+        response = self.client.get(reverse('stock_changes'), {'cursor': response.json()['cursor']}, secure=True)
+        self.assertEqual(response.status_code, 200)
+
+
+class ReorderComputeTests(SimpleTestCase):
+    """Calcul vectorisé du réapprovisionnement sur de petits tableaux"""
+
+    def compute(self, quantities, min_quantities, sales):
+        rows, days, amounts = zip(*sales)
+        return reorder.compute_reorder(
+            quantities, min_quantities, rows, days, amounts, history_days=4, lead_time=7, coverage=30,
+        )
+
+    def test_days_without_sales_count_as_zeros(self):
+        result = self.compute([30], [0], [(0, 0, 2), (0, 2, 4)])
+        # Série [2, 0, 4, 0] : moyenne 1,5, variance (écart-type d'échantillon) 11/3
+        self.assertAlmostEqual(result['avg_daily'][0], 1.5)
+        self.assertAlmostEqual(result['std_daily'][0], math.sqrt(11 / 3))
+        self.assertAlmostEqual(result['days_of_cover'][0], 20)
+        # ceil(1,5 × 7 + 1,65 × √(11/3) × √7) = ceil(18,86)
+        self.assertEqual(result['reorder_point'][0], 19)
+        self.assertEqual(result['suggested_quantity'][0], 0)
+
+    def test_days_outside_the_window_are_ignored(self):
+        inside = self.compute([30], [0], [(0, 0, 2), (0, 2, 4)])
+        outside = self.compute([30], [0], [(0, -1, 100), (0, 0, 2), (0, 2, 4), (0, 4, 100)])
+        for key in ('avg_daily', 'std_daily', 'reorder_point', 'suggested_quantity'):
+            self.assertEqual(outside[key][0], inside[key][0])
+
+    def test_min_quantity_is_a_floor(self):
+        # Série [0, 1, 0, 0] : point de commande calculé ceil(1,75 + 2,18) = 4
+        self.assertEqual(self.compute([10], [0], [(0, 1, 1)])['reorder_point'][0], 4)
+        result = self.compute([10], [10], [(0, 1, 1)])
+        self.assertEqual(result['reorder_point'][0], 10)
+        # Cible ceil(0,25 × 37 + 2,18) = 12
+        self.assertEqual(result['suggested_quantity'][0], 2)
+
+    def test_never_sold_has_no_cover(self):
+        result = self.compute([30, 3], [0, 5], [(0, 0, 2)])
+        self.assertEqual(result['avg_daily'][1], 0)
+        self.assertTrue(np.isnan(result['days_of_cover'][1]))
+        self.assertFalse(np.isnan(result['days_of_cover'][0]))
+        self.assertEqual(result['reorder_point'][1], 5)
+        self.assertEqual(result['suggested_quantity'][1], 3)
+
+
+class ReorderEngineTests(TestCase):
+    """Lecture des sorties en base et enregistrement des suggestions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('caisse', password='x')
+
+    def setUp(self):
+        self.sold, self.unsold = (
+            Medication.objects.create(
+                name=name, dci=name, barcode=barcode, form='comprimé', dosage='500mg',
+                purchase_price=100, selling_price=150, quantity=50, min_quantity=5, expiry_date=date(2030, 1, 1),
+            )
+            for name, barcode in (('Paracétamol', '3400930000201'), ('Ibuprofène', '3400930000202'))
+        )
+
+    def sell(self, quantity):
+        sale = Sale.objects.create(payment_method='especes', created_by=self.user, status='completee')
+        SaleItem.objects.create(sale=sale, medication=self.sold, quantity=quantity, unit_price=150)
+
+    def test_sale_movements_are_not_counted_twice(self):
+        self.sell(3)
+        StockMovement.objects.create(medication=self.sold, movement_type='sortie', quantity=2, reason='Casse', created_by=self.user)
+        self.assertEqual(StockMovement.objects.filter(movement_type='sortie').count(), 2)
+
+        today = timezone.localdate()
+        ids = np.asarray([self.sold.pk, self.unsold.pk])
+        rows, days, amounts = reorder.load_daily_outflows(ids, today - timedelta(days=9))
+        self.assertEqual(sorted(zip(rows.tolist(), days.tolist(), amounts.tolist())), [(0, 9, 2.0), (0, 9, 3.0)])
+
+    def test_run_saves_one_suggestion_per_medication(self):
+        self.sell(10)
+        self.assertEqual(reorder.run_reorder_engine(history_days=10)[:2], (2, 0))
+        sold = ReorderSuggestion.objects.get(medication=self.sold)
+        self.assertEqual((sold.avg_daily_sales, sold.days_of_cover), (1.0, 40.0))
+        unsold = ReorderSuggestion.objects.get(medication=self.unsold)
+        self.assertEqual((unsold.days_of_cover, unsold.reorder_point, unsold.suggested_quantity), (None, 5, 0))
+
+        # Un nouveau calcul met à jour les suggestions existantes
+        self.sell(10)
+        self.assertEqual(reorder.run_reorder_engine(history_days=10)[:2], (2, 1))
+        self.assertEqual(ReorderSuggestion.objects.count(), 2)
+        sold = ReorderSuggestion.objects.get(medication=self.sold)
+        # Point de commande ceil(2 × 7 + 1,65 × √40 × √7) = 42 > 30 en stock : cible 102
+        self.assertEqual((sold.avg_daily_sales, sold.reorder_point, sold.suggested_quantity), (2.0, 42, 72))
+
+
+class MovementArchiveTests(TestCase):
+    """Archivage des mouvements anciens en segments compressés"""
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+        patcher = self.settings(ARCHIVE_ROOT=archive_dir.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+        self.medication = Medication.objects.create(
+            name='Métronidazole', dci='Métronidazole', barcode='3400930000401', form='comprimé', dosage='250mg',
+            purchase_price=100, selling_price=150, quantity=0, expiry_date=date(2030, 1, 1),
+        )
+        for movement_type, quantity in (('entrée', 20), ('sortie', 3), ('sortie', 2)):
+            StockMovement.objects.create(medication=self.medication, movement_type=movement_type, quantity=quantity, reference='BR1')
+        self.month = archive.add_months(timezone.localdate().replace(day=1), -14)
+        self.old = timezone.make_aware(datetime(self.month.year, self.month.month, 10, 9, 30))
+        StockMovement.objects.update(created_at=self.old)
+        self.rows = list(StockMovement.objects.order_by('id').values('id', 'movement_type', 'quantity', 'reference'))
+
+    def test_archived_movements_round_trip(self):
+        # Les mois suivants, jusqu'à la limite, sont parcourus mais vides
+        archived = archive.archive_movements(keep_months=12)
+        self.assertEqual((archived[0], sum(count for _, count in archived)), ((self.month, 3), 3))
+        self.assertFalse(StockMovement.objects.exists())
+        segment = MovementArchive.objects.get()
+        self.assertEqual((segment.month, segment.row_count), (self.month, 3))
+        self.assertTrue(os.path.exists(os.path.join(self.archive_dir, segment.path)))
+
+        records = list(archive.read_archived(self.month, medication_id=self.medication.pk))
+        self.assertEqual([{key: record[key] for key in ('id', 'movement_type', 'quantity', 'reference')} for record in records], self.rows)
+        self.assertEqual({record['created_at'] for record in records}, {self.old})
+
+        history = archive.monthly_history(self.medication, months=15)
+        self.assertEqual(
+            [(line['month'], line['in'], line['out'], line['count'], line['archived']) for line in history],
+            [(self.month, 20, 5, 3, True)],
+        )
+        # Rien de plus à archiver au passage suivant
+        self.assertEqual(archive.archive_movements(keep_months=12), [])
+
+    def test_segment_is_verified_before_rows_are_deleted(self):
+        def verify(path, ids):
+            # Relu pendant que les lignes sont encore en base
+            self.assertEqual(StockMovement.objects.count(), 3)
+            raise OSError(f"Segment illisible ou incomplet : {path}")
+
+        with mock.patch.object(archive, 'verify_segment', side_effect=verify), self.assertRaises(OSError):
+            archive.archive_movements(keep_months=12)
+        self.assertEqual(StockMovement.objects.count(), 3)
+        self.assertFalse(MovementArchive.objects.exists())
+        self.assertFalse(MovementMonthlyRollup.objects.exists())
+        self.assertEqual([files for _, _, files in os.walk(self.archive_dir) if files], [])
+
+    def test_refused_without_archive_root(self):
+        with self.settings(ARCHIVE_ROOT=''):
+            with self.assertRaises(ImproperlyConfigured):
+                archive.archive_movements(keep_months=12)
+            with self.assertRaisesMessage(CommandError, "ARCHIVE_ROOT n'est pas défini"):
+                call_command('archive_movements', stdout=io.StringIO())
+        self.assertEqual(StockMovement.objects.count(), 3)
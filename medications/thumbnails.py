@@ -0,0 +1,128 @@
+"""
+Miniatures des images statiques des médicaments (static/images/medicaments/).
+
+Les cartes de la caisse (96 px de haut) et les tuiles de la liste (192 px)
+chargeaient les JPEG d'origine. La commande build_thumbnails génère, avec
+Pillow, une version WebP et une version JPEG de chaque image à quelques
+largeurs fixes, dans static/images/medicaments/thumbs/, et les recense dans
+un manifeste JSON. Le build (build.sh) la lance avant collectstatic :
+les miniatures sont ensuite servies par WhiteNoise comme tout fichier statique.
+
+Medication.image_sources lit ce manifeste pour produire src/srcset ; sans
+manifeste (commande jamais lancée), l'image d'origine est utilisée.
+
+Pour les images uploadées sur Cloudinary, les URLs de livraison aux mêmes
+largeurs (recadrage, format et qualité automatiques) sont calculées une seule
+fois à l'enregistrement (cloudinary_urls) et stockées dans Medication.image_urls.
+"""
+import json
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+
+
+SOURCE_DIR = 'images/medicaments'
+THUMBS_DIR = f'{SOURCE_DIR}/thumbs'
+MANIFEST_NAME = f'{THUMBS_DIR}/manifest.json'
+WIDTHS = (160, 320)          # 1x / 2x des cartes de la caisse et des tuiles de la liste
+CLOUDINARY_TRANSFORMATION = {'crop': 'fill', 'gravity': 'auto', 'fetch_format': 'auto', 'quality': 'auto'}
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 75, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True},
+}
+
+
+def build_thumbnails(force=False, static_root=None):
+    """
+    Génère les miniatures manquantes ou périmées et réécrit le manifeste.
+    Retourne (images traitées, fichiers écrits).
+    """
+    from PIL import Image  # Pillow n'est chargé que par la commande
+
+    root = Path(static_root or settings.STATICFILES_DIRS[0])
+    source_dir = root / SOURCE_DIR
+    thumbs_dir = root / THUMBS_DIR
+    thumbs_dir.mkdir(parents=True, exist_ok=True)
+
+    manifest = {}
+    written = 0
+    sources = sorted(path for path in source_dir.iterdir() if path.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    for source in sources:
+        slug = source.stem
+        entry = manifest.setdefault(slug, {})
+        with Image.open(source) as image:
+            image = image.convert('RGB')
+            for width in WIDTHS:
+                if width > image.width:
+                    continue
+                for extension, options in FORMATS.items():
+                    target = thumbs_dir / f'{slug}-{width}.{extension}'
+                    if force or not target.exists() or target.stat().st_mtime < source.stat().st_mtime:
+                        height = round(image.height * width / image.width)
+                        image.resize((width, height), Image.LANCZOS).save(target, **options)
+                        written += 1
+                    entry.setdefault(extension, {})[width] = f'{THUMBS_DIR}/{target.name}'
+
+    (root / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    load_manifest.cache_clear()
+    return len(sources), written
+
+
+@lru_cache(maxsize=None)
+def load_manifest():
+    """Manifeste des miniatures ({slug: {format: {largeur: chemin}}}), lu une fois par processus."""
+    path = finders.find(MANIFEST_NAME)
+    if not path:
+        return {}
+    with open(path) as manifest:
+        return json.load(manifest)
+
+
+def thumbnail_sources(slug):
+    """
+    {'src', 'srcset', 'webp_srcset'} pour l'image statique `slug`,
+    ou None si aucune miniature n'a été générée.
+    """
+    entry = load_manifest().get(slug)
+    if not entry or 'jpg' not in entry:
+        return None
+
+    def srcset(paths):
+        return ', '.join(f'{static(path)} {width}w' for width, path in sorted(paths.items(), key=lambda item: int(item[0])))
+
+    jpg = entry['jpg']
+    smallest = min(jpg, key=int)
+    return {
+        'src': static(jpg[smallest]),
+        'srcset': srcset(jpg),
+        'webp_srcset': srcset(entry['webp']) if 'webp' in entry else '',
+    }
+
+
+def cloudinary_urls(resource):
+    """
+    URLs de livraison d'une image Cloudinary : {'public_id', 'original',
+    '160', '320'}. Retourne {} si Cloudinary n'est pas configuré.
+    """
+    try:
+        urls = {'public_id': resource.public_id, 'original': resource.url}
+        for width in WIDTHS:
+            urls[str(width)] = resource.build_url(width=width, height=width, **CLOUDINARY_TRANSFORMATION)
+    except ValueError:  # cloud_name absent (développement sans Cloudinary)
+        return {}
+    return urls
+
+
+def cloudinary_sources(urls):
+    """{'src', 'srcset', 'webp_srcset'} à partir des URLs stockées, ou None"""
+    sizes = sorted((int(key), url) for key, url in urls.items() if key.isdigit())
+    if not sizes:
+        return None
+    return {
+        'src': sizes[0][1],
+        'srcset': ', '.join(f'{url} {width}w' for width, url in sizes),
+        'webp_srcset': '',  # f_auto : Cloudinary choisit déjà WebP/AVIF selon le navigateur
+    }
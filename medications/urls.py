@@ -6,6 +6,7 @@ urlpatterns = [
     path('medications/', views.medication_list, name='medication_list'),
     path('medications/create/', views.medication_create, name='medication_create'),
     path('medications/<int:pk>/', views.medication_detail, name='medication_detail'),
+    path('medications/<int:pk>/movements/<int:year>/<int:month>/', views.medication_movements_export, name='medication_movements_export'),
     path('medications/<int:pk>/update/', views.medication_update, name='medication_update'),
     path('medications/<int:pk>/delete/', views.medication_delete, name='medication_delete'),
     
@@ -17,4 +18,7 @@ urlpatterns = [
     
     # Mouvements de stock
     path('medications/<int:medication_pk>/stock-movement/', views.stock_movement_create, name='stock_movement_create'),
+    path('medications/reorder/', views.reorder_report, name='reorder_report'),
+    path('api/low-stock-feed/', views.low_stock_feed, name='low_stock_feed'),
+    path('api/stock-changes/', views.stock_changes, name='stock_changes'),
 ]
@@ -1,15 +1,23 @@
+import csv
+from datetime import date, timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, ProtectedError
-from .models import Medication, Category, StockMovement
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from pharmanps_alou.db_router import replica_reads
+from django.db.models import F, Max, Q, ProtectedError
+from .models import Medication, Category, StockMovement, ReorderSuggestion
+from . import archive, stock_feed
 from django.db.models import Sum # Non utilisé ici mais bonne pratique de l'avoir si besoin d'agrégation
 
 
 @login_required
 def medication_list(request):
     """Liste des médicaments avec recherche et filtres"""
-    medications = Medication.objects.all()
+    medications = Medication.objects.select_related('category')
     categories = Category.objects.all()
     
     # Recherche
@@ -28,7 +36,7 @@ def medication_list(request):
     
     stock_filter = request.GET.get('stock', '')
     if stock_filter == 'low':
-        medications = [m for m in medications if m.is_low_stock]
+        medications = medications.low_stock()
     elif stock_filter == 'expired':
         medications = [m for m in medications if m.is_expired]
     elif stock_filter == 'expiring':
@@ -47,16 +55,51 @@ def medication_list(request):
 @login_required
 def medication_detail(request, pk):
     """Détails d'un médicament"""
-    medication = get_object_or_404(Medication, pk=pk)
-    movements = medication.movements.all()[:10]  # 10 derniers mouvements
+    medication = get_object_or_404(Medication.objects.with_recent_movements(10), pk=pk)
+    movements = medication.recent_movements  # 10 derniers mouvements
     
     context = {
         'medication': medication,
         'movements': movements,
+        # entrées / sorties par mois (cumuls pour les mois archivés)
+        'monthly_history': archive.monthly_history(medication),
     }
     return render(request, 'medications/medication_detail.html', context)
 
 
+@login_required
+def medication_movements_export(request, pk, year, month):
+    """Export CSV des mouvements d'un mois (relus dans les archives si besoin)"""
+    medication = get_object_or_404(Medication, pk=pk)
+    try:
+        first_day = date(year, month, 1)
+    except ValueError:
+        raise Http404("Mois invalide")
+    start, end = archive.month_bounds(first_day)
+    live = (
+        StockMovement.objects
+        .filter(medication=medication, created_at__gte=start, created_at__lt=end)
+        .order_by('created_at')
+        .values('movement_type', 'quantity', 'reason', 'reference', 'created_at', 'created_by_id')
+    )
+    rows = sorted(
+        [*archive.read_archived(first_day, medication.pk), *live],
+        key=lambda movement: movement['created_at'],
+    )
+
+    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="mouvements-{medication.pk}-{first_day:%Y-%m}.csv"'
+    writer = csv.writer(response, delimiter=';')
+    writer.writerow(['date', 'type', 'quantite', 'raison', 'reference', 'utilisateur'])
+    for movement in rows:
+        writer.writerow([
+            timezone.localtime(movement['created_at']).strftime('%d/%m/%Y %H:%M'),
+            movement['movement_type'], movement['quantity'],
+            movement['reason'] or '', movement['reference'] or '', movement['created_by_id'] or '',
+        ])
+    return response
+
+
 @login_required
 def medication_create(request):
     """Créer un nouveau médicament"""
@@ -276,4 +319,59 @@ def stock_movement_create(request, medication_pk):
         'medication': medication,
         'movement_types': StockMovement.MOVEMENT_TYPES,
     }
-    return render(request, 'medications/stock_movement_form.html', context)
\ No newline at end of file
+    return render(request, 'medications/stock_movement_form.html', context)
+
+
+@login_required
+@replica_reads
+def reorder_report(request):
+    """Rapport de réapprovisionnement (suggestions calculées par medications/reorder.py)"""
+    if request.method == 'POST':
+        from .reorder import run_reorder_engine  # NumPy n'est chargé qu'ici
+        count, to_order, elapsed = run_reorder_engine()
+        messages.success(request, f'{count} médicament(s) analysé(s) en {elapsed:.1f} s — {to_order} à commander. ✅')
+        return redirect('reorder_report')
+
+    suggestions = (
+        ReorderSuggestion.objects
+        .filter(suggested_quantity__gt=0)
+        .select_related('medication', 'medication__category')
+        .order_by(F('days_of_cover').asc(nulls_last=True), '-suggested_quantity')
+    )
+    context = {
+        'suggestions': suggestions,
+        'computed_at': ReorderSuggestion.objects.aggregate(last=Max('computed_at'))['last'],
+    }
+    return render(request, 'medications/reorder_report.html', context)
+
+
+@login_required
+def low_stock_feed(request):
+    """API : médicaments ayant franchi le seuil d'alerte (dans un sens ou l'autre) depuis `since`"""
+    since = parse_datetime(request.GET.get('since', ''))
+    if since is None:
+        since = timezone.now() - timedelta(days=1)
+    elif timezone.is_naive(since):
+        since = timezone.make_aware(since)
+
+    medications = Medication.objects.crossed_threshold_since(since).values(
+        'id', 'name', 'quantity', 'min_quantity', 'low_stock', 'low_stock_changed_at',
+    )[:200]
+    return JsonResponse({
+        'since': since.isoformat(),
+        'now': timezone.now().isoformat(),
+        'results': [
+            {**med, 'low_stock_changed_at': med['low_stock_changed_at'].isoformat()}
+            for med in medications
+        ],
+    })
+
+
+@login_required
+def stock_changes(request):
+    """API : quantités en stock modifiées depuis le curseur (voir stock_feed)"""
+    try:
+        cursor, changes = stock_feed.changes_since(request.GET.get('cursor', ''))
+    except ValueError:
+        cursor, changes = stock_feed.current_cursor(), {}
+    return JsonResponse({'cursor': cursor, 'changes': changes})
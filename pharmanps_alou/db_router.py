@@ -0,0 +1,107 @@
+"""
+Lectures sur réplique pour les rapports et le tableau de bord.
+
+Actif seulement si REPLICA_DATABASE_URL est défini (alias 'replica').
+Les lectures ne partent sur la réplique que dans les vues marquées
+@replica_reads (tableau de bord, rapports, exports) ; tout le reste — caisse,
+mouvements de stock, écritures — reste sur la base principale.
+
+Lecture de ses propres écritures : après une requête POST/PUT/PATCH/DELETE,
+ReplicaStickinessMiddleware pose un cookie qui force la base principale pour
+ce navigateur pendant REPLICA_STICKY_SECONDS, le temps que la réplique
+rattrape son retard. Toute lecture faite dans une transaction ouverte sur la
+base principale y reste aussi (rafraîchissement des cumuls, verrous...).
+
+Test local avec deux fichiers SQLite :
+    cp db.sqlite3 replica.sqlite3
+    REPLICA_DATABASE_URL=sqlite:///replica.sqlite3 python manage.py runserver
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+
+REPLICA = 'replica'
+STICKY_COOKIE = 'primary_until'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def reads_from_replica():
+    """Envoie sur la réplique les lectures faites dans le bloc"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_reads(view):
+    """
+    Décorateur de vue : lectures sur la réplique (rapports, tableau de bord,
+    exports) pour les requêtes GET/HEAD ; un POST reste sur la base principale.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        with reads_from_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not (_replica_reads.get() and replica_enabled()) or _pinned_to_primary.get():
+            return 'default'
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Mêmes données des deux côtés : les relations entre alias sont permises
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplique est alimentée par la réplication, jamais migrée directement
+        return db != REPLICA
+
+
+class ReplicaStickinessMiddleware:
+    """Garde sur la base principale le navigateur qui vient d'écrire"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        token = _pinned_to_primary.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned_to_primary.reset(token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            delay = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + delay), max_age=delay,
+                secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,79 @@
+"""
+Admin des grandes tables (ventes, lignes de vente, mouvements de stock).
+
+Deux requêtes deviennent prohibitives à plusieurs millions de lignes : le
+COUNT(*) de la pagination et les SELECT DISTINCT de date_hierarchy.
+LargeTableAdminMixin remplace les deux.
+
+Sur une liste non filtrée, le COUNT(*) exact parcourt toute la table. On le
+remplace par une estimation quasi gratuite :
+
+- PostgreSQL : pg_class.reltuples, tenu à jour par ANALYZE / autovacuum ;
+- SQLite : pas de statistique fiable (MAX(id) est faux après les
+  suppressions en masse de l'archivage) ; le COUNT(*) exact est mis en cache
+  COUNT_CACHE_SECONDS, partagé par tous les affichages de la liste.
+
+Dès qu'un filtre, une recherche ou un niveau de date_hierarchy est actif, le
+comptage redevient exact : il porte alors sur un sous-ensemble indexé.
+
+La navigation par date (voir users/templatetags/admin_dates.py) ne lit que
+MIN/MAX du champ daté et propose ensuite tous les mois puis tous les jours,
+sans vérifier qu'ils contiennent des lignes.
+"""
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+# En dessous, le COUNT(*) exact est moins cher que de s'en passer
+ESTIMATE_THRESHOLD = 10000
+COUNT_CACHE_SECONDS = 300
+
+
+def estimated_row_count(model, using='default'):
+    """Nombre approximatif de lignes de la table du modèle, ou None si inconnu."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # -1 : table jamais analysée
+        return row[0] if row and row[0] >= 0 else None
+    if connection.vendor == 'sqlite':
+        key = f'large_tables:count:{using}:{model._meta.db_table}'
+        count = cache.get(key)
+        if count is None:
+            count = model._default_manager.using(using).count()
+            cache.set(key, count, COUNT_CACHE_SECONDS)
+        return count
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator dont le total est estimé sur les listes non filtrées"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is None or queryset.query.has_filters():
+            return super().count
+        estimate = estimated_row_count(queryset.model, using=queryset.db)
+        if estimate is None or estimate < ESTIMATE_THRESHOLD:
+            return super().count
+        return estimate
+
+
+class LargeTableAdminMixin:
+    """
+    À placer avant admin.ModelAdmin : total estimé, pas de second COUNT(*)
+    pour « Tout afficher », navigation par date sans SELECT DISTINCT.
+    Les champs de clé étrangère restent à déclarer en autocomplete_fields /
+    raw_id_fields dans chaque admin.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/large_table_change_list.html'
@@ -0,0 +1,176 @@
+"""
+Profilage par échantillonnage, en production, de quelques vues choisies.
+
+Actif seulement si PROFILE_URL_NAMES est défini (noms d'URL, ex.
+"create_sale,dashboard") : une requête sur ces vues est profilée avec la
+probabilité PROFILE_SAMPLE_RATE. Les autres requêtes ne paient qu'un test sur
+le nom d'URL.
+
+Le profileur est un échantillonneur de piles : un minuteur SIGPROF
+(temps CPU du processus) interrompt la vue toutes les PROFILE_INTERVAL_MS et
+on note la pile Python courante. Coût ~1 % à 5 ms, sans instrumenter chaque
+appel comme cProfile. Le signal n'est disponible que dans le thread principal
+(workers gunicorn sync) : ailleurs (runserver multi-thread), la requête
+n'est pas profilée. Le temps passé à attendre la base n'apparaît pas dans les
+piles ; il est relevé à part (nombre et durée des requêtes SQL).
+
+Chaque profil est écrit dans PROFILE_DIR, compressé, avec les métadonnées de
+la requête ; seuls les PROFILE_KEEP plus récents sont gardés, le dossier ne
+grossit pas sans limite. Lecture et agrégation (format « collapsed » des
+flame graphs) :
+python manage.py profiles
+"""
+import gzip
+import json
+import os
+import random
+import signal
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils import timezone
+
+
+def frame_label(code):
+    """Libellé d'un cadre : fonction (fichier relatif:ligne de définition)"""
+    filename = code.co_filename
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        filename = filename[len(base) + 1:]
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Échantillonneur de piles sur SIGPROF (thread principal uniquement)"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._previous = None
+
+    @staticmethod
+    def available():
+        return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            stack.append(frame_label(frame.f_code))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._previous = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+
+
+class QueryTimer:
+    """Compte et chronomètre les requêtes SQL (connection.execute_wrapper)"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def save_profile(meta, stacks):
+    """Écrit un profil (JSON gzip) dans PROFILE_DIR et retourne son chemin"""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{meta['url_name']}-{os.getpid()}-{random.randrange(16 ** 4):04x}.json.gz"
+    path = os.path.join(settings.PROFILE_DIR, name)
+    with gzip.open(path, 'wt', encoding='utf-8') as dump:
+        json.dump({'meta': meta, 'stacks': dict(stacks)}, dump)
+    prune_profiles()
+    return path
+
+
+def prune_profiles(keep=None):
+    """Supprime les profils les plus anciens au-delà de `keep` (PROFILE_KEEP). Retourne leur nombre."""
+    keep = settings.PROFILE_KEEP if keep is None else keep
+    # Les noms commencent par la date : l'ordre alphabétique est chronologique
+    names = sorted(name for name in os.listdir(settings.PROFILE_DIR) if name.endswith('.json.gz'))
+    removed = 0
+    for name in names[:max(len(names) - keep, 0)]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, name))
+            removed += 1
+        except FileNotFoundError:
+            # Déjà supprimé par un autre worker
+            pass
+    return removed
+
+
+def load_profiles(url_name=None):
+    """Profils enregistrés (du plus ancien au plus récent), éventuellement filtrés par nom d'URL"""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(settings.PROFILE_DIR)):
+        if not name.endswith('.json.gz'):
+            continue
+        with gzip.open(os.path.join(settings.PROFILE_DIR, name), 'rt', encoding='utf-8') as dump:
+            profile = json.load(dump)
+        if url_name is None or profile['meta']['url_name'] == url_name:
+            profile['meta']['file'] = name
+            profiles.append(profile)
+    return profiles
+
+
+class SamplingProfilerMiddleware:
+    """Profile un échantillon des requêtes sur les vues de PROFILE_URL_NAMES"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.url_names = set(settings.PROFILE_URL_NAMES)
+        self.rate = settings.PROFILE_SAMPLE_RATE
+        if not self.url_names or self.rate <= 0:
+            raise MiddlewareNotUsed
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.resolver_match.url_name in self.url_names
+                and random.random() < self.rate and StackSampler.available()):
+            sampler = StackSampler(settings.PROFILE_INTERVAL_MS / 1000)
+            queries = QueryTimer()
+            request._profiling = (sampler, queries, connection.execute_wrapper(queries), time.perf_counter(), time.process_time())
+            request._profiling[2].__enter__()
+            sampler.start()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        profiling = getattr(request, '_profiling', None)
+        if profiling:
+            sampler, queries, wrapper, started, cpu_started = profiling
+            sampler.stop()
+            wrapper.__exit__(None, None, None)
+            save_profile({
+                'url_name': request.resolver_match.url_name,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'user': request.user.get_username() if hasattr(request, 'user') else '',
+                'at': timezone.now().isoformat(),
+                'wall_ms': round((time.perf_counter() - started) * 1000, 1),
+                'cpu_ms': round((time.process_time() - cpu_started) * 1000, 1),
+                'sql_count': queries.count,
+                'sql_ms': round(queries.seconds * 1000, 1),
+                'interval_ms': settings.PROFILE_INTERVAL_MS,
+                'samples': sum(sampler.stacks.values()),
+            }, sampler.stacks)
+        return response
@@ -12,9 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 import os
-import cloudinary
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,14 +45,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     
-    # Cloudinary (DOIT être avant vos apps)
-    'cloudinary_storage',
-    'cloudinary',
+    # Cloudinary ('cloudinary_storage', 'cloudinary') n'est installé que si
+    # les identifiants sont fournis (voir plus bas)
     
     # Nos apps
     'users',
     'medications',
     'sales',
+    'purchases',
 ]
 
 MIDDLEWARE = [
@@ -111,6 +111,34 @@ else:
         }
     }
 
+# Mode SQLite durci (déploiement mono-serveur) : WAL, synchronous=NORMAL,
+# busy_timeout et mmap posés à chaque connexion (pharmanps_alou/sqlite.py),
+# et transactions en BEGIN IMMEDIATE : le verrou d'écriture est pris dès
+# l'ouverture d'une vente au lieu d'échouer en « database is locked ».
+SQLITE_HARDENED = config('SQLITE_HARDENED', default=True, cast=bool)
+SQLITE_BUSY_TIMEOUT_MS = config('SQLITE_BUSY_TIMEOUT_MS', default=20000, cast=int)
+SQLITE_MMAP_SIZE = config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)
+if SQLITE_HARDENED:
+    for database in DATABASES.values():
+        if database['ENGINE'] == 'django.db.backends.sqlite3':
+            database.setdefault('OPTIONS', {}).setdefault('transaction_mode', 'IMMEDIATE')
+            database['OPTIONS'].setdefault('timeout', SQLITE_BUSY_TIMEOUT_MS / 1000)
+
+# Réplique en lecture (optionnelle) pour le tableau de bord, les rapports et
+# les exports — voir pharmanps_alou/db_router.py
+REPLICA_DATABASE_URL = config('REPLICA_DATABASE_URL', default='')
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        REPLICA_DATABASE_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    # En test, la réplique est un alias de la base de test principale
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['pharmanps_alou.db_router.ReplicaRouter']
+    MIDDLEWARE.append('pharmanps_alou.db_router.ReplicaStickinessMiddleware')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -161,23 +189,27 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 
 # Configuration Cloudinary
-cloudinary.config(
-    cloud_name=config('CLOUDINARY_CLOUD_NAME', default=''),
-    api_key=config('CLOUDINARY_API_KEY', default=''),
-    api_secret=config('CLOUDINARY_API_SECRET', default=''),
-    secure=True
-)
-
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': config('CLOUDINARY_CLOUD_NAME', default=''),
     'API_KEY': config('CLOUDINARY_API_KEY', default=''),
     'API_SECRET': config('CLOUDINARY_API_SECRET', default=''),
 }
+CLOUDINARY_ENABLED = bool(CLOUDINARY_STORAGE['CLOUD_NAME'])
 
 # Si Cloudinary est configuré (production), l'utiliser
 # Sinon utiliser le stockage local (développement)
-if CLOUDINARY_STORAGE['CLOUD_NAME']:
-    # Production : Cloudinary
+if CLOUDINARY_ENABLED:
+    # Production : Cloudinary. Le SDK lit le dictionnaire CLOUDINARY à son
+    # premier import : rien n'est importé ni configuré au chargement des settings.
+    CLOUDINARY = {
+        'cloud_name': CLOUDINARY_STORAGE['CLOUD_NAME'],
+        'api_key': CLOUDINARY_STORAGE['API_KEY'],
+        'api_secret': CLOUDINARY_STORAGE['API_SECRET'],
+        'secure': True,
+    }
+    # Avant nos apps ; le champ image des médicaments suit (medications/fields.py)
+    position = INSTALLED_APPS.index('users')
+    INSTALLED_APPS[position:position] = ['cloudinary_storage', 'cloudinary']
     DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
     MEDIA_URL = '/media/'  # Cloudinary gère l'URL
 else:
@@ -185,6 +217,13 @@ else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# Archives (segments compressés de l'historique sorti des tables chaudes)
+# Pas de valeur par défaut : l'archivage supprime les lignes archivées, et le
+# système de fichiers d'une instance Render est effacé à chaque déploiement.
+# Tant qu'ARCHIVE_ROOT n'est pas défini (disque persistant), les commandes
+# d'archivage refusent de s'exécuter.
+ARCHIVE_ROOT = config('ARCHIVE_ROOT', default='')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -195,6 +234,61 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Cache du projet
+# REDIS_URL (optionnel, nécessite le paquet redis) : cache partagé entre les
+# workers gunicorn ; sinon cache mémoire local à chaque processus.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Sessions et messages (opt-in) — chaque requête authentifiée, y compris les
+# sondages du POS (stock) et du tableau de bord, relit sa session.
+# SESSION_MODE :
+#   db             : sessions en base (défaut, un SELECT django_session par requête)
+#   signed_cookies : session signée dans le cookie, aucune requête ; une
+#                    déconnexion n'invalide pas une copie volée du cookie
+#   cached_db      : lecture dans le cache, la base n'est lue qu'en cas
+#                    d'absence ; exige REDIS_URL (avec le cache mémoire local,
+#                    un worker relirait une session périmée)
+# Hors mode db, les messages flash passent par un cookie et n'écrivent jamais
+# la session. Dans tous les modes, la session n'est réécrite que lorsqu'elle
+# change. Mesure : python manage.py profile_sessions
+SESSION_MODE = config('SESSION_MODE', default='db')
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+if SESSION_MODE not in SESSION_ENGINES:
+    raise ImproperlyConfigured(f"SESSION_MODE inconnu : {SESSION_MODE} (db, cached_db ou signed_cookies).")
+if SESSION_MODE == 'cached_db' and not REDIS_URL:
+    raise ImproperlyConfigured("SESSION_MODE=cached_db exige un cache partagé (REDIS_URL).")
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+if SESSION_MODE != 'db':
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+SESSION_SAVE_EVERY_REQUEST = False
+
+# Profilage par échantillonnage (optionnel) — voir pharmanps_alou/profiling.py
+# Ex. : PROFILE_URL_NAMES=create_sale,dashboard  PROFILE_SAMPLE_RATE=0.05
+PROFILE_URL_NAMES = [name.strip() for name in config('PROFILE_URL_NAMES', default='').split(',') if name.strip()]
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.01, cast=float)
+PROFILE_INTERVAL_MS = config('PROFILE_INTERVAL_MS', default=5, cast=int)
+PROFILE_DIR = config('PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILE_KEEP = config('PROFILE_KEEP', default=500, cast=int)
+if PROFILE_URL_NAMES:
+    MIDDLEWARE.append('pharmanps_alou.profiling.SamplingProfilerMiddleware')
+
 # Security settings pour production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
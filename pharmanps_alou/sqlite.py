@@ -0,0 +1,25 @@
+"""
+Réglages de chaque connexion SQLite en mode durci (SQLITE_HARDENED).
+
+- journal_mode=WAL : les lectures ne bloquent plus l'écriture, et inversement ;
+- synchronous=NORMAL : un fsync par point de contrôle et non par transaction
+  (sans risque de corruption en WAL ; seule la dernière transaction peut être
+  perdue en cas de coupure de courant) ;
+- busy_timeout : attente du verrou au lieu d'une erreur immédiate ;
+- mmap_size : lectures par projection mémoire.
+
+Les transactions elles-mêmes sont ouvertes en BEGIN IMMEDIATE
+(OPTIONS['transaction_mode'] dans settings.py).
+"""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Récepteur du signal connection_created"""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_HARDENED:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}')
+        cursor.execute(f'PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}')
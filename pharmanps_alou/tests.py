@@ -0,0 +1,113 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from medications.models import Category
+from . import profiling
+from .db_router import REPLICA, reads_from_replica, replica_reads
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    Lectures sur la réplique sous @replica_reads, écritures et verrous sur la
+    base principale. La réplique est un second fichier SQLite, aux données
+    distinctes, pour savoir d'où vient chaque lecture (hors transaction de
+    test : une lecture dans une transaction ouverte reste sur la principale).
+    """
+    @classmethod
+    def setUpClass(cls):
+        # Alias créé ici : le lanceur de tests ne prépare que 'default'
+        cls.databases = {'default', REPLICA}
+        directory = cls.enterClassContext(tempfile.TemporaryDirectory())
+        replica = {**connections.settings['default'], 'NAME': str(Path(directory) / 'replica.sqlite3')}
+        # connections.settings est settings.DATABASES : replica_enabled() voit l'alias
+        connections.settings[REPLICA] = replica
+        cls.addClassCleanup(connections.settings.pop, REPLICA)
+        cls.addClassCleanup(connections[REPLICA].close)
+        cls.enterClassContext(override_settings(DATABASE_ROUTERS=['pharmanps_alou.db_router.ReplicaRouter']))
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(Category)
+        Category.objects.using(REPLICA).create(name='Réplique')
+        super().setUpClass()
+
+    def setUp(self):
+        Category.objects.create(name='Principale')
+
+    def names(self):
+        return list(Category.objects.values_list('name', flat=True))
+
+    def test_reads_go_to_the_replica_only_when_asked(self):
+        self.assertEqual(self.names(), ['Principale'])
+        with reads_from_replica():
+            self.assertEqual(self.names(), ['Réplique'])
+
+        view = replica_reads(lambda request: HttpResponse(', '.join(self.names())))
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get('/')).content.decode(), 'Réplique')
+        self.assertEqual(view(factory.post('/')).content.decode(), 'Principale')
+
+    def test_writes_and_locks_stay_on_the_primary(self):
+        with reads_from_replica(), CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            Category.objects.create(name='Écrite')
+            self.assertEqual(Category.objects.select_for_update().db, 'default')
+            with transaction.atomic():
+                locked = list(Category.objects.select_for_update().values_list('name', flat=True))
+                # Lecture dans une transaction ouverte : base principale aussi
+                self.assertEqual(self.names(), locked)
+        self.assertEqual(replica_queries.captured_queries, [])
+        self.assertEqual(locked, ['Principale', 'Écrite'])
+        self.assertEqual(list(Category.objects.using(REPLICA).values_list('name', flat=True)), ['Réplique'])
+
+
+class SamplingProfilerTests(TestCase):
+    """Profilage par échantillonnage des vues de PROFILE_URL_NAMES"""
+
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.profile_dir = profile_dir.name
+        patcher = self.settings(PROFILE_DIR=self.profile_dir)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+    def test_disabled_without_url_names_or_rate(self):
+        for names, rate in (([], 1.0), (['dashboard_stats_api'], 0)):
+            with self.subTest(names=names, rate=rate), self.settings(PROFILE_URL_NAMES=names, PROFILE_SAMPLE_RATE=rate):
+                with self.assertRaises(MiddlewareNotUsed):
+                    profiling.SamplingProfilerMiddleware(lambda request: HttpResponse())
+
+    @override_settings(
+        PROFILE_URL_NAMES=['dashboard_stats_api'], PROFILE_SAMPLE_RATE=1.0,
+        MIDDLEWARE=settings.MIDDLEWARE + ['pharmanps_alou.profiling.SamplingProfilerMiddleware'],
+    )
+    def test_sampled_view_writes_a_profile(self):
+        self.client.force_login(User.objects.create_user('caisse', password='x'))
+        self.assertEqual(self.client.get(reverse('dashboard'), secure=True).status_code, 200)
+        self.assertEqual(profiling.load_profiles(), [])
+
+        self.assertEqual(self.client.get(reverse('dashboard_stats_api'), secure=True).status_code, 200)
+        [profile] = profiling.load_profiles()
+        self.assertEqual(
+            {key: profile['meta'][key] for key in ('url_name', 'method', 'status', 'user')},
+            {'url_name': 'dashboard_stats_api', 'method': 'GET', 'status': 200, 'user': 'caisse'},
+        )
+        self.assertGreater(profile['meta']['sql_count'], 0)
+
+    def test_only_the_latest_profiles_are_kept(self):
+        start = datetime(2026, 3, 15, 9, 0, tzinfo=dt_timezone.utc)
+        with self.settings(PROFILE_KEEP=2), mock.patch.object(
+            profiling.timezone, 'now', side_effect=[start + timedelta(seconds=i) for i in range(4)],
+        ):
+            paths = [profiling.save_profile({'url_name': 'dashboard'}, {}) for _ in range(4)]
+        self.assertEqual(sorted(os.listdir(self.profile_dir)), [os.path.basename(path) for path in paths[2:]])
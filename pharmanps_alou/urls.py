@@ -18,6 +18,7 @@ urlpatterns = [
     path('', include('users.urls')),
     path('', include('medications.urls')),
     path('', include('sales.urls')),
+    path('', include('purchases.urls')),
 ]
 
 # Servir les fichiers media en développement
@@ -0,0 +1,54 @@
+from django.contrib import admin
+from .models import Supplier, PurchaseOrder, PurchaseOrderLine, GoodsReceipt, GoodsReceiptLine
+
+
+class PurchaseOrderLineInline(admin.TabularInline):
+    model = PurchaseOrderLine
+    extra = 1
+    readonly_fields = ('quantity_received',)
+    autocomplete_fields = ('medication',)
+
+
+class GoodsReceiptLineInline(admin.TabularInline):
+    model = GoodsReceiptLine
+    extra = 0
+    readonly_fields = ('medication', 'quantity', 'unit_cost')
+    can_delete = False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('medication')
+
+
+@admin.register(Supplier)
+class SupplierAdmin(admin.ModelAdmin):
+    list_display = ('name', 'phone', 'email', 'created_at')
+    search_fields = ('name', 'phone', 'email')
+
+
+@admin.register(PurchaseOrder)
+class PurchaseOrderAdmin(admin.ModelAdmin):
+    list_display = ('order_number', 'supplier', 'status', 'created_at', 'created_by')
+    list_filter = ('status', 'supplier')
+    list_select_related = ('supplier', 'created_by')
+    search_fields = ('order_number', 'supplier__name')
+    readonly_fields = ('order_number', 'created_at')
+    inlines = [PurchaseOrderLineInline]
+    
+    def save_model(self, request, obj, form, change):
+        if not change and not obj.created_by:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(GoodsReceipt)
+class GoodsReceiptAdmin(admin.ModelAdmin):
+    """Les réceptions sont créées par l'écran de réception (le stock y est mis à jour)"""
+    list_display = ('receipt_number', 'supplier', 'order', 'delivery_reference', 'created_at', 'created_by')
+    list_filter = ('supplier',)
+    list_select_related = ('supplier', 'order', 'created_by')
+    search_fields = ('receipt_number', 'delivery_reference', 'order__order_number')
+    readonly_fields = ('receipt_number', 'order', 'supplier', 'created_at', 'created_by')
+    inlines = [GoodsReceiptLineInline]
+    
+    def has_add_permission(self, request):
+        return False
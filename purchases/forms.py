@@ -0,0 +1,19 @@
+from django import forms
+
+from .models import PurchaseOrder, Supplier
+
+
+class GoodsReceiptForm(forms.Form):
+    """En-tête d'une réception : commande et fournisseur facultatifs, lignes saisies ou importées"""
+    order = forms.ModelChoiceField(
+        queryset=PurchaseOrder.objects.select_related('supplier'), required=False, label="Commande",
+        error_messages={'invalid_choice': "Commande introuvable."},
+    )
+    supplier = forms.ModelChoiceField(
+        queryset=Supplier.objects.all(), required=False, label="Fournisseur",
+        error_messages={'invalid_choice': "Fournisseur introuvable."},
+    )
+    delivery_reference = forms.CharField(max_length=100, required=False, label="Référence de livraison")
+    lines = forms.CharField(required=False, label="Lignes")
+    csv_file = forms.FileField(required=False, label="Fichier CSV")
+    notes = forms.CharField(required=False, label="Notes")
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('medications', '0004_low_stock_flag'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Supplier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='Nom')),
+                ('phone', models.CharField(blank=True, max_length=20, null=True, verbose_name='Téléphone')),
+                ('email', models.EmailField(blank=True, max_length=254, null=True, verbose_name='Email')),
+                ('address', models.TextField(blank=True, null=True, verbose_name='Adresse')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+            ],
+            options={
+                'verbose_name': 'Fournisseur',
+                'verbose_name_plural': 'Fournisseurs',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GoodsReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('receipt_number', models.CharField(max_length=50, unique=True, verbose_name='Numéro de réception')),
+                ('delivery_reference', models.CharField(blank=True, max_length=100, null=True, verbose_name='Référence du bon de livraison')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Reçu le')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Reçu par')),
+            ],
+            options={
+                'verbose_name': 'Réception',
+                'verbose_name_plural': 'Réceptions',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GoodsReceiptLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Quantité reçue')),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name="Prix d'achat unitaire")),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='receipt_lines', to='medications.medication', verbose_name='Médicament')),
+                ('receipt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='purchases.goodsreceipt', verbose_name='Réception')),
+            ],
+            options={
+                'verbose_name': 'Ligne de réception',
+                'verbose_name_plural': 'Lignes de réception',
+            },
+        ),
+        migrations.CreateModel(
+            name='PurchaseOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_number', models.CharField(max_length=50, unique=True, verbose_name='Numéro de commande')),
+                ('status', models.CharField(choices=[('brouillon', 'Brouillon'), ('envoyee', 'Envoyée'), ('partielle', 'Reçue partiellement'), ('recue', 'Reçue'), ('annulee', 'Annulée')], default='brouillon', max_length=20, verbose_name='Statut')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de commande')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Commandé par')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='purchases.supplier', verbose_name='Fournisseur')),
+            ],
+            options={
+                'verbose_name': 'Bon de commande',
+                'verbose_name_plural': 'Bons de commande',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='goodsreceipt',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='receipts', to='purchases.purchaseorder', verbose_name='Commande'),
+        ),
+        migrations.AddField(
+            model_name='goodsreceipt',
+            name='supplier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='receipts', to='purchases.supplier', verbose_name='Fournisseur'),
+        ),
+        migrations.CreateModel(
+            name='PurchaseOrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_ordered', models.PositiveIntegerField(verbose_name='Quantité commandée')),
+                ('quantity_received', models.PositiveIntegerField(default=0, verbose_name='Quantité reçue')),
+                ('unit_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name="Prix d'achat unitaire")),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='order_lines', to='medications.medication', verbose_name='Médicament')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='purchases.purchaseorder', verbose_name='Commande')),
+            ],
+            options={
+                'verbose_name': 'Ligne de commande',
+                'verbose_name_plural': 'Lignes de commande',
+                'constraints': [models.UniqueConstraint(fields=('order', 'medication'), name='unique_order_medication')],
+            },
+        ),
+    ]
@@ -0,0 +1,132 @@
+from django.db import models
+from django.contrib.auth.models import User
+from medications.models import Medication
+from django.utils import timezone
+
+
+class Supplier(models.Model):
+    """Fournisseurs (grossistes, laboratoires)"""
+    name = models.CharField(max_length=200, unique=True, verbose_name="Nom")
+    phone = models.CharField(max_length=20, blank=True, null=True, verbose_name="Téléphone")
+    email = models.EmailField(blank=True, null=True, verbose_name="Email")
+    address = models.TextField(blank=True, null=True, verbose_name="Adresse")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    
+    class Meta:
+        verbose_name = "Fournisseur"
+        verbose_name_plural = "Fournisseurs"
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class PurchaseOrder(models.Model):
+    """Bons de commande fournisseur"""
+    
+    STATUS_CHOICES = [
+        ('brouillon', 'Brouillon'),
+        ('envoyee', 'Envoyée'),
+        ('partielle', 'Reçue partiellement'),
+        ('recue', 'Reçue'),
+        ('annulee', 'Annulée'),
+    ]
+    
+    order_number = models.CharField(max_length=50, unique=True, verbose_name="Numéro de commande")
+    supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, related_name='orders', verbose_name="Fournisseur")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='brouillon', verbose_name="Statut")
+    notes = models.TextField(blank=True, null=True, verbose_name="Notes")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de commande")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Commandé par")
+    
+    class Meta:
+        verbose_name = "Bon de commande"
+        verbose_name_plural = "Bons de commande"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Commande #{self.order_number}"
+    
+    def save(self, *args, **kwargs):
+        # Générer un numéro de commande automatique
+        if not self.order_number:
+            today = timezone.now().date()
+            count = PurchaseOrder.objects.filter(created_at__date=today).count() + 1
+            self.order_number = f"BC{today.strftime('%Y%m%d')}{count:04d}"
+        super().save(*args, **kwargs)
+    
+    @property
+    def is_open(self):
+        """Commande encore attendue (réception possible)"""
+        return self.status in ('brouillon', 'envoyee', 'partielle')
+
+
+class PurchaseOrderLine(models.Model):
+    """Lignes d'un bon de commande : quantité commandée et quantité déjà reçue"""
+    
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='lines', verbose_name="Commande")
+    medication = models.ForeignKey(Medication, on_delete=models.PROTECT, related_name='order_lines', verbose_name="Médicament")
+    quantity_ordered = models.PositiveIntegerField(verbose_name="Quantité commandée")
+    quantity_received = models.PositiveIntegerField(default=0, verbose_name="Quantité reçue")
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name="Prix d'achat unitaire")
+    
+    class Meta:
+        verbose_name = "Ligne de commande"
+        verbose_name_plural = "Lignes de commande"
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'medication'], name='unique_order_medication'),
+        ]
+    
+    def __str__(self):
+        return f"{self.medication.name} : {self.quantity_received}/{self.quantity_ordered}"
+    
+    @property
+    def remaining(self):
+        """Quantité encore attendue"""
+        return max(self.quantity_ordered - self.quantity_received, 0)
+
+
+class GoodsReceipt(models.Model):
+    """Réception d'une livraison (bon de réception)"""
+    
+    receipt_number = models.CharField(max_length=50, unique=True, verbose_name="Numéro de réception")
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.SET_NULL, null=True, blank=True, related_name='receipts', verbose_name="Commande")
+    supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='receipts', verbose_name="Fournisseur")
+    delivery_reference = models.CharField(max_length=100, blank=True, null=True, verbose_name="Référence du bon de livraison")
+    notes = models.TextField(blank=True, null=True, verbose_name="Notes")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Reçu le")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Reçu par")
+    
+    class Meta:
+        verbose_name = "Réception"
+        verbose_name_plural = "Réceptions"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Réception #{self.receipt_number}"
+    
+    def save(self, *args, **kwargs):
+        # Générer un numéro de réception automatique
+        if not self.receipt_number:
+            today = timezone.now().date()
+            count = GoodsReceipt.objects.filter(created_at__date=today).count() + 1
+            self.receipt_number = f"BR{today.strftime('%Y%m%d')}{count:04d}"
+        super().save(*args, **kwargs)
+
+
+class GoodsReceiptLine(models.Model):
+    """Lignes d'une réception"""
+    
+    receipt = models.ForeignKey(GoodsReceipt, on_delete=models.CASCADE, related_name='lines', verbose_name="Réception")
+    medication = models.ForeignKey(Medication, on_delete=models.PROTECT, related_name='receipt_lines', verbose_name="Médicament")
+    quantity = models.PositiveIntegerField(verbose_name="Quantité reçue")
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name="Prix d'achat unitaire")
+    
+    class Meta:
+        verbose_name = "Ligne de réception"
+        verbose_name_plural = "Lignes de réception"
+    
+    def __str__(self):
+        return f"{self.medication.name} x{self.quantity}"
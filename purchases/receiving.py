@@ -0,0 +1,138 @@
+"""
+Réception en masse d'une livraison fournisseur.
+
+Une livraison (douchette ou fichier CSV) est une suite de lignes
+« code-barres[;,]quantité[;,prix d'achat] ». Les lignes sont agrégées par
+code-barres, résolues en une seule requête, puis appliquées en une
+transaction : bon de réception, mouvements 'entrée' en bulk_create,
+quantités mises à jour par UPDATE groupés (voir medications.stock.apply_entries)
+et quantités reçues reportées sur le bon de commande.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from medications.models import Medication
+from medications.stock import BATCH_SIZE, apply_entries
+
+from .models import GoodsReceipt, GoodsReceiptLine, PurchaseOrder, PurchaseOrderLine
+
+
+class ReceivingError(ValueError):
+    """Livraison invalide : la liste `errors` décrit chaque ligne rejetée."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def parse_delivery(text):
+    """
+    Lit une livraison saisie ou importée. Une ligne réduite à un code-barres
+    (scan simple) compte pour une unité ; les lignes vides et l'éventuel
+    en-tête CSV sont ignorés.
+
+    Retourne ({code-barres: [quantité, prix d'achat ou None]}, erreurs).
+    """
+    lines = {}
+    errors = []
+    # Export tableur français (;) ou CSV classique (,)
+    delimiter = ';' if ';' in text[:2048] else ','
+    for number, row in enumerate(csv.reader(io.StringIO(text), delimiter=delimiter), start=1):
+        row = [cell.strip() for cell in row]
+        if not row or not row[0]:
+            continue
+        barcode = row[0]
+        if number == 1 and barcode.lower() in ('barcode', 'code', 'code-barres', 'code_barre'):
+            continue
+        try:
+            quantity = int(row[1]) if len(row) > 1 and row[1] else 1
+            unit_cost = Decimal(row[2].replace(',', '.')) if len(row) > 2 and row[2] else None
+        except (ValueError, InvalidOperation):
+            errors.append(f"Ligne {number} : valeur invalide ({', '.join(row)})")
+            continue
+        if quantity <= 0:
+            errors.append(f"Ligne {number} : quantité invalide ({quantity})")
+            continue
+        entry = lines.setdefault(barcode, [0, None])
+        entry[0] += quantity
+        if unit_cost is not None:
+            entry[1] = unit_cost
+    return lines, errors
+
+
+def receive_delivery(text, user=None, order=None, supplier=None, delivery_reference='', notes=''):
+    """
+    Applique une livraison complète. Rien n'est écrit si une ligne est
+    invalide ou si un code-barres est inconnu (ReceivingError).
+
+    Retourne le GoodsReceipt créé.
+    """
+    lines, errors = parse_delivery(text)
+    if not lines and not errors:
+        errors.append("La livraison est vide.")
+
+    medications = dict(
+        Medication.objects.filter(barcode__in=list(lines)).values_list('barcode', 'id')
+    )
+    unknown = [barcode for barcode in lines if barcode not in medications]
+    errors += [f"Code-barres inconnu : {barcode}" for barcode in unknown]
+    if errors:
+        raise ReceivingError(errors)
+
+    # {medication_id: quantité}, plusieurs codes ne pouvant viser le même produit
+    quantities = {medications[barcode]: quantity for barcode, (quantity, _) in lines.items()}
+    costs = {medications[barcode]: cost for barcode, (_, cost) in lines.items()}
+
+    with transaction.atomic():
+        if order is not None:
+            order = PurchaseOrder.objects.select_for_update().get(pk=order.pk)
+            if not order.is_open:
+                raise ReceivingError([f"La commande {order.order_number} est {order.get_status_display().lower()}."])
+            supplier = supplier or order.supplier
+
+        receipt = GoodsReceipt.objects.create(
+            order=order,
+            supplier=supplier,
+            delivery_reference=delivery_reference or None,
+            notes=notes or None,
+            created_by=user,
+        )
+        GoodsReceiptLine.objects.bulk_create(
+            [
+                GoodsReceiptLine(receipt=receipt, medication_id=pk, quantity=quantity, unit_cost=costs[pk])
+                for pk, quantity in sorted(quantities.items())
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        apply_entries(
+            quantities,
+            reference=receipt.receipt_number,
+            reason=f"Réception {receipt.receipt_number}" + (f" (commande {order.order_number})" if order else ""),
+            user=user,
+        )
+
+        if order is not None:
+            _apply_to_order(order, quantities)
+
+    return receipt
+
+
+def _apply_to_order(order, quantities):
+    """Reporte les quantités reçues sur les lignes de la commande et met à jour son statut."""
+    ids = sorted(quantities)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        order.lines.filter(medication_id__in=batch).update(quantity_received=F('quantity_received') + Case(
+            *[When(medication_id=pk, then=Value(quantities[pk])) for pk in batch],
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+
+    outstanding = order.lines.filter(quantity_received__lt=F('quantity_ordered')).exists()
+    order.status = 'partielle' if outstanding else 'recue'
+    order.save(update_fields=['status'])
@@ -0,0 +1,100 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from medications.models import Medication, StockMovement
+
+from .models import GoodsReceipt, PurchaseOrder, PurchaseOrderLine, Supplier
+from .receiving import ReceivingError, receive_delivery
+
+
+class ReceivingTests(TestCase):
+    """Réception d'une livraison, avec ou sans bon de commande"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('magasin', password='x')
+        cls.supplier = Supplier.objects.create(name='Grossiste')
+
+    def setUp(self):
+        self.paracetamol = self.medication('Paracétamol', '3400930000101')
+        self.ibuprofene = self.medication('Ibuprofène', '3400930000102')
+        self.order = PurchaseOrder.objects.create(supplier=self.supplier, status='envoyee', created_by=self.user)
+        PurchaseOrderLine.objects.create(order=self.order, medication=self.paracetamol, quantity_ordered=10)
+        PurchaseOrderLine.objects.create(order=self.order, medication=self.ibuprofene, quantity_ordered=5)
+
+    def medication(self, name, barcode):
+        return Medication.objects.create(
+            name=name, dci=name, barcode=barcode, form='comprimé', dosage='500mg',
+            purchase_price=100, selling_price=150, quantity=2, expiry_date=date(2030, 1, 1),
+        )
+
+    def quantity(self, medication):
+        return Medication.objects.get(pk=medication.pk).quantity
+
+    def received(self):
+        return dict(self.order.lines.values_list('medication__barcode', 'quantity_received'))
+
+    def test_receiving_against_an_order_enters_stock_and_updates_status(self):
+        receipt = receive_delivery('3400930000101;6\n3400930000102;5;80,50', user=self.user, order=self.order)
+        self.assertEqual(self.quantity(self.paracetamol), 8)
+        self.assertEqual(self.quantity(self.ibuprofene), 7)
+        self.assertEqual(
+            set(StockMovement.objects.values_list('medication__barcode', 'movement_type', 'quantity', 'reference')),
+            {('3400930000101', 'entrée', 6, receipt.receipt_number), ('3400930000102', 'entrée', 5, receipt.receipt_number)},
+        )
+        self.assertEqual(receipt.supplier, self.supplier)
+        self.assertEqual(self.received(), {'3400930000101': 6, '3400930000102': 5})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'partielle')
+
+        # Scans simples : une unité par ligne, agrégées par code-barres
+        receive_delivery('3400930000101\n' * 4, user=self.user, order=self.order)
+        self.assertEqual(self.quantity(self.paracetamol), 12)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'recue')
+
+        with self.assertRaises(ReceivingError):
+            receive_delivery('3400930000101;1', user=self.user, order=self.order)
+
+    def test_over_receipt_and_lines_outside_the_order(self):
+        extra = self.medication('Amoxicilline', '3400930000103')
+        receive_delivery('3400930000101;12\n3400930000102;5\n3400930000103;3', user=self.user, order=self.order)
+        self.assertEqual(self.received(), {'3400930000101': 12, '3400930000102': 5})
+        self.assertEqual(self.quantity(self.paracetamol), 14)
+        self.assertEqual(self.quantity(extra), 5)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'recue')
+
+    def test_invalid_delivery_writes_nothing(self):
+        with self.assertRaises(ReceivingError) as raised:
+            receive_delivery(
+                'code-barres;quantité\n3400930000101;4\n3400930009999;2\n3400930000102;abc\n3400930000102;0',
+                user=self.user, order=self.order,
+            )
+        self.assertEqual(raised.exception.errors, [
+            'Ligne 4 : valeur invalide (3400930000102, abc)',
+            'Ligne 5 : quantité invalide (0)',
+            'Code-barres inconnu : 3400930009999',
+        ])
+        with self.assertRaisesMessage(ReceivingError, 'La livraison est vide.'):
+            receive_delivery('\n\n', user=self.user)
+        self.assertFalse(GoodsReceipt.objects.exists())
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertEqual(self.quantity(self.paracetamol), 2)
+        self.assertEqual(self.received(), {'3400930000101': 0, '3400930000102': 0})
+
+    def test_receipt_form_rejects_an_unknown_order(self):
+        self.client.force_login(self.user)
+        url = reverse('goods_receipt_create')
+        response = self.client.post(url, {'order': 'abc', 'lines': '3400930000101;4'}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Commande introuvable.')
+        self.assertFalse(GoodsReceipt.objects.exists())
+        self.assertEqual(self.client.get(url, {'order': 'abc'}, secure=True).status_code, 404)
+
+        response = self.client.post(url, {'order': self.order.pk, 'lines': '3400930000101;4'}, secure=True)
+        self.assertRedirects(response, reverse('purchase_order_detail', args=[self.order.pk]), fetch_redirect_response=False)
+        self.assertEqual(self.quantity(self.paracetamol), 6)
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Commandes fournisseur
+    path('purchases/', views.purchase_order_list, name='purchase_order_list'),
+    path('purchases/<int:pk>/', views.purchase_order_detail, name='purchase_order_detail'),
+    
+    # Réception
+    path('purchases/receive/', views.goods_receipt_create, name='goods_receipt_create'),
+]
@@ -0,0 +1,110 @@
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.db.models import Count, Sum, F, Q
+from django.http import Http404
+
+from .forms import GoodsReceiptForm
+from .models import Supplier, PurchaseOrder, GoodsReceipt
+from .receiving import ReceivingError, receive_delivery
+
+
+@login_required
+def purchase_order_list(request):
+    """Liste des bons de commande"""
+    orders = (
+        PurchaseOrder.objects
+        .select_related('supplier')
+        .annotate(
+            line_count=Count('lines'),
+            quantity_ordered=Sum('lines__quantity_ordered'),
+            quantity_received=Sum('lines__quantity_received'),
+        )
+    )
+    
+    status = request.GET.get('status', '')
+    if status:
+        orders = orders.filter(status=status)
+    
+    context = {
+        'orders': orders,
+        'status_choices': PurchaseOrder.STATUS_CHOICES,
+        'status_filter': status,
+        'recent_receipts': GoodsReceipt.objects.select_related('supplier', 'order')[:10],
+    }
+    return render(request, 'purchases/purchase_order_list.html', context)
+
+
+@login_required
+def purchase_order_detail(request, pk):
+    """Détail d'un bon de commande : commandé / reçu / restant par ligne"""
+    order = get_object_or_404(PurchaseOrder.objects.select_related('supplier', 'created_by'), pk=pk)
+    lines = order.lines.select_related('medication').order_by('medication__name')
+    totals = lines.aggregate(
+        ordered=Sum('quantity_ordered'),
+        received=Sum('quantity_received'),
+        outstanding=Count('id', filter=Q(quantity_received__lt=F('quantity_ordered'))),
+    )
+    
+    context = {
+        'order': order,
+        'lines': lines,
+        'totals': totals,
+        'receipts': order.receipts.select_related('created_by'),
+    }
+    return render(request, 'purchases/purchase_order_detail.html', context)
+
+
+@login_required
+def goods_receipt_create(request):
+    """Écran de réception : une livraison complète, scannée ou importée en CSV"""
+    if request.method == 'POST':
+        form = GoodsReceiptForm(request.POST, request.FILES)
+        if not form.is_valid():
+            for errors in form.errors.values():
+                for error in errors:
+                    messages.error(request, error)
+            return _goods_receipt_form(request, form.cleaned_data.get('order'), form_data=request.POST)
+        
+        order = form.cleaned_data['order']
+        text = form.cleaned_data['lines']
+        upload = form.cleaned_data['csv_file']
+        if upload:
+            text += '\n' + upload.read().decode('utf-8-sig', errors='replace')
+        
+        try:
+            receipt = receive_delivery(
+                text,
+                user=request.user,
+                order=order,
+                supplier=form.cleaned_data['supplier'],
+                delivery_reference=form.cleaned_data['delivery_reference'],
+                notes=form.cleaned_data['notes'],
+            )
+        except ReceivingError as e:
+            for error in e.errors[:20]:
+                messages.error(request, error)
+            if len(e.errors) > 20:
+                messages.error(request, f'... et {len(e.errors) - 20} autre(s) erreur(s).')
+            return _goods_receipt_form(request, order, form_data=request.POST)
+        
+        count = receipt.lines.count()
+        messages.success(request, f'Réception {receipt.receipt_number} enregistrée : {count} ligne(s) mise(s) en stock ! ✅')
+        if order:
+            return redirect('purchase_order_detail', pk=order.pk)
+        return redirect('purchase_order_list')
+    
+    form = GoodsReceiptForm(request.GET)
+    if not form.is_valid():
+        raise Http404("Commande introuvable.")
+    return _goods_receipt_form(request, form.cleaned_data['order'])
+
+
+def _goods_receipt_form(request, order, form_data=None):
+    context = {
+        'order': order,
+        'suppliers': Supplier.objects.all(),
+        'open_orders': PurchaseOrder.objects.filter(status__in=['brouillon', 'envoyee', 'partielle']).select_related('supplier'),
+        'form_data': form_data,
+    }
+    return render(request, 'purchases/goods_receipt_form.html', context)
@@ -1,11 +1,24 @@
 from django.contrib import admin
-from .models import Customer, Sale, SaleItem, Prescription
+from pharmanps_alou.large_tables import LargeTableAdminMixin
+from .models import Customer, Sale, SaleItem, Prescription, RevenueRollup, MedicationSalesCounter, SaleDocument, SaleArchive
 
 
 class SaleItemInline(admin.TabularInline):
+    """
+    Lignes en lecture seule : elles sont créées par la caisse, avec leurs
+    mouvements de stock. Modifiées ici, elles ne toucheraient ni le stock ni
+    le total de la vente ; et un champ médicament éditable coûterait une
+    requête (ou une liste de tout le catalogue) par ligne affichée.
+    """
     model = SaleItem
     extra = 0
-    readonly_fields = ('subtotal',)
+    readonly_fields = ('medication', 'quantity', 'unit_price', 'subtotal')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('medication')
 
 
 @admin.register(Customer)
@@ -16,22 +29,65 @@ class CustomerAdmin(admin.ModelAdmin):
 
 
 @admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
+class SaleAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('sale_number', 'customer', 'total', 'payment_method', 'status', 'created_at', 'created_by')
-    list_filter = ('status', 'payment_method', 'created_at')
+    list_filter = ('status', 'payment_method')
     search_fields = ('sale_number', 'customer__first_name', 'customer__last_name')
     readonly_fields = ('sale_number', 'subtotal', 'discount_amount', 'total', 'change_amount', 'created_at')
+    autocomplete_fields = ('customer',)
+    raw_id_fields = ('created_by',)
     inlines = [SaleItemInline]
+    date_hierarchy = 'created_at'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_listing()
 
 
 @admin.register(SaleItem)
-class SaleItemAdmin(admin.ModelAdmin):
+class SaleItemAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('sale', 'medication', 'quantity', 'unit_price', 'subtotal')
+    list_select_related = ('sale', 'medication')
     search_fields = ('sale__sale_number', 'medication__name')
+    autocomplete_fields = ('medication',)
+    raw_id_fields = ('sale',)
+    date_hierarchy = 'sale__created_at'
 
 
 @admin.register(Prescription)
 class PrescriptionAdmin(admin.ModelAdmin):
     list_display = ('customer', 'doctor_name', 'prescription_date', 'sale', 'created_at')
+    list_select_related = ('customer', 'sale')
+    autocomplete_fields = ('customer',)
+    raw_id_fields = ('sale',)
     list_filter = ('prescription_date',)
     search_fields = ('customer__first_name', 'customer__last_name', 'doctor_name')
+
+
+@admin.register(RevenueRollup)
+class RevenueRollupAdmin(admin.ModelAdmin):
+    list_display = ('period', 'period_start', 'dimension', 'key', 'revenue', 'sales_count', 'quantity')
+    list_filter = ('period', 'dimension')
+    date_hierarchy = 'period_start'
+
+
+@admin.register(MedicationSalesCounter)
+class MedicationSalesCounterAdmin(admin.ModelAdmin):
+    list_display = ('medication', 'quantity_7d', 'quantity_30d', 'quantity_90d', 'revenue_30d', 'computed_at')
+    list_select_related = ('medication',)
+    search_fields = ('medication__name',)
+    ordering = ('-quantity_30d',)
+
+
+@admin.register(SaleDocument)
+class SaleDocumentAdmin(admin.ModelAdmin):
+    list_display = ('sale', 'status', 'rendered_at')
+    list_select_related = ('sale',)
+    list_filter = ('status',)
+    search_fields = ('sale__sale_number',)
+    readonly_fields = ('sale', 'status', 'invoice_html', 'detail_html', 'rendered_at')
+
+
+@admin.register(SaleArchive)
+class SaleArchiveAdmin(admin.ModelAdmin):
+    list_display = ('first_date', 'last_date', 'sales_count', 'items_count', 'revenue', 'path', 'created_at')
+    readonly_fields = ('path', 'first_date', 'last_date', 'sales_count', 'items_count', 'revenue', 'created_at')
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales'
+
+    def ready(self):
+        # Jours des ventes créées, modifiées ou supprimées : à recalculer (voir sales/reporting.py)
+        from . import reporting
+        from .models import Sale, SaleItem
+        post_save.connect(reporting.sale_changed, sender=Sale, dispatch_uid='rollups_sale_saved')
+        post_delete.connect(reporting.sale_changed, sender=Sale, dispatch_uid='rollups_sale_deleted')
+        post_save.connect(reporting.item_changed, sender=SaleItem, dispatch_uid='rollups_item_saved')
+        post_delete.connect(reporting.item_changed, sender=SaleItem, dispatch_uid='rollups_item_deleted')
@@ -0,0 +1,317 @@
+"""
+Stockage froid des ventes anciennes.
+
+Les ventes complétées sans client des mois révolus plus anciens que
+`keep_months` sont sorties de Sale / SaleItem (et de leurs documents rendus), un mois à la fois
+et dans une transaction, vers un segment compressé en colonnes :
+
+    ARCHIVE_ROOT/sales/AAAA-MM.<premier id>.npz
+
+Chaque colonne est un tableau NumPy typé (entiers, montants en centimes,
+chaînes de longueur fixe) : un segment se relit sans pickle et une colonne
+n'est décompressée que si elle est lue. La ligne SaleArchive du segment porte
+ses dates min/max : seuls les segments qui recouvrent une plage sont ouverts.
+
+Comme pour les mouvements (medications/archive.py), rien n'est archivé tant
+qu'ARCHIVE_ROOT n'est pas défini, et un segment est relu avant que ses
+ventes ne soient supprimées.
+
+Les ventes rattachées à un client restent en base : sa fiche (historique,
+total dépensé) les lit directement. L'historique des ventes signale les
+ventes archivées et compte leur chiffre d'affaires (summary).
+
+Le reporting (sales/reporting.py) additionne les cumuls journaliers calculés
+ici à ceux des ventes encore en base : les jours archivés, marqués par la
+suppression de leurs ventes, sont recalculés à l'identique depuis les segments.
+"""
+import os
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from medications.archive import MIN_KEEP_MONTHS, add_months, archive_root, month_bounds
+from medications.models import Medication
+from .models import RevenueRollup, Sale, SaleArchive, SaleItem
+
+
+DELETE_BATCH = 500
+
+SALE_COLUMNS = ('id', 'sale_number', 'customer_id', 'created_by_id', 'payment_method', 'notes')
+MONEY_COLUMNS = ('subtotal', 'discount_percentage', 'discount_amount', 'total', 'amount_paid', 'change_amount')
+ITEM_COLUMNS = ('sale_id', 'medication_id', 'quantity')
+ITEM_MONEY_COLUMNS = ('unit_price', 'subtotal')
+
+# Axes de RevenueRollup portés par la vente (la catégorie est calculée à part)
+SALE_DIMENSIONS = {'total': None, 'payment_method': 'payment_method', 'cashier': 'created_by_id'}
+
+
+def cents(values):
+    import numpy as np
+    return np.asarray([int(value * 100) for value in values], dtype=np.int64)
+
+
+def from_cents(value):
+    return (Decimal(int(round(value))) / 100).quantize(Decimal('0.01'))
+
+
+def ids(values):
+    """Clés étrangères nullables : -1 pour NULL"""
+    import numpy as np
+    return np.asarray([-1 if value is None else value for value in values], dtype=np.int64)
+
+
+def segment_path(archive):
+    return os.path.join(archive_root(), archive.path)
+
+
+def load_segment(archive):
+    """Colonnes d'un segment (chargées à la demande, sans pickle)"""
+    import numpy as np
+    return np.load(segment_path(archive), allow_pickle=False)
+
+
+# -------------------------------------------------------------------------
+# Archivage
+# -------------------------------------------------------------------------
+
+def archivable():
+    """Ventes pouvant quitter la base : complétées et sans client"""
+    return Sale.objects.filter(status='completee', customer__isnull=True)
+
+
+def archivable_months(keep_months):
+    """Mois (1er du mois) ayant encore des ventes archivables plus anciennes que `keep_months` mois"""
+    cutoff = add_months(timezone.localdate().replace(day=1), -keep_months)
+    oldest = (
+        archivable().filter(created_at__lt=month_bounds(cutoff)[0])
+        .aggregate(first=Min('created_at'))['first']
+    )
+    if oldest is None:
+        return []
+    month = timezone.localtime(oldest).date().replace(day=1)
+    months = []
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_month(month):
+    """
+    Archive les ventes complétées sans client d'un mois. Retourne le nombre de ventes archivées.
+    Le segment est écrit avant le commit et supprimé si la transaction échoue.
+    """
+    import numpy as np
+
+    start, end = month_bounds(month)
+    with transaction.atomic():
+        sales = list(
+            archivable().filter(created_at__gte=start, created_at__lt=end)
+            .order_by('id')
+            .values_list(*SALE_COLUMNS, *MONEY_COLUMNS, 'created_at')
+        )
+        if not sales:
+            return 0
+        items = list(
+            SaleItem.objects.filter(
+                sale__status='completee', sale__customer__isnull=True,
+                sale__created_at__gte=start, sale__created_at__lt=end,
+            )
+            .order_by('sale_id', 'id')
+            .values_list(*ITEM_COLUMNS, *ITEM_MONEY_COLUMNS)
+        )
+        sale_columns = list(zip(*sales))
+        item_columns = list(zip(*items)) if items else [()] * (len(ITEM_COLUMNS) + len(ITEM_MONEY_COLUMNS))
+        created_at = sale_columns[-1]
+
+        columns = {
+            'id': np.asarray(sale_columns[0], dtype=np.int64),
+            'sale_number': np.asarray(sale_columns[1], dtype=str),
+            'customer_id': ids(sale_columns[2]),
+            'created_by_id': ids(sale_columns[3]),
+            'payment_method': np.asarray(sale_columns[4], dtype=str),
+            'notes': np.asarray([notes or '' for notes in sale_columns[5]], dtype=str),
+            'created_at': np.asarray(
+                [int(moment.timestamp() * 1_000_000) for moment in created_at], dtype=np.int64,
+            ),
+            'day': np.asarray([timezone.localtime(moment).date().toordinal() for moment in created_at], dtype=np.int32),
+            'item_sale_id': np.asarray(item_columns[0], dtype=np.int64),
+            'item_medication_id': np.asarray(item_columns[1], dtype=np.int64),
+            'item_quantity': np.asarray(item_columns[2], dtype=np.int64),
+        }
+        for offset, name in enumerate(MONEY_COLUMNS, start=len(SALE_COLUMNS)):
+            columns[name] = cents(sale_columns[offset])
+        for offset, name in enumerate(ITEM_MONEY_COLUMNS, start=len(ITEM_COLUMNS)):
+            columns[f'item_{name}'] = cents(item_columns[offset])
+
+        relative = os.path.join('sales', f"{month:%Y-%m}.{sales[0][0]}.npz")
+        path = os.path.join(archive_root(), relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open(path + '.tmp', 'wb') as segment:
+                np.savez_compressed(segment, **columns)
+            os.replace(path + '.tmp', path)
+            # Les ventes ne sont supprimées qu'une fois le segment relu
+            with np.load(path, allow_pickle=False) as stored:
+                if not (np.array_equal(stored['id'], columns['id'])
+                        and np.array_equal(stored['total'], columns['total'])
+                        and len(stored['item_sale_id']) == len(items)):
+                    raise OSError(f"Segment illisible ou incomplet : {path}")
+
+            SaleArchive.objects.create(
+                path=relative,
+                first_date=date.fromordinal(int(columns['day'].min())),
+                last_date=date.fromordinal(int(columns['day'].max())),
+                sales_count=len(sales),
+                items_count=len(items),
+                revenue=from_cents(columns['total'].sum()),
+            )
+            # Lignes et documents rendus suivent la vente (CASCADE) ; les ordonnances sont conservées
+            sale_ids = columns['id'].tolist()
+            for i in range(0, len(sale_ids), DELETE_BATCH):
+                Sale.objects.filter(id__in=sale_ids[i:i + DELETE_BATCH]).delete()
+        except BaseException:
+            for leftover in (path, path + '.tmp'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+    return len(sales)
+
+
+def archive_sales(keep_months=12):
+    """Archive les ventes sans client des mois plus anciens que `keep_months`. Retourne [(mois, ventes)]."""
+    from . import reporting
+
+    if keep_months < MIN_KEEP_MONTHS:
+        raise ValueError(f"Il faut garder au moins {MIN_KEEP_MONTHS} mois de ventes (compteurs, réapprovisionnement).")
+    archive_root()
+    # Les cumuls des jours archivés doivent être à jour avant que les ventes ne quittent la base
+    reporting.refresh_rollups()
+    return [(month, archive_month(month)) for month in archivable_months(keep_months)]
+
+
+# -------------------------------------------------------------------------
+# Lecture (reporting)
+# -------------------------------------------------------------------------
+
+def summary(day=None):
+    """
+    Ventes archivées (toutes, ou des segments qui recouvrent `day`) :
+    {'count', 'revenue', 'first', 'last'}, ou None s'il n'y en a pas.
+    Ne lit que l'index SaleArchive, aucun segment.
+    """
+    archives = SaleArchive.objects.all()
+    if day is not None:
+        archives = archives.filter(first_date__lte=day, last_date__gte=day)
+    totals = archives.aggregate(
+        count=Sum('sales_count'), revenue=Sum('revenue'), first=Min('first_date'), last=Max('last_date'),
+    )
+    return totals if totals['count'] else None
+
+
+def archived_days():
+    """Jours ayant des ventes archivées"""
+    archives = list(SaleArchive.objects.all())
+    if not archives:
+        return set()
+    import numpy as np
+
+    days = set()
+    for archive in archives:
+        days.update(np.unique(load_segment(archive)['day']).tolist())
+    return {date.fromordinal(day) for day in days}
+
+
+def _grouped(days, keys, *weights):
+    """Regroupe par (jour, clé) : yield (jour, clé, effectif, somme de chaque poids)"""
+    import numpy as np
+
+    records = np.rec.fromarrays([days, keys], names='day,key')
+    groups, inverse = np.unique(records, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(groups))
+    sums = [np.bincount(inverse, weights=weight, minlength=len(groups)) for weight in weights]
+    for i, (day, key) in enumerate(groups):
+        yield date.fromordinal(int(day)), str(key), int(counts[i]), *(total[i] for total in sums)
+
+
+def day_rows(days):
+    """
+    Cumuls journaliers (RevenueRollup non enregistrés) des ventes archivées
+    pour les jours donnés, sur les mêmes axes que reporting._day_rows().
+    """
+    days = sorted(set(days))
+    if not days:
+        return []
+    archives = list(SaleArchive.objects.filter(first_date__lte=days[-1], last_date__gte=days[0]))
+    if not archives:
+        return []
+    # NumPy n'est chargé que si des segments sont à relire (pas dans les workers web)
+    import numpy as np
+    from .reporting import allocate, category_order
+
+    wanted = np.asarray([day.toordinal() for day in days], dtype=np.int32)
+    rows = []
+
+    for archive in archives:
+        segment = load_segment(archive)
+        selected = np.isin(segment['day'], wanted)
+        if not selected.any():
+            continue
+        sale_ids = segment['id'][selected]
+        sale_days = segment['day'][selected]
+
+        # Lignes des ventes retenues, rattachées à leur vente (ids triés)
+        item_selected = np.isin(segment['item_sale_id'], sale_ids)
+        position = np.searchsorted(sale_ids, segment['item_sale_id'][item_selected])
+        item_quantity = segment['item_quantity'][item_selected]
+        quantity_per_sale = np.bincount(position, weights=item_quantity, minlength=len(sale_ids))
+
+        for dimension, column in SALE_DIMENSIONS.items():
+            if column is None:
+                keys = np.full(len(sale_ids), '')
+            elif column == 'created_by_id':
+                values = segment[column][selected]
+                keys = np.where(values < 0, '', values.astype(str))
+            else:
+                keys = segment[column][selected]
+            for day, key, count, revenue, quantity in _grouped(sale_days, keys, segment['total'][selected], quantity_per_sale):
+                rows.append(RevenueRollup(
+                    period='day', period_start=day, dimension=dimension, key=key,
+                    revenue=from_cents(revenue), sales_count=count, quantity=int(quantity),
+                ))
+
+        # Catégories (catégorie actuelle du médicament) : même répartition que
+        # pour les ventes en base (reporting.allocate), vente par vente
+        medication_ids = segment['item_medication_id'][item_selected]
+        categories = dict(
+            Medication.objects.filter(id__in=np.unique(medication_ids).tolist()).values_list('id', 'category_id')
+        )
+        per_sale = {}
+        for sale, medication_id, amount, quantity in zip(
+            position.tolist(), medication_ids.tolist(),
+            segment['item_subtotal'][item_selected].tolist(), item_quantity.tolist(),
+        ):
+            lines = per_sale.setdefault(sale, {})
+            category_id = categories.get(medication_id)
+            amount_so_far, quantity_so_far = lines.get(category_id, (0, 0))
+            lines[category_id] = (amount_so_far + amount, quantity_so_far + quantity)
+
+        totals = segment['total'][selected].tolist()
+        grouped = {}
+        for sale, lines in per_sale.items():
+            day = date.fromordinal(int(sale_days[sale]))
+            ordered = sorted(lines.items(), key=lambda line: category_order(line[0]))
+            shares = allocate(from_cents(totals[sale]), [Decimal(amount) / 100 for _, (amount, _) in ordered])
+            for (category_id, (_, quantity)), share in zip(ordered, shares):
+                key = (day, '' if category_id is None else str(category_id))
+                revenue, sales_count, total_quantity = grouped.get(key, (Decimal('0'), 0, 0))
+                grouped[key] = (revenue + share, sales_count + 1, total_quantity + quantity)
+        for (day, key), (revenue, sales_count, quantity) in grouped.items():
+            rows.append(RevenueRollup(
+                period='day', period_start=day, dimension='category', key=key,
+                revenue=revenue, sales_count=sales_count, quantity=quantity,
+            ))
+    return rows
@@ -0,0 +1,185 @@
+"""
+Encaissement d'un panier (API create_sale).
+
+Stock : aucun SELECT ... FOR UPDATE. La vente et ses lignes sont écrites
+d'abord ; le stock est décrémenté en dernier, par un UPDATE conditionnel par
+médicament (medications.stock.withdraw), dans l'ordre croissant des
+identifiants. Les verrous de ligne des produits les plus vendus ne sont tenus
+que du décrément au commit, et la survente se lit dans le nombre de lignes
+modifiées ; la contrainte quantity >= 0 garantit le reste. Le panier
+consomme ses réservations (medications/reservations.py) : seules celles des
+autres paniers sont retenues par le décrément. Les médicaments
+en bandes (medications/striping.py) ne verrouillent qu'une de leurs bandes.
+Le numéro de la vente, tiré du nombre de ventes du jour, peut avoir été pris
+par une caisse concurrente : Sale.save en essaie alors un autre.
+Les compteurs (reporting.record_sale_counters) sont mis à jour après le
+commit, dans le même ordre. Les cumuls de chiffre d'affaires ne sont pas
+recalculés ici : la vente marque seulement son jour (sales/reporting.py).
+
+Reprise : si la base abandonne malgré tout la transaction (interblocage,
+échec de sérialisation sur Postgres, base verrouillée sur SQLite), la vente
+est rejouée en entier après une attente aléatoire (« full jitter » :
+uniforme entre 0 et RETRY_BASE_DELAY * 2^tentative), au plus RETRY_ATTEMPTS
+fois. Au-delà, CheckoutConflict est levée.
+
+Les compteurs (ventes, reprises par cause, abandons) sont tenus dans le cache
+(partagé entre workers avec REDIS_URL, par processus sinon) et exposés par
+checkout_metrics() (API api/checkout/metrics/).
+"""
+import random
+import time
+from decimal import Decimal
+from functools import partial
+
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, transaction
+
+from medications import reservations, stock
+from medications.models import Medication
+from .models import Sale, SaleItem
+from . import reporting
+
+
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.05    # secondes
+RETRY_MAX_DELAY = 1.0
+
+# Codes SQLSTATE Postgres rejouables
+CONFLICT_CODES = {'40P01': 'deadlock', '40001': 'serialization'}
+
+METRICS_KEY = 'checkout_metrics:{}'
+METRICS = ('checkouts', 'retried', 'retry_deadlock', 'retry_serialization', 'retry_locked', 'gave_up')
+
+
+class CheckoutConflict(Exception):
+    """La vente a échoué sur des conflits de verrous à chaque tentative"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def conflict_reason(error):
+    """Cause d'un OperationalError rejouable ('deadlock', 'serialization', 'locked'), sinon None"""
+    pgcode = getattr(error.__cause__, 'pgcode', None)
+    if pgcode in CONFLICT_CODES:
+        return CONFLICT_CODES[pgcode]
+    if 'database is locked' in str(error):
+        return 'locked'
+    return None
+
+
+def record_metric(name):
+    key = METRICS_KEY.format(name)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Clé évincée entre add() et incr()
+        cache.set(key, 1, timeout=None)
+
+
+def checkout_metrics():
+    """Compteurs de reprise depuis le dernier redémarrage du cache"""
+    values = cache.get_many([METRICS_KEY.format(name) for name in METRICS])
+    return {name: values.get(METRICS_KEY.format(name), 0) for name in METRICS}
+
+
+def backoff(attempt):
+    """Attente avant la tentative suivante (full jitter)"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def with_retry(func, *args, **kwargs):
+    """
+    Exécute `func` (qui ouvre sa propre transaction) en la rejouant sur
+    conflit de verrous. Ne doit pas être appelée dans une transaction ouverte :
+    la transaction abandonnée serait celle de l'appelant.
+    """
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            result = func(*args, **kwargs)
+        except OperationalError as error:
+            reason = conflict_reason(error)
+            if reason is None or transaction.get_connection().in_atomic_block:
+                raise
+            record_metric(f'retry_{reason}')
+            if attempt == RETRY_ATTEMPTS - 1:
+                record_metric('gave_up')
+                raise CheckoutConflict(reason) from error
+            time.sleep(backoff(attempt))
+        else:
+            record_metric('checkouts')
+            if attempt:
+                record_metric('retried')
+            return result
+
+
+def requested_quantities(items_data):
+    """
+    Quantités demandées par médicament (un même produit peut apparaître deux
+    fois dans le panier). Valide le panier avant toute écriture.
+    """
+    quantities = {}
+    for item in items_data:
+        try:
+            qty = int(item['quantity'])
+            med_id = int(item['medication_id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Quantité invalide dans le panier.")
+        if qty <= 0:
+            raise ValueError("Quantité invalide dans le panier.")
+        quantities[med_id] = quantities.get(med_id, 0) + qty
+    return quantities
+
+
+def place_sale(data, user):
+    """Enregistre la vente d'un panier dans une transaction. Retourne la vente."""
+    items_data = data.get('items', [])
+    quantities = requested_quantities(items_data)
+
+    lines = []
+    for item in items_data:
+        line = SaleItem(
+            medication_id=int(item['medication_id']),
+            quantity=int(item['quantity']),
+            unit_price=Decimal(str(item['unit_price'])),
+        )
+        line.subtotal = line.unit_price * line.quantity
+        lines.append(line)
+
+    try:
+        with transaction.atomic():
+            sale = Sale.objects.create(
+                customer_id=data.get('customer_id') if data.get('customer_id') else None,
+                subtotal=sum(line.subtotal for line in lines),
+                discount_percentage=data.get('discount_percentage', 0),
+                payment_method=data.get('payment_method'),
+                amount_paid=data.get('amount_paid', 0),
+                created_by=user,
+                # Statut forcé à 'completee' lors de la finalisation
+                status='completee',
+            )
+            for line in lines:
+                line.sale = sale
+            SaleItem.objects.bulk_create(lines)
+
+            # Compteurs glissants des meilleures ventes : après le commit, pour
+            # ne pas tenir le verrou de leur ligne pendant la vente (un compteur
+            # manqué est rattrapé par refresh_sales_counters)
+            transaction.on_commit(partial(reporting.record_sale_counters, lines), robust=True)
+
+            # En dernier : le panier rend ses réservations, puis décrément
+            # conditionnel (réservations des autres paniers) et mouvements de sortie
+            if data.get('cart'):
+                reservations.consume(str(data['cart']))
+            stock.withdraw(
+                [(line.medication_id, line.quantity) for line in lines],
+                reference=sale.sale_number, reason=f"Vente #{sale.sale_number}", user=user,
+            )
+    except IntegrityError:
+        # Clé étrangère vers un médicament supprimé (vérifiée hors de la transaction annulée)
+        if Medication.objects.filter(id__in=quantities).count() != len(quantities):
+            raise Medication.DoesNotExist
+        raise
+    return sale
@@ -0,0 +1,45 @@
+"""
+Factures et pages de détail des ventes finalisées, rendues une seule fois.
+
+Le rendu est fait à la finalisation de la vente (create_sale) et stocké en
+base dans SaleDocument : une réimpression ou la consultation de l'historique
+d'un client devient une simple lecture. Le rendu n'est refait que si le
+statut de la vente a changé depuis (annulation) ; les ventes encore
+« en cours » sont toujours rendues à la volée.
+
+Les vues lisent la vente seule : ses lignes, son client et son caissier ne
+sont préchargés (Sale.objects.with_details()) qu'en l'absence de rendu
+stocké, par render_documents ou pour un rendu à la volée.
+"""
+from django.template.loader import render_to_string
+
+from .models import Sale, SaleDocument
+
+
+FROZEN_STATUSES = ('completee', 'annulee')
+
+
+def render_documents(sale):
+    """Rend et enregistre la facture et le détail de la vente. Retourne le SaleDocument."""
+    sale = Sale.objects.with_details().get(pk=sale.pk)
+    context = {'sale': sale}
+    document, _ = SaleDocument.objects.update_or_create(
+        sale=sale,
+        defaults={
+            'status': sale.status,
+            'invoice_html': render_to_string('sales/invoice.html', context),
+            'detail_html': render_to_string('sales/sale_detail_body.html', context),
+        },
+    )
+    return document
+
+
+def get_documents(sale):
+    """
+    Rendu stocké de la vente, (re)généré si absent ou si le statut a changé.
+    Retourne None pour une vente non finalisée.
+    """
+    if sale.status not in FROZEN_STATUSES:
+        return None
+    document = SaleDocument.objects.filter(sale=sale, status=sale.status).first()
+    return document or render_documents(sale)
@@ -0,0 +1,46 @@
+"""
+Sort les ventes complétées sans client des mois révolus plus anciens que
+--keep-months des tables chaudes : segments compressés en colonnes sous ARCHIVE_ROOT, index
+des dates min/max en base. Les cumuls du reporting sont mis à jour avant et
+continuent d'inclure ces ventes ; celles d'un client restent en base. Un mois par transaction ; sans risque à relancer.
+Refuse de s'exécuter tant qu'ARCHIVE_ROOT (disque persistant) n'est pas défini.
+
+Usage :  python manage.py archive_sales [--keep-months 12] [--dry-run]
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import archive
+
+
+class Command(BaseCommand):
+    help = "Archive les ventes complétées anciennes sans client (segments compressés en colonnes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=12, help="Mois gardés en base, mois en cours inclus (défaut : 12).")
+        parser.add_argument('--dry-run', action='store_true', help="Affiche ce qui serait archivé sans rien modifier.")
+
+    def handle(self, *args, **options):
+        keep_months = options['keep_months']
+        if keep_months < archive.MIN_KEEP_MONTHS:
+            raise CommandError(f"--keep-months doit valoir au moins {archive.MIN_KEEP_MONTHS} (compteurs et réapprovisionnement).")
+
+        if options['dry_run']:
+            months = archive.archivable_months(keep_months)
+            count = archive.archivable().filter(
+                created_at__lt=archive.month_bounds(months[-1])[1],
+            ).count() if months else 0
+            self.stdout.write(self.style.WARNING(
+                f"{len(months)} mois, {count} vente(s) à archiver (aucune modification)."
+            ))
+            return
+
+        try:
+            archived = archive.archive_sales(keep_months)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        for month, count in archived:
+            self.stdout.write(f"  {month:%Y-%m} : {count} vente(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(count for _, count in archived)} vente(s) archivée(s) sur {len(archived)} mois."
+        ))
@@ -0,0 +1,357 @@
+"""
+Simulateur de charge de la caisse : N caissiers simultanés encaissent des
+paniers réalistes sur un serveur local, puis on vérifie le stock.
+
+  1. base de test : SQLite temporaire migré (par défaut) ou --database-url
+     (base déjà migrée, ex. Postgres de préproduction — jamais la production) ;
+  2. catalogue de --skus médicaments « Charge » créé avec --stock unités ;
+     avec --striping K, les --hot plus demandés ont leur stock en K bandes
+     (medications/striping.py) — lancer avec --striping 0 puis 8 pour comparer ;
+  3. serveur local (gunicorn sync, comme sur Render, ou runserver) lancé en
+     DEBUG=True (pas de redirection HTTPS ni de cookies « secure » en HTTP) ;
+  4. chaque caissier (un thread, une session connectée) enchaîne les paniers :
+     1 à 5 lignes, produits tirés selon une loi de Zipf (--skew) — quelques
+     références très demandées, comme le paracétamol ;
+  5. rapport : débit, latences p50/p95/p99, échecs par cause (rupture, verrou,
+     interblocage, sérialisation, reprises épuisées, autre), attentes de verrous et interblocages
+     côté Postgres, et cohérence finale : stock consommé = lignes vendues =
+     mouvements de sortie, aucun stock négatif.
+
+Usage :  python manage.py loadtest_checkout [--cashiers 8] [--checkouts 50] [--skus 40] [--stock 500]
+                                            [--skew 1.1] [--server gunicorn|runserver] [--workers 4]
+                                            [--database-url URL] [--seed 0] [--striping 0] [--hot 3]
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Script exécuté sur la base de test (préparation et vérification finale)
+LOADTEST_SCRIPT = """
+import json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmanps_alou.settings')
+import django
+django.setup()
+from datetime import date
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from medications import striping
+from medications.models import Medication, StockMovement, StockStripe
+from sales.models import Sale, SaleItem
+
+mode = sys.argv[1]
+if mode == 'seed':
+    skus, stock, password, stripes, hot = int(sys.argv[2]), int(sys.argv[3]), sys.argv[4], int(sys.argv[5]), int(sys.argv[6])
+    user, _ = User.objects.get_or_create(username='charge_caisse')
+    user.set_password(password)
+    user.save()
+    medications = [
+        Medication.objects.create(
+            name=f'Charge {i:04d}', dci='Charge', barcode=f'LT{os.getpid()}{i:05d}', form='comprimé',
+            dosage='500mg', purchase_price=100, selling_price=150, quantity=stock, min_quantity=0,
+            expiry_date=date(2099, 1, 1),
+        )
+        for i in range(skus)
+    ]
+    if stripes:
+        # Les premiers produits sont les plus demandés (loi de Zipf)
+        for medication in medications[:hot]:
+            striping.enable(medication.pk, stripes)
+    print(json.dumps({'ids': [m.pk for m in medications], 'started': Sale.objects.order_by('-pk').values_list('pk', flat=True).first() or 0}))
+else:
+    ids, after = json.loads(sys.argv[2]), int(sys.argv[3])
+    sales = Sale.objects.filter(pk__gt=after, created_by__username='charge_caisse')
+    numbers = list(sales.values_list('sale_number', flat=True))
+    print(json.dumps({
+        'quantities': dict(Medication.objects.filter(pk__in=ids).values_list('pk', 'quantity')),
+        'stripes': dict(
+            StockStripe.objects.filter(medication_id__in=ids).values_list('medication_id')
+            .annotate(total=Sum('quantity')).values_list('medication_id', 'total').order_by()
+        ),
+        'sales': len(numbers),
+        'items': SaleItem.objects.filter(sale__in=sales).aggregate(q=Sum('quantity'))['q'] or 0,
+        'movements': StockMovement.objects.filter(
+            medication_id__in=ids, movement_type='sortie', reference__in=numbers,
+        ).aggregate(q=Sum('quantity'))['q'] or 0,
+        'all_movements': StockMovement.objects.filter(medication_id__in=ids, movement_type='sortie').aggregate(q=Sum('quantity'))['q'] or 0,
+    }))
+"""
+
+FAILURE_KINDS = (
+    ('rupture', 'Stock insuffisant'),
+    ('interblocage', 'deadlock'),
+    ('sérialisation', 'could not serialize'),
+    ('verrou', 'locked'),
+    ('reprises', 'veuillez réessayer'),   # conflits persistants après reprises (sales/checkout.py)
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def failure_kind(message):
+    for kind, marker in FAILURE_KINDS:
+        if marker.lower() in message.lower():
+            return kind
+    return 'autre'
+
+
+class PostgresLockMonitor(threading.Thread):
+    """Échantillonne toutes les 50 ms les sessions en attente de verrou (pg_stat_activity)"""
+
+    def __init__(self, url):
+        super().__init__(daemon=True)
+        import psycopg2
+
+        self.connection = psycopg2.connect(url)
+        self.connection.autocommit = True
+        self.stopping = threading.Event()
+        self.samples = []
+
+    def query(self, sql):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchone()[0]
+
+    def deadlocks(self):
+        return self.query("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+
+    def run(self):
+        while not self.stopping.wait(0.05):
+            self.samples.append(self.query(
+                "SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()"
+            ))
+
+
+class Cashier(threading.Thread):
+    """Un caissier : une session connectée, `checkouts` paniers à la suite"""
+
+    def __init__(self, base_url, password, baskets, price):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.password = password
+        self.baskets = baskets
+        self.price = price
+        self.latencies = []
+        self.failures = Counter()
+        self.messages = Counter()
+
+    def login(self):
+        self.session = requests.Session()
+        self.session.get(f"{self.base_url}/login/", timeout=30)
+        self.session.post(f"{self.base_url}/login/", data={
+            'username': 'charge_caisse', 'password': self.password,
+            'csrfmiddlewaretoken': self.session.cookies['csrftoken'],
+        }, timeout=30)
+
+    def run(self):
+        headers = {'X-CSRFToken': self.session.cookies['csrftoken']}
+        for basket in self.baskets:
+            payload = {
+                'items': [
+                    {'medication_id': pk, 'quantity': quantity, 'unit_price': self.price}
+                    for pk, quantity in basket
+                ],
+                'payment_method': 'especes',
+                'amount_paid': 10 ** 6,
+            }
+            started = time.perf_counter()
+            try:
+                response = self.session.post(f"{self.base_url}/api/create-sale/", json=payload, headers=headers, timeout=120)
+                data = response.json()
+            except (requests.RequestException, ValueError) as error:
+                data = {'success': False, 'message': f"HTTP : {error}"}
+            self.latencies.append(time.perf_counter() - started)
+            if not data.get('success'):
+                kind = failure_kind(data.get('message', ''))
+                self.failures[kind] += 1
+                if kind == 'autre':
+                    self.messages[data.get('message', '')[:120]] += 1
+
+
+class Command(BaseCommand):
+    help = "Simule N caissiers simultanés sur un serveur local et vérifie la cohérence du stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cashiers', type=int, default=8, help="Caissiers simultanés (défaut : 8).")
+        parser.add_argument('--checkouts', type=int, default=50, help="Paniers par caissier (défaut : 50).")
+        parser.add_argument('--skus', type=int, default=40, help="Médicaments du catalogue de test (défaut : 40).")
+        parser.add_argument('--stock', type=int, default=500, help="Stock initial de chaque médicament (défaut : 500).")
+        parser.add_argument('--skew', type=float, default=1.1, help="Exposant de Zipf de la popularité (défaut : 1.1).")
+        parser.add_argument('--server', choices=['gunicorn', 'runserver'], default='gunicorn', help="Serveur lancé (défaut : gunicorn).")
+        parser.add_argument('--workers', type=int, default=4, help="Workers gunicorn (défaut : 4).")
+        parser.add_argument('--database-url', help="Base de test déjà migrée (défaut : SQLite temporaire).")
+        parser.add_argument('--seed', type=int, default=0, help="Graine des paniers (défaut : 0).")
+        parser.add_argument('--striping', type=int, default=0, help="Bandes de stock des produits les plus demandés (défaut : 0, sans bandes).")
+        parser.add_argument('--hot', type=int, default=3, help="Produits mis en bandes avec --striping (défaut : 3).")
+
+    def script(self, env, *args):
+        result = subprocess.run(
+            [sys.executable, '-c', LOADTEST_SCRIPT, *args], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Le script de test a échoué :\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def baskets(self, ids, options):
+        """Paniers de chaque caissier : 1 à 5 lignes distinctes, popularité selon Zipf"""
+        rng = np.random.default_rng(options['seed'])
+        weights = 1 / np.arange(1, len(ids) + 1) ** options['skew']
+        weights /= weights.sum()
+        sizes = rng.choice([1, 2, 3, 4, 5], size=(options['cashiers'], options['checkouts']), p=[.35, .3, .2, .1, .05])
+        return [
+            [
+                [(ids[i], int(rng.integers(1, 4))) for i in rng.choice(len(ids), size=min(size, len(ids)), replace=False, p=weights)]
+                for size in row
+            ]
+            for row in sizes
+        ]
+
+    def start_server(self, env, port, options, log_path):
+        if options['server'] == 'gunicorn':
+            command = [
+                sys.executable, '-m', 'gunicorn', 'pharmanps_alou.wsgi', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(options['workers']), '--timeout', '120', '--log-level', 'warning',
+            ]
+        else:
+            command = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+        # Journal du serveur dans un fichier : un tube non lu bloquerait le serveur
+        with open(log_path, 'wb') as log:
+            server = subprocess.Popen(command, env=env, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"Le serveur s'est arrêté :\n{Path(log_path).read_text()[-2000:]}")
+            try:
+                requests.get(f"http://127.0.0.1:{port}/login/", timeout=10)
+                return server
+            except requests.RequestException:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError("Le serveur n'a pas démarré en 30 s.")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            database_url = options['database_url'] or f"sqlite:///{Path(directory) / 'loadtest.sqlite3'}"
+            env = {**os.environ, 'DATABASE_URL': database_url, 'DEBUG': 'True'}
+            for name in ('REPLICA_DATABASE_URL', 'PROFILE_URL_NAMES'):
+                env.pop(name, None)
+
+            if not options['database_url']:
+                migrate = subprocess.run(
+                    [sys.executable, 'manage.py', 'migrate', '-v', '0'], env=env, cwd=settings.BASE_DIR,
+                    capture_output=True, text=True,
+                )
+                if migrate.returncode != 0:
+                    raise CommandError(f"migrate a échoué :\n{migrate.stderr[-2000:]}")
+
+            password = os.urandom(8).hex()
+            seeded = self.script(
+                env, 'seed', str(options['skus']), str(options['stock']), password,
+                str(options['striping']), str(options['hot']),
+            )
+            ids = seeded['ids']
+            baskets = self.baskets(ids, options)
+
+            monitor = None
+            if database_url.startswith(('postgres', 'postgresql')):
+                monitor = PostgresLockMonitor(database_url)
+                deadlocks_before = monitor.deadlocks()
+
+            port = free_port()
+            server = self.start_server(env, port, options, Path(directory) / 'server.log')
+            try:
+                cashiers = [Cashier(f"http://127.0.0.1:{port}", password, row, 150) for row in baskets]
+                for cashier in cashiers:
+                    cashier.login()
+                if monitor:
+                    monitor.start()
+                started = time.perf_counter()
+                for cashier in cashiers:
+                    cashier.start()
+                for cashier in cashiers:
+                    cashier.join()
+                elapsed = time.perf_counter() - started
+            finally:
+                if monitor:
+                    monitor.stopping.set()
+                server.terminate()
+                server.wait(timeout=30)
+
+            check = self.script(env, 'check', json.dumps(ids), str(seeded['started']))
+
+        self.report(options, cashiers, elapsed, monitor, deadlocks_before if monitor else None, ids, check)
+
+    def report(self, options, cashiers, elapsed, monitor, deadlocks_before, ids, check):
+        latencies = np.asarray([latency for cashier in cashiers for latency in cashier.latencies]) * 1000
+        failures = sum((cashier.failures for cashier in cashiers), Counter())
+        messages = sum((cashier.messages for cashier in cashiers), Counter())
+        attempted = len(latencies)
+        succeeded = attempted - sum(failures.values())
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['cashiers']} caissier(s) × {options['checkouts']} panier(s), "
+            f"{options['skus']} produits (Zipf {options['skew']}), serveur {options['server']}"
+            + (f", {options['hot']} produit(s) en {options['striping']} bandes" if options['striping'] else "")
+        ))
+        self.stdout.write(f"  Durée              : {elapsed:8.2f} s")
+        self.stdout.write(f"  Ventes réussies    : {succeeded} / {attempted}  ({succeeded / elapsed:.1f} ventes/s)")
+        self.stdout.write(
+            f"  Latence            : p50 {np.percentile(latencies, 50):7.1f} ms  "
+            f"p95 {np.percentile(latencies, 95):7.1f} ms  p99 {np.percentile(latencies, 99):7.1f} ms  "
+            f"max {latencies.max():7.1f} ms"
+        )
+        for kind, _ in (*FAILURE_KINDS, ('autre', None)):
+            self.stdout.write(f"  Échecs {kind:<13}: {failures.get(kind, 0)}")
+        for message, count in messages.most_common(5):
+            self.stdout.write(f"      {count} × {message}")
+        if monitor:
+            samples = monitor.samples or [0]
+            self.stdout.write(
+                f"  Attentes de verrou : moyenne {sum(samples) / len(samples):.2f}, max {max(samples)} session(s) "
+                f"({len(samples)} relevés)"
+            )
+            self.stdout.write(f"  Interblocages (pg) : {monitor.deadlocks() - deadlocks_before}")
+        else:
+            self.stdout.write("  Attentes de verrou : non mesurées hors Postgres (voir échecs « verrou »)")
+
+        # Cohérence : stock consommé = lignes vendues = mouvements de sortie
+        consumed = options['stock'] * len(ids) - sum(check['quantities'].values())
+        negative = [pk for pk, quantity in check['quantities'].items() if quantity < 0]
+        problems = []
+        if check['sales'] != succeeded:
+            problems.append(f"{check['sales']} vente(s) en base pour {succeeded} réussie(s)")
+        if not consumed == check['items'] == check['movements'] == check['all_movements']:
+            problems.append(
+                f"stock consommé {consumed}, lignes vendues {check['items']}, "
+                f"mouvements des ventes {check['movements']}, mouvements de sortie {check['all_movements']}"
+            )
+        if negative:
+            problems.append(f"stock négatif pour {len(negative)} produit(s)")
+        drifted = [pk for pk, total in check['stripes'].items() if check['quantities'][pk] != total]
+        if drifted:
+            problems.append(f"quantité différente de la somme des bandes pour {len(drifted)} produit(s)")
+
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(f"  Incohérence : {problem}"))
+            raise CommandError("Le stock final ne correspond pas au journal des mouvements.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Stock cohérent : {consumed} unité(s) sorties = lignes vendues = mouvements de sortie."
+        ))
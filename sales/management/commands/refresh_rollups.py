@@ -0,0 +1,24 @@
+"""
+Met à jour les cumuls de chiffre d'affaires (jour, semaine, mois, année) pour
+les seules périodes touchées depuis le dernier passage (jours marqués par les
+ventes). Seul point de recalcul : à planifier (cron, par exemple toutes les
+5 minutes) ; sans risque à relancer.
+
+Usage :  python manage.py refresh_rollups [--full]
+"""
+from django.core.management.base import BaseCommand
+
+from sales.reporting import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = "Rafraîchit incrémentalement les cumuls de chiffre d'affaires."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Reconstruit tous les cumuls depuis les ventes brutes.")
+
+    def handle(self, *args, **options):
+        days, written = refresh_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{days} jour(s) recalculé(s), {written} cumul(s) écrit(s)."
+        ))
@@ -0,0 +1,19 @@
+"""
+Recalcule en masse les compteurs glissants de ventes (7, 30 et 90 jours) de
+chaque médicament. À planifier (cron Render) ; sans risque à relancer.
+
+Usage :  python manage.py refresh_sales_counters
+"""
+from django.core.management.base import BaseCommand
+
+from sales.reporting import refresh_sales_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs glissants de ventes par médicament."
+
+    def handle(self, *args, **options):
+        count = refresh_sales_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f"Compteurs recalculés : {count} médicament(s) vendu(s) sur la période."
+        ))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_alter_sale_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Nom')),
+                ('value', models.DateTimeField(blank=True, null=True, verbose_name='Dernier passage')),
+            ],
+            options={
+                'verbose_name': 'Point de reprise',
+                'verbose_name_plural': 'Points de reprise',
+            },
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Modifié le'),
+        ),
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Jour'), ('week', 'Semaine'), ('month', 'Mois'), ('year', 'Année')], max_length=10, verbose_name='Période')),
+                ('period_start', models.DateField(verbose_name='Début de période')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('payment_method', 'Mode de paiement'), ('cashier', 'Caissier'), ('category', 'Catégorie')], max_length=20, verbose_name='Axe')),
+                ('key', models.CharField(blank=True, default='', max_length=50, verbose_name="Valeur de l'axe")),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('sales_count', models.IntegerField(default=0, verbose_name='Nombre de ventes')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantité vendue')),
+            ],
+            options={
+                'verbose_name': "Cumul de chiffre d'affaires",
+                'verbose_name_plural': "Cumuls de chiffre d'affaires",
+                'ordering': ['period', '-period_start'],
+                'indexes': [models.Index(fields=['dimension', 'period', 'period_start'], name='rollup_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'dimension', 'key'), name='unique_revenue_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0002_alter_medication_image'),
+        ('sales', '0003_revenue_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicationSalesCounter',
+            fields=[
+                ('medication', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_counter', serialize=False, to='medications.medication', verbose_name='Médicament')),
+                ('quantity_7d', models.IntegerField(default=0, verbose_name='Quantité 7 jours')),
+                ('revenue_7d', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='CA 7 jours')),
+                ('quantity_30d', models.IntegerField(default=0, verbose_name='Quantité 30 jours')),
+                ('revenue_30d', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='CA 30 jours')),
+                ('quantity_90d', models.IntegerField(default=0, verbose_name='Quantité 90 jours')),
+                ('revenue_90d', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='CA 90 jours')),
+                ('computed_at', models.DateTimeField(blank=True, null=True, verbose_name='Recalculé le')),
+            ],
+            options={
+                'verbose_name': 'Compteur de ventes',
+                'verbose_name_plural': 'Compteurs de ventes',
+                'indexes': [models.Index(fields=['-quantity_7d'], name='counter_qty_7d_idx'), models.Index(fields=['-quantity_30d'], name='counter_qty_30d_idx'), models.Index(fields=['-quantity_90d'], name='counter_qty_90d_idx'), models.Index(fields=['-revenue_7d'], name='counter_rev_7d_idx'), models.Index(fields=['-revenue_30d'], name='counter_rev_30d_idx'), models.Index(fields=['-revenue_90d'], name='counter_rev_90d_idx')],
+            },
+        ),
+    ]
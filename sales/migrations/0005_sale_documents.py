@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_medication_sales_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleDocument',
+            fields=[
+                ('sale', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='sales.sale', verbose_name='Vente')),
+                ('status', models.CharField(choices=[('en_cours', 'En cours'), ('completee', 'Complétée'), ('annulee', 'Annulée')], max_length=20, verbose_name='Statut au rendu')),
+                ('invoice_html', models.TextField(verbose_name='Facture')),
+                ('detail_html', models.TextField(verbose_name='Détail')),
+                ('rendered_at', models.DateTimeField(auto_now=True, verbose_name='Rendu le')),
+            ],
+            options={
+                'verbose_name': 'Document de vente',
+                'verbose_name_plural': 'Documents de vente',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_sale_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='Relatif à ARCHIVE_ROOT', max_length=255, unique=True, verbose_name='Fichier')),
+                ('first_date', models.DateField(verbose_name='Première vente')),
+                ('last_date', models.DateField(verbose_name='Dernière vente')),
+                ('sales_count', models.IntegerField(verbose_name='Ventes')),
+                ('items_count', models.IntegerField(verbose_name='Lignes')),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14, verbose_name="Chiffre d'affaires")),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Archivé le')),
+            ],
+            options={
+                'verbose_name': 'Archive de ventes',
+                'verbose_name_plural': 'Archives de ventes',
+                'ordering': ['-first_date'],
+                'indexes': [models.Index(fields=['first_date', 'last_date'], name='sale_archive_dates_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 from medications.models import Medication
 from django.utils import timezone
@@ -54,6 +56,26 @@ class Customer(models.Model):
         return self.credit_limit - self.current_credit
 
 
+class SaleQuerySet(models.QuerySet):
+
+    def for_listing(self):
+        """Ventes avec client et vendeur (listes, historique)"""
+        return self.select_related('customer', 'created_by')
+
+    def with_details(self):
+        """
+        Ventes prêtes pour la facture ou la page de détail : client, vendeur
+        et lignes avec leur médicament, en 2 requêtes quel que soit le nombre de lignes.
+        """
+        return self.for_listing().prefetch_related(
+            models.Prefetch('items', queryset=SaleItem.objects.select_related('medication').order_by('pk'))
+        )
+
+
+# Numéros de vente essayés avant d'abandonner (voir Sale.save)
+SALE_NUMBER_ATTEMPTS = 5
+
+
 class Sale(models.Model):
     """Modèle pour les ventes"""
     
@@ -90,33 +112,56 @@ class Sale(models.Model):
     
     # Métadonnées
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de vente")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name="Modifié le")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name="Vendu par")
     notes = models.TextField(blank=True, null=True, verbose_name="Notes")
     
+    objects = SaleQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Vente"
         verbose_name_plural = "Ventes"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='sale_created_idx'),
+        ]
     
     def __str__(self):
         return f"Vente #{self.sale_number}"
     
+    def next_sale_number(self, offset=0):
+        """Numéro du jour suivant les ventes déjà enregistrées (décalé de `offset`)"""
+        today = timezone.now().date()
+        count = Sale.objects.filter(created_at__date=today).count() + 1 + offset
+        return f"V{today.strftime('%Y%m%d')}{count:04d}"
+
     def save(self, *args, **kwargs):
-        # Générer un numéro de vente automatique
-        if not self.sale_number:
-            today = timezone.now().date()
-            count = Sale.objects.filter(created_at__date=today).count() + 1
-            self.sale_number = f"V{today.strftime('%Y%m%d')}{count:04d}"
-        
-        # Calculer les montants
-        self.discount_amount = (self.subtotal * self.discount_percentage) / 100
+        # Calculer les montants (arrondis au centime : SQLite stocke les décimaux tels quels)
+        self.discount_amount = (Decimal(self.subtotal) * Decimal(self.discount_percentage) / 100).quantize(Decimal('0.01'))
         self.total = self.subtotal - self.discount_amount
         
         # Calculer la monnaie
         if self.amount_paid > self.total:
             self.change_amount = self.amount_paid - self.total
         
-        super().save(*args, **kwargs)
+        if self.sale_number:
+            super().save(*args, **kwargs)
+            return
+
+        # Générer un numéro de vente automatique. Le comptage ne voit pas les
+        # ventes concurrentes non validées (ni les ventes supprimées) : si le
+        # numéro est déjà pris, on en essaie un autre, dans un point de sauvegarde.
+        for attempt in range(SALE_NUMBER_ATTEMPTS):
+            self.sale_number = self.next_sale_number(attempt)
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                taken = Sale.objects.filter(sale_number=self.sale_number).exists()
+                if not taken or attempt == SALE_NUMBER_ATTEMPTS - 1:
+                    self.sale_number = ''
+                    raise
     
     @property
     def profit(self):
@@ -163,6 +208,38 @@ class SaleItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class MedicationSalesCounter(models.Model):
+    """Ventes glissantes d'un médicament sur 7, 30 et 90 jours (voir sales/reporting.py)"""
+
+    WINDOWS = (7, 30, 90)
+
+    medication = models.OneToOneField(Medication, on_delete=models.CASCADE, primary_key=True, related_name='sales_counter', verbose_name="Médicament")
+
+    quantity_7d = models.IntegerField(default=0, verbose_name="Quantité 7 jours")
+    revenue_7d = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="CA 7 jours")
+    quantity_30d = models.IntegerField(default=0, verbose_name="Quantité 30 jours")
+    revenue_30d = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="CA 30 jours")
+    quantity_90d = models.IntegerField(default=0, verbose_name="Quantité 90 jours")
+    revenue_90d = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="CA 90 jours")
+
+    computed_at = models.DateTimeField(null=True, blank=True, verbose_name="Recalculé le")
+
+    class Meta:
+        verbose_name = "Compteur de ventes"
+        verbose_name_plural = "Compteurs de ventes"
+        indexes = [
+            models.Index(fields=['-quantity_7d'], name='counter_qty_7d_idx'),
+            models.Index(fields=['-quantity_30d'], name='counter_qty_30d_idx'),
+            models.Index(fields=['-quantity_90d'], name='counter_qty_90d_idx'),
+            models.Index(fields=['-revenue_7d'], name='counter_rev_7d_idx'),
+            models.Index(fields=['-revenue_30d'], name='counter_rev_30d_idx'),
+            models.Index(fields=['-revenue_90d'], name='counter_rev_90d_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.medication.name} : {self.quantity_30d} vendus sur 30 jours"
+
+
 class Prescription(models.Model):
     """Modèle pour les ordonnances"""
     
@@ -182,4 +259,125 @@ class Prescription(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"Ordonnance - {self.customer.full_name} ({self.prescription_date})"
\ No newline at end of file
+        return f"Ordonnance - {self.customer.full_name} ({self.prescription_date})"
+
+
+class RevenueRollup(models.Model):
+    """Chiffre d'affaires pré-agrégé par période et par axe d'analyse (voir sales/reporting.py)"""
+
+    PERIODS = [
+        ('day', 'Jour'),
+        ('week', 'Semaine'),
+        ('month', 'Mois'),
+        ('year', 'Année'),
+    ]
+
+    DIMENSIONS = [
+        ('total', 'Total'),
+        ('payment_method', 'Mode de paiement'),
+        ('cashier', 'Caissier'),
+        ('category', 'Catégorie'),
+    ]
+
+    period = models.CharField(max_length=10, choices=PERIODS, verbose_name="Période")
+    period_start = models.DateField(verbose_name="Début de période")
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS, verbose_name="Axe")
+    key = models.CharField(max_length=50, blank=True, default='', verbose_name="Valeur de l'axe")
+
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Chiffre d'affaires")
+    sales_count = models.IntegerField(default=0, verbose_name="Nombre de ventes")
+    quantity = models.IntegerField(default=0, verbose_name="Quantité vendue")
+
+    class Meta:
+        verbose_name = "Cumul de chiffre d'affaires"
+        verbose_name_plural = "Cumuls de chiffre d'affaires"
+        ordering = ['period', '-period_start']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'dimension', 'key'], name='unique_revenue_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', 'period', 'period_start'], name='rollup_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_period_display()} {self.period_start} - {self.dimension}={self.key or '∅'} : {self.revenue}"
+
+
+class RollupWatermark(models.Model):
+    """Date du dernier rafraîchissement incrémental d'un pré-calcul"""
+
+    name = models.CharField(max_length=50, unique=True, verbose_name="Nom")
+    value = models.DateTimeField(null=True, blank=True, verbose_name="Dernier passage")
+
+    class Meta:
+        verbose_name = "Point de reprise"
+        verbose_name_plural = "Points de reprise"
+
+    def __str__(self):
+        return f"{self.name} : {self.value}"
+
+
+class RollupDirtyDay(models.Model):
+    """
+    Jour dont les cumuls sont à recalculer : une vente (ou une de ses lignes) y
+    a été créée, modifiée ou supprimée. Une ligne par changement, sans
+    contrainte d'unicité : marquer un jour ne verrouille rien (voir sales/reporting.py).
+    """
+
+    day = models.DateField(db_index=True, verbose_name="Jour")
+    marked_at = models.DateTimeField(auto_now_add=True, verbose_name="Marqué le")
+
+    class Meta:
+        verbose_name = "Jour à recalculer"
+        verbose_name_plural = "Jours à recalculer"
+
+    def __str__(self):
+        return f"{self.day} (marqué le {self.marked_at:%d/%m/%Y %H:%M})"
+
+
+class SaleDocument(models.Model):
+    """
+    Rendu HTML figé d'une vente finalisée (facture et détail).
+    Une vente complétée ne change plus que par son statut : le rendu est
+    réutilisé tant que `status` correspond à celui de la vente.
+    """
+
+    sale = models.OneToOneField(Sale, on_delete=models.CASCADE, primary_key=True, related_name='document', verbose_name="Vente")
+    status = models.CharField(max_length=20, choices=Sale.STATUS_CHOICES, verbose_name="Statut au rendu")
+    invoice_html = models.TextField(verbose_name="Facture")
+    detail_html = models.TextField(verbose_name="Détail")
+    rendered_at = models.DateTimeField(auto_now=True, verbose_name="Rendu le")
+
+    class Meta:
+        verbose_name = "Document de vente"
+        verbose_name_plural = "Documents de vente"
+
+    def __str__(self):
+        return f"Documents {self.sale.sale_number} ({self.status})"
+
+
+class SaleArchive(models.Model):
+    """
+    Segment compressé, en colonnes, de ventes complétées sorties des tables
+    chaudes (voir sales/archive.py). Les dates min/max servent d'index : seuls
+    les segments qui recouvrent une plage demandée sont ouverts.
+    """
+
+    path = models.CharField(max_length=255, unique=True, verbose_name="Fichier", help_text="Relatif à ARCHIVE_ROOT")
+    first_date = models.DateField(verbose_name="Première vente")
+    last_date = models.DateField(verbose_name="Dernière vente")
+    sales_count = models.IntegerField(verbose_name="Ventes")
+    items_count = models.IntegerField(verbose_name="Lignes")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, verbose_name="Chiffre d'affaires")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Archivé le")
+
+    class Meta:
+        verbose_name = "Archive de ventes"
+        verbose_name_plural = "Archives de ventes"
+        ordering = ['-first_date']
+        indexes = [
+            models.Index(fields=['first_date', 'last_date'], name='sale_archive_dates_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.first_date} → {self.last_date} : {self.sales_count} vente(s)"
@@ -0,0 +1,493 @@
+"""
+Moteur de reporting du chiffre d'affaires.
+
+Les ventes complétées sont pré-agrégées dans RevenueRollup par jour, semaine,
+mois et année, pour quatre axes : total, mode de paiement, caissier
+(created_by) et catégorie de médicament.
+
+- Toute vente (ou ligne de vente) créée, modifiée ou supprimée marque son
+  jour à recalculer (RollupDirtyDay, receveurs connectés dans sales/apps.py) :
+  une insertion sans verrou dans la transaction de la vente, rien de plus.
+- refresh_rollups() recalcule les jours marqués (et ceux des ventes
+  modifiées depuis le dernier passage), puis les semaines, mois et années
+  qui les contiennent, à partir des cumuls journaliers. Il n'est appelé que
+  par la commande planifiée refresh_rollups, jamais pendant une vente.
+- revenue_between() répond à une plage de dates quelconque en combinant le
+  plus petit nombre de cumuls (années, mois, semaines puis jours) au lieu de
+  parcourir les ventes brutes. Les jours marqués et pas encore recalculés
+  y sont lus sur les ventes brutes (en lecture seule) : les chiffres du jour
+  restent exacts entre deux passages de la commande.
+
+Les ventes archivées (sales/archive.py) entrent dans les cumuls journaliers
+au même titre que les ventes en base : un recalcul, même complet, les inclut.
+
+Les classements des meilleures ventes reposent sur MedicationSalesCounter :
+des compteurs glissants (7, 30, 90 jours) recalculés en masse par
+refresh_sales_counters() (commande planifiée du même nom, jamais depuis une
+page) et incrémentés à chaque encaissement par record_sale_counters(). Lire
+un classement est un simple tri indexé.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from . import archive
+from .models import MedicationSalesCounter, RevenueRollup, RollupDirtyDay, RollupWatermark, Sale, SaleItem
+
+
+WATERMARK_NAME = 'revenue_rollups'
+COUNTERS_WATERMARK_NAME = 'sales_counters'
+REFRESH_BATCH_DAYS = 200
+DELETE_BATCH = 500
+# Recouvrement du point de reprise : une vente écrite avant le dernier passage
+# mais validée après (transaction longue) est relue au passage suivant
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+DIMENSIONS = [code for code, _ in RevenueRollup.DIMENSIONS]
+
+# Champ de regroupement des ventes (ou des lignes de vente) pour chaque axe
+SALE_DIMENSION_FIELDS = {
+    'total': None,
+    'payment_method': 'payment_method',
+    'cashier': 'created_by_id',
+}
+
+PERIOD_TRUNCS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+
+# -------------------------------------------------------------------------
+# Bornes de périodes
+# -------------------------------------------------------------------------
+
+def period_start(period, day):
+    """Premier jour de la période contenant `day`"""
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Période inconnue : {period}")
+
+
+def period_end(period, start):
+    """Dernier jour (inclus) de la période commençant à `start`"""
+    if period == 'day':
+        return start
+    if period == 'week':
+        return start + timedelta(days=6)
+    if period == 'month':
+        next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return next_month - timedelta(days=1)
+    if period == 'year':
+        return start.replace(month=12, day=31)
+    raise ValueError(f"Période inconnue : {period}")
+
+
+def decompose_range(start, end):
+    """
+    Découpe [start, end] (inclus) en cumuls disjoints : années entières, puis
+    mois entiers, puis semaines entières, puis jours isolés.
+    Retourne une liste de (période, début de période).
+    """
+    buckets = []
+    cursor = start
+    while cursor <= end:
+        for period in ('year', 'month', 'week', 'day'):
+            if period_start(period, cursor) == cursor and period_end(period, cursor) <= end:
+                buckets.append((period, cursor))
+                cursor = period_end(period, cursor) + timedelta(days=1)
+                break
+    return buckets
+
+
+# -------------------------------------------------------------------------
+# Jours à recalculer
+# -------------------------------------------------------------------------
+
+def mark_days(days):
+    """Marque des jours à recalculer (dans la transaction de l'appelant)"""
+    RollupDirtyDay.objects.bulk_create([RollupDirtyDay(day=day) for day in sorted(set(days))])
+
+
+def sale_day(created_at):
+    return timezone.localtime(created_at).date()
+
+
+def sale_changed(sender, instance, **kwargs):
+    """post_save / post_delete de Sale"""
+    if instance.created_at:
+        mark_days([sale_day(instance.created_at)])
+
+
+def item_changed(sender, instance, origin=None, **kwargs):
+    """post_save / post_delete de SaleItem (les lignes supprimées avec leur vente sont couvertes par celle-ci)"""
+    if isinstance(origin, Sale) or getattr(origin, 'model', None) is Sale:
+        return
+    created_at = Sale.objects.filter(pk=instance.sale_id).values_list('created_at', flat=True).first()
+    if created_at:
+        mark_days([sale_day(created_at)])
+
+
+def pending_days(start, end):
+    """Jours marqués entre `start` et `end` (inclus), pas encore recalculés"""
+    return sorted(set(
+        RollupDirtyDay.objects.filter(day__gte=start, day__lte=end).values_list('day', flat=True)
+    ))
+
+
+# -------------------------------------------------------------------------
+# Rafraîchissement
+# -------------------------------------------------------------------------
+
+def allocate(total, amounts):
+    """
+    Répartit `total` (Decimal) au prorata de `amounts`, au centime ; la
+    dernière part reçoit le reste, pour que les parts totalisent exactement
+    `total`. Sert aux ventes en base comme aux ventes archivées.
+    """
+    gross = sum(amounts)
+    shares = []
+    remaining = total
+    for index, amount in enumerate(amounts):
+        if index == len(amounts) - 1:
+            share = remaining
+        else:
+            share = (total * amount / gross).quantize(Decimal('0.01')) if gross else Decimal('0')
+        remaining -= share
+        shares.append(share)
+    return shares
+
+
+def category_order(category_id):
+    """Ordre des catégories d'une vente pour allocate() (sans catégorie en dernier)"""
+    return (category_id is None, category_id or 0)
+
+
+def _day_rows(days):
+    """Recalcule les cumuls journaliers de `days` depuis les ventes brutes"""
+    rows = []
+    sales = Sale.objects.filter(status='completee', created_at__date__in=days).annotate(day=TruncDate('created_at'))
+
+    for dimension, field in SALE_DIMENSION_FIELDS.items():
+        group_by = ['day'] + ([field] if field else [])
+        for row in sales.values(*group_by).annotate(revenue=Sum('total'), sales_count=Count('id')):
+            rows.append(RevenueRollup(
+                period='day', period_start=row['day'], dimension=dimension,
+                key='' if not field or row[field] is None else str(row[field]),
+                revenue=row['revenue'] or 0, sales_count=row['sales_count'],
+            ))
+
+    # Quantités vendues par jour, pour les axes portés par la vente
+    quantities = {}
+    items = (
+        SaleItem.objects
+        .filter(sale__status='completee', sale__created_at__date__in=days)
+        .annotate(day=TruncDate('sale__created_at'))
+    )
+    for dimension, field in SALE_DIMENSION_FIELDS.items():
+        group_by = ['day'] + ([f'sale__{field}'] if field else [])
+        for row in items.values(*group_by).annotate(qty=Sum('quantity')):
+            value = row[f'sale__{field}'] if field else None
+            quantities[(row['day'], dimension, '' if value is None else str(value))] = row['qty']
+    for rollup in rows:
+        rollup.quantity = quantities.get((rollup.period_start, rollup.dimension, rollup.key)) or 0
+
+    # Catégories : le total de chaque vente (remise déduite) est réparti sur
+    # ses catégories au prorata du montant des lignes, en Decimal côté Python
+    # (en SQL, SQLite divise en entiers les montants ronds) ; le dernier
+    # centime va à la dernière catégorie, pour que les catégories d'un jour
+    # totalisent exactement son chiffre d'affaires
+    per_sale = {}
+    lines = (
+        items.values('day', 'sale_id', 'sale__total', 'medication__category_id')
+        .annotate(amount=Sum('subtotal'), qty=Sum('quantity'))
+        .order_by('sale_id')
+    )
+    for row in lines:
+        per_sale.setdefault((row['day'], row['sale_id'], row['sale__total']), []).append(row)
+
+    categories = {}
+    for (day, _, total), sale_lines in per_sale.items():
+        sale_lines.sort(key=lambda line: category_order(line['medication__category_id']))
+        shares = allocate(total, [line['amount'] or 0 for line in sale_lines])
+        for line, share in zip(sale_lines, shares):
+            category_id = line['medication__category_id']
+            key = (day, '' if category_id is None else str(category_id))
+            revenue, sales_count, quantity = categories.get(key, (Decimal('0'), 0, 0))
+            categories[key] = (revenue + share, sales_count + 1, quantity + (line['qty'] or 0))
+    for (day, key), (revenue, sales_count, quantity) in categories.items():
+        rows.append(RevenueRollup(
+            period='day', period_start=day, dimension='category', key=key,
+            revenue=revenue, sales_count=sales_count, quantity=quantity,
+        ))
+    return _merge_rows(rows, archive.day_rows(days))
+
+
+def _merge_rows(rows, extra):
+    """Additionne les cumuls de `extra` à ceux de `rows` de même (jour, axe, valeur)"""
+    merged = {(row.period_start, row.dimension, row.key): row for row in rows}
+    for row in extra:
+        current = merged.setdefault((row.period_start, row.dimension, row.key), row)
+        if current is not row:
+            current.revenue += row.revenue
+            current.sales_count += row.sales_count
+            current.quantity += row.quantity
+    return list(merged.values())
+
+
+def _rollup_rows(period, starts):
+    """Recalcule les cumuls de `period` commençant à `starts` depuis les cumuls journaliers"""
+    bucket = PERIOD_TRUNCS[period]('period_start')
+    days = (
+        RevenueRollup.objects
+        .filter(period='day', period_start__gte=min(starts), period_start__lte=period_end(period, max(starts)))
+        .annotate(bucket=bucket)
+        .filter(bucket__in=starts)
+        .values('bucket', 'dimension', 'key')
+        .annotate(revenue=Sum('revenue'), sales_count=Sum('sales_count'), qty=Sum('quantity'))
+    )
+    return [
+        RevenueRollup(
+            period=period, period_start=row['bucket'], dimension=row['dimension'], key=row['key'],
+            revenue=row['revenue'] or 0, sales_count=row['sales_count'] or 0, quantity=row['qty'] or 0,
+        )
+        for row in days
+    ]
+
+
+def refresh_days(days):
+    """Recalcule les cumuls de tous niveaux qui contiennent les jours donnés"""
+    days = sorted(set(days))
+    if not days:
+        return 0
+
+    RevenueRollup.objects.filter(period='day', period_start__in=days).delete()
+    rows = _day_rows(days)
+    RevenueRollup.objects.bulk_create(rows)
+    written = len(rows)
+
+    for period in ('week', 'month', 'year'):
+        starts = sorted({period_start(period, day) for day in days})
+        RevenueRollup.objects.filter(period=period, period_start__in=starts).delete()
+        rows = _rollup_rows(period, starts)
+        RevenueRollup.objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+def refresh_rollups(full=False):
+    """
+    Met à jour les cumuls des jours marqués et de ceux des ventes modifiées
+    depuis le dernier passage, moins WATERMARK_OVERLAP (ou de tous les jours
+    si `full`) : recalculer un jour deux fois est sans effet. Seules les
+    marques lues au départ sont effacées : un jour marqué pendant le passage
+    le sera encore au suivant. Retourne (jours recalculés, lignes écrites).
+    """
+    with transaction.atomic():
+        # Le verrou sur le point de reprise sérialise les rafraîchissements concurrents
+        watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+        watermark = RollupWatermark.objects.select_for_update().get(pk=watermark.pk)
+        started_at = timezone.now()
+        # Marques lues avant les ventes : une marque visible l'est avec sa vente
+        marks = list(RollupDirtyDay.objects.values_list('pk', 'day'))
+
+        if full or watermark.value is None:
+            RevenueRollup.objects.all().delete()
+            touched = Sale.objects.all()
+            days = archive.archived_days()
+        else:
+            touched = Sale.objects.filter(updated_at__gte=watermark.value - WATERMARK_OVERLAP)
+            days = {day for _, day in marks}
+        days = sorted(days | set(touched.annotate(day=TruncDate('created_at')).values_list('day', flat=True)))
+
+        # Par paquets de jours, pour borner la taille des clauses IN
+        written = 0
+        for i in range(0, len(days), REFRESH_BATCH_DAYS):
+            written += refresh_days(days[i:i + REFRESH_BATCH_DAYS])
+
+        marked = [pk for pk, _ in marks]
+        for i in range(0, len(marked), DELETE_BATCH):
+            RollupDirtyDay.objects.filter(pk__in=marked[i:i + DELETE_BATCH]).delete()
+
+        watermark.value = started_at
+        watermark.save(update_fields=['value'])
+    return len(days), written
+
+
+# -------------------------------------------------------------------------
+# Lecture
+# -------------------------------------------------------------------------
+
+def revenue_between(start, end, dimension='total'):
+    """
+    Chiffre d'affaires des ventes complétées entre `start` et `end` (inclus),
+    ventilé selon `dimension`. Retourne {valeur de l'axe: {revenue, sales_count, quantity}}.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Axe inconnu : {dimension}")
+    if start > end:
+        return {}
+
+    buckets = Q()
+    for period, bucket_start in decompose_range(start, end):
+        buckets |= Q(period=period, period_start=bucket_start)
+
+    totals = {}
+
+    def add(rows, sign=1):
+        for row in rows:
+            values = totals.setdefault(row['key'], {'revenue': Decimal('0'), 'sales_count': 0, 'quantity': 0})
+            values['revenue'] += sign * (row['revenue'] or 0)
+            values['sales_count'] += sign * (row['sales_count'] or 0)
+            values['quantity'] += sign * (row['qty'] or 0)
+
+    add(
+        RevenueRollup.objects.filter(buckets, dimension=dimension)
+        .values('key').annotate(revenue=Sum('revenue'), sales_count=Sum('sales_count'), qty=Sum('quantity'))
+    )
+    # Jours marqués : cumuls en place remplacés par un calcul sur les ventes brutes
+    pending = pending_days(start, end)
+    if pending:
+        add(
+            RevenueRollup.objects.filter(period='day', period_start__in=pending, dimension=dimension)
+            .values('key').annotate(revenue=Sum('revenue'), sales_count=Sum('sales_count'), qty=Sum('quantity')),
+            sign=-1,
+        )
+        add(
+            {'key': row.key, 'revenue': row.revenue, 'sales_count': row.sales_count, 'qty': row.quantity}
+            for row in _day_rows(pending) if row.dimension == dimension
+        )
+    return {key: values for key, values in totals.items() if values['sales_count']}
+
+
+def total_between(start, end):
+    """Chiffre d'affaires total (Decimal) entre `start` et `end` inclus"""
+    return revenue_between(start, end).get('', {}).get('revenue', Decimal('0'))
+
+
+def daily_totals(start, end):
+    """Cumuls journaliers {date: {revenue, sales_count}} entre `start` et `end` inclus"""
+    rows = RevenueRollup.objects.filter(
+        period='day', dimension='total', period_start__gte=start, period_start__lte=end,
+    ).values('period_start', 'revenue', 'sales_count')
+    totals = {row['period_start']: row for row in rows}
+    # Jours marqués : calculés sur les ventes brutes
+    pending = pending_days(start, end)
+    for day in pending:
+        totals.pop(day, None)
+    if pending:
+        for row in _day_rows(pending):
+            if row.dimension == 'total':
+                totals[row.period_start] = {
+                    'period_start': row.period_start, 'revenue': row.revenue, 'sales_count': row.sales_count,
+                }
+    return totals
+
+
+def first_sale_date():
+    """Date du plus ancien cumul journalier ou jour marqué (ou aujourd'hui s'il n'y en a pas)"""
+    first = (
+        RevenueRollup.objects.filter(period='day', dimension='total')
+        .order_by('period_start').values_list('period_start', flat=True).first()
+    )
+    marked = RollupDirtyDay.objects.order_by('day').values_list('day', flat=True).first()
+    return min(day for day in (first, marked, timezone.localdate()) if day)
+
+
+# -------------------------------------------------------------------------
+# Classements (compteurs glissants par médicament)
+# -------------------------------------------------------------------------
+
+def refresh_sales_counters():
+    """
+    Recalcule en masse les compteurs glissants de tous les médicaments : une
+    agrégation sur les 90 derniers jours, puis un upsert groupé. Les médicaments
+    sans vente sur la plus longue fenêtre sont remis à zéro.
+    Retourne le nombre de médicaments ayant des ventes.
+    """
+    now = timezone.now()
+    annotations = {}
+    for window in MedicationSalesCounter.WINDOWS:
+        recent = Q(sale__created_at__gte=now - timedelta(days=window))
+        annotations[f'quantity_{window}d'] = Sum('quantity', filter=recent)
+        annotations[f'revenue_{window}d'] = Sum('subtotal', filter=recent)
+
+    longest = max(MedicationSalesCounter.WINDOWS)
+    rows = (
+        SaleItem.objects
+        .filter(sale__status='completee', sale__created_at__gte=now - timedelta(days=longest))
+        .values('medication_id')
+        .annotate(**annotations)
+    )
+    # Agrégation lue dans la transaction : toujours sur la base principale,
+    # les incréments de record_sale_counters s'appliquant ensuite à ce total
+    with transaction.atomic():
+        counters = [
+            MedicationSalesCounter(
+                medication_id=row['medication_id'], computed_at=now,
+                **{field: row[field] or 0 for field in annotations},
+            )
+            for row in rows
+        ]
+        MedicationSalesCounter.objects.bulk_create(
+            counters, batch_size=500,
+            update_conflicts=True, unique_fields=['medication'],
+            update_fields=[*annotations, 'computed_at'],
+        )
+        MedicationSalesCounter.objects.exclude(computed_at=now).update(
+            computed_at=now, **{field: 0 for field in annotations},
+        )
+        RollupWatermark.objects.update_or_create(name=COUNTERS_WATERMARK_NAME, defaults={'value': now})
+    return len(counters)
+
+
+def record_sale_counters(items):
+    """
+    Ajoute les lignes d'une vente qui vient d'être validée aux compteurs de
+    toutes les fenêtres. Les ventes qui sortent d'une fenêtre (ou sont annulées)
+    ne sont retirées qu'au prochain refresh_sales_counters().
+    """
+    totals = {}
+    for item in items:
+        quantity, revenue = totals.get(item.medication_id, (0, Decimal('0')))
+        totals[item.medication_id] = (quantity + item.quantity, revenue + item.subtotal)
+
+    MedicationSalesCounter.objects.bulk_create(
+        [MedicationSalesCounter(medication_id=medication_id) for medication_id in sorted(totals)],
+        ignore_conflicts=True,
+    )
+    # Ordre canonique des identifiants (insertion comprise) : les verrous de
+    # ligne sont pris dans le même ordre partout (voir sales/checkout.py)
+    for medication_id in sorted(totals):
+        quantity, revenue = totals[medication_id]
+        increments = {}
+        for window in MedicationSalesCounter.WINDOWS:
+            increments[f'quantity_{window}d'] = F(f'quantity_{window}d') + quantity
+            increments[f'revenue_{window}d'] = F(f'revenue_{window}d') + revenue
+        MedicationSalesCounter.objects.filter(medication_id=medication_id).update(**increments)
+
+
+def top_sellers(window=30, limit=5, by='quantity'):
+    """Meilleures ventes sur `window` jours (7, 30 ou 90), par quantité ou par chiffre d'affaires"""
+    if window not in MedicationSalesCounter.WINDOWS:
+        raise ValueError(f"Fenêtre inconnue : {window} jours")
+    if by not in ('quantity', 'revenue'):
+        raise ValueError(f"Critère inconnu : {by}")
+    field = f'{by}_{window}d'
+    return (
+        MedicationSalesCounter.objects
+        .filter(**{f'{field}__gt': 0})
+        .select_related('medication')
+        .order_by(f'-{field}')[:limit]
+    )
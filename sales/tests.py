@@ -1,3 +1,461 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from medications.models import Category, Medication
+from . import archive, checkout, documents, reporting
+from .models import Customer, RevenueRollup, RollupDirtyDay, RollupWatermark, Sale, SaleItem
+
+
+class SaleDetailQueryCountTests(TestCase):
+    """Le nombre de requêtes des pages de vente ne dépend pas du nombre de lignes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('caisse', password='x')
+        cls.customer = Customer.objects.create(first_name='Awa', last_name='Diop', phone='770000000')
+        category = Category.objects.create(name='Antalgiques')
+        cls.medications = [
+            Medication.objects.create(
+                name=f'Médicament {i}', dci='DCI', barcode=f'340093000{i:04d}', category=category,
+                form='comprimé', dosage='500mg', purchase_price=100, selling_price=150,
+                quantity=100, expiry_date=date(2030, 1, 1),
+            )
+            for i in range(12)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def make_sale(self, lines, status='completee'):
+        sale = Sale.objects.create(
+            customer=self.customer, payment_method='especes', created_by=self.user, status=status,
+        )
+        for medication in self.medications[:lines]:
+            SaleItem.objects.create(sale=sale, medication=medication, quantity=1, unit_price=150)
+        return sale
+
+    def count_queries(self, url_name, sale):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(url_name, args=[sale.pk]), secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_with_details_loads_lines_in_two_queries(self):
+        sale = self.make_sale(10)
+        with self.assertNumQueries(2):
+            sale = Sale.objects.with_details().get(pk=sale.pk)
+            for item in sale.items.all():
+                item.medication.name
+            sale.customer.full_name
+            sale.created_by.username
+
+    def test_pages_are_constant_in_line_count(self):
+        for url_name in ('sale_detail', 'sale_invoice'):
+            for status in ('en_cours', 'completee'):
+                with self.subTest(url_name=url_name, status=status):
+                    small = self.count_queries(url_name, self.make_sale(1, status))
+                    large = self.count_queries(url_name, self.make_sale(10, status))
+                    self.assertEqual(small, large)
+
+    def test_stored_documents_do_not_load_lines(self):
+        sale = self.make_sale(10)
+        documents.render_documents(sale)
+        for url_name in ('sale_detail', 'sale_invoice'):
+            with self.subTest(url_name=url_name):
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(reverse(url_name, args=[sale.pk]), secure=True)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse([query for query in context.captured_queries if 'sales_saleitem' in query['sql']])
+
+    def test_admin_change_page_is_constant_in_line_count(self):
+        admin = User.objects.create_superuser('admin', password='x')
+        self.client.force_login(admin)
+        # Premier passage : remplit les caches de l'admin (types de contenu...)
+        self.count_queries('admin:sales_sale_change', self.make_sale(1))
+        small = self.count_queries('admin:sales_sale_change', self.make_sale(1))
+        large = self.count_queries('admin:sales_sale_change', self.make_sale(10))
+        self.assertEqual(small, large)
+
+
+class RevenueRollupTests(TestCase):
+    """Cumuls de chiffre d'affaires rafraîchis de façon incrémentale"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('caisse', password='x')
+        cls.medications = [
+            Medication.objects.create(
+                name=f'Médicament {i}', dci='DCI', barcode=f'340093000{i:04d}',
+                category=Category.objects.create(name=f'Catégorie {i}'), form='comprimé', dosage='500mg',
+                purchase_price=100, selling_price=150, quantity=100, expiry_date=date(2030, 1, 1),
+            )
+            for i in range(3)
+        ]
+
+    def make_sale(self, lines=((0, 1, '150'),), discount=0):
+        """Vente complétée de lignes (indice du médicament, quantité, prix unitaire)"""
+        lines = [(self.medications[index], quantity, Decimal(price)) for index, quantity, price in lines]
+        sale = Sale.objects.create(
+            payment_method='especes', created_by=self.user, status='completee',
+            subtotal=sum(quantity * price for _, quantity, price in lines), discount_percentage=discount,
+        )
+        for medication, quantity, price in lines:
+            SaleItem.objects.create(sale=sale, medication=medication, quantity=quantity, unit_price=price)
+        return sale
+
+    def test_late_commit_is_not_skipped(self):
+        reporting.refresh_rollups()
+        # Vente écrite avant le dernier passage, validée après lui
+        sale = self.make_sale()
+        Sale.objects.filter(pk=sale.pk).update(updated_at=timezone.now() - timedelta(minutes=1))
+        RollupWatermark.objects.filter(name=reporting.WATERMARK_NAME).update(value=timezone.now())
+
+        reporting.refresh_rollups()
+        today = timezone.localdate()
+        self.assertEqual(reporting.total_between(today, today), Decimal('150.00'))
+
+    def test_category_revenue_adds_up_to_day_total(self):
+        self.make_sale([(0, 3, '99.95'), (1, 1, '125.50'), (2, 2, '0.35')], discount=Decimal('7.5'))
+        self.make_sale([(0, 1, '150'), (1, 2, '333')], discount=5)
+        self.make_sale([(2, 1, '1000')])
+        reporting.refresh_rollups(full=True)
+
+        today = timezone.localdate()
+        categories = reporting.revenue_between(today, today, 'category')
+        self.assertEqual(len(categories), 3)
+        self.assertEqual(
+            sum(values['revenue'] for values in categories.values()),
+            reporting.total_between(today, today),
+        )
+
+
+    def test_checkout_only_marks_its_day(self):
+        self.client.force_login(self.user)
+        cart = {
+            'items': [{'medication_id': self.medications[0].pk, 'quantity': 2, 'unit_price': 150}],
+            'payment_method': 'especes', 'amount_paid': 300,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('create_sale'), json.dumps(cart), content_type='application/json', secure=True)
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(RevenueRollup.objects.exists())
+        self.assertFalse(RollupWatermark.objects.filter(name=reporting.WATERMARK_NAME).exists())
+
+        # Lecture du jour marqué sur les ventes brutes, sans écriture
+        today = timezone.localdate()
+        self.assertEqual(reporting.total_between(today, today), Decimal('300.00'))
+        self.assertEqual(reporting.daily_totals(today, today)[today]['sales_count'], 1)
+        self.assertFalse(RevenueRollup.objects.exists())
+
+    def test_deleted_sales_and_edited_lines_are_recomputed(self):
+        kept = self.make_sale([(0, 1, '150')])
+        removed = self.make_sale([(1, 1, '200')])
+        reporting.refresh_rollups()
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+        removed.delete()
+        line = kept.items.get()
+        line.quantity = 3
+        line.save()
+        today = timezone.localdate()
+        self.assertEqual(reporting.total_between(today, today), Decimal('150.00'))
+
+        reporting.refresh_rollups()
+        self.assertFalse(RollupDirtyDay.objects.exists())
+        day = RevenueRollup.objects.get(period='day', period_start=today, dimension='total')
+        self.assertEqual((day.revenue, day.sales_count, day.quantity), (Decimal('150.00'), 1, 3))
+        self.assertEqual(reporting.revenue_between(today, today, 'category'), {
+            str(self.medications[0].category_id): {'revenue': Decimal('150.00'), 'sales_count': 1, 'quantity': 3},
+        })
+
+
+class SaleArchiveTests(TestCase):
+    """Archivage des ventes anciennes : clients et historique"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('caisse', password='x')
+        cls.medication = Medication.objects.create(
+            name='Paracétamol', dci='Paracétamol', barcode='3400930000001',
+            category=Category.objects.create(name='Antalgiques'), form='comprimé', dosage='500mg',
+            purchase_price=100, selling_price=150, quantity=100, expiry_date=date(2030, 1, 1),
+        )
+
+    def make_sale(self, quantity):
+        sale = Sale.objects.create(
+            payment_method='especes', created_by=self.user, status='completee', subtotal=quantity * 150,
+        )
+        SaleItem.objects.create(sale=sale, medication=self.medication, quantity=quantity, unit_price=150)
+        return sale
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        patcher = self.settings(ARCHIVE_ROOT=archive_dir.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+        self.customer = Customer.objects.create(first_name='Awa', last_name='Diallo', phone='770000000')
+        old = timezone.now() - timedelta(days=600)
+        self.anonymous = self.make_sale(1)
+        self.linked = self.make_sale(2)
+        Sale.objects.filter(pk=self.linked.pk).update(customer=self.customer)
+        Sale.objects.filter(pk__in=[self.anonymous.pk, self.linked.pk]).update(created_at=old, updated_at=old)
+
+    def test_customer_sales_stay_in_database(self):
+        archive.archive_sales(keep_months=12)
+        self.assertFalse(Sale.objects.filter(pk=self.anonymous.pk).exists())
+        self.assertTrue(Sale.objects.filter(pk=self.linked.pk).exists())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('customer_detail', args=[self.customer.pk]), secure=True)
+        self.assertEqual(response.context['total_spent'], Decimal('300.00'))
+
+    def test_sale_list_counts_archived_sales(self):
+        archive.archive_sales(keep_months=12)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('sale_list'), secure=True)
+        self.assertEqual(response.context['total_sales'], Decimal('450.00'))
+        self.assertEqual(response.context['archived']['count'], 1)
+
+
+    def test_archived_category_revenue_adds_up_to_day_total(self):
+        medications = [self.medication] + [
+            Medication.objects.create(
+                name=f'Médicament {i}', dci='DCI', barcode=f'340093001{i:04d}',
+                category=Category.objects.create(name=f'Catégorie {i}'), form='comprimé', dosage='500mg',
+                purchase_price=100, selling_price=150, quantity=100, expiry_date=date(2030, 1, 1),
+            )
+            for i in range(2)
+        ]
+        day = Sale.objects.get(pk=self.anonymous.pk).created_at
+        for lines, discount in (
+            ([(0, 1, '23.03'), (1, 3, '555.01'), (2, 2, '703.27')], Decimal('3.3')),
+            ([(0, 3, '30.67'), (1, 1, '783.56'), (2, 2, '567.29')], Decimal('3.3')),
+            ([(0, 1, '694.28'), (1, 2, '976.37'), (2, 1, '427.71')], Decimal('12.25')),
+        ):
+            sale = Sale.objects.create(
+                payment_method='especes', created_by=self.user, status='completee', discount_percentage=discount,
+                subtotal=sum(quantity * Decimal(price) for _, quantity, price in lines),
+            )
+            for index, quantity, price in lines:
+                SaleItem.objects.create(sale=sale, medication=medications[index], quantity=quantity, unit_price=Decimal(price))
+            Sale.objects.filter(pk=sale.pk).update(created_at=day, updated_at=day)
+
+        archive.archive_sales(keep_months=12)
+        reporting.refresh_rollups(full=True)
+
+        day = timezone.localtime(day).date()
+        categories = reporting.revenue_between(day, day, 'category')
+        self.assertEqual(len(categories), 3)
+        self.assertEqual(
+            sum(values['revenue'] for values in categories.values()),
+            reporting.total_between(day, day),
+        )
+
+class SaleNumberTests(TestCase):
+    """Numéro de vente déjà pris au moment de l'écriture"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('caisse', password='x')
+        cls.medication = Medication.objects.create(
+            name='Paracétamol', dci='Paracétamol', barcode='3400930000001', form='comprimé', dosage='500mg',
+            purchase_price=100, selling_price=150, quantity=100, expiry_date=date(2030, 1, 1),
+        )
+
+    def checkout(self):
+        self.client.force_login(self.user)
+        cart = {
+            'items': [{'medication_id': self.medication.pk, 'quantity': 1, 'unit_price': 150}],
+            'payment_method': 'especes', 'amount_paid': 150,
+        }
+        return self.client.post(reverse('create_sale'), json.dumps(cart), content_type='application/json', secure=True).json()
+
+    def test_concurrent_checkout_takes_the_same_number(self):
+        next_sale_number = Sale.next_sale_number
+
+        def concurrent(sale, offset=0):
+            # Une autre caisse valide le numéro calculé avant l'écriture de cette vente
+            number = next_sale_number(sale, offset)
+            if not offset:
+                Sale.objects.create(sale_number=number, payment_method='especes', status='completee')
+            return number
+
+        with mock.patch.object(Sale, 'next_sale_number', concurrent):
+            response = self.checkout()
+        self.assertTrue(response['success'], response)
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(Sale.objects.values('sale_number').distinct().count(), 2)
+
+    def test_number_freed_by_a_deleted_sale(self):
+        first, second = self.checkout(), self.checkout()
+        Sale.objects.filter(pk=first['sale_id']).delete()
+        response = self.checkout()
+        self.assertTrue(response['success'], response)
+        self.assertNotEqual(response['sale_number'], second['sale_number'])
+
+
+class CheckoutRetryTests(SimpleTestCase):
+    """Reprise d'une vente abandonnée sur conflit de verrous"""
+
+    def setUp(self):
+        cache.delete_many([checkout.METRICS_KEY.format(name) for name in checkout.METRICS])
+        patcher = mock.patch('sales.checkout.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def failing(self, errors, result='vente'):
+        """Fonction qui lève les erreurs données, une par appel, puis retourne `result`"""
+        errors = list(errors)
+
+        def func():
+            if errors:
+                raise errors.pop(0)
+            return result
+        return func
+
+    def test_lock_error_is_retried(self):
+        func = self.failing([OperationalError('database is locked')] * 2)
+        self.assertEqual(checkout.with_retry(func), 'vente')
+        self.assertEqual(self.sleep.call_count, 2)
+        metrics = checkout.checkout_metrics()
+        self.assertEqual((metrics['checkouts'], metrics['retried'], metrics['retry_locked']), (1, 1, 2))
+
+    def test_gives_up_after_retry_attempts(self):
+        func = self.failing([OperationalError('database is locked')] * checkout.RETRY_ATTEMPTS)
+        with self.assertRaises(checkout.CheckoutConflict) as context:
+            checkout.with_retry(func)
+        self.assertEqual(context.exception.reason, 'locked')
+        self.assertEqual(checkout.checkout_metrics()['gave_up'], 1)
+
+    def test_other_errors_are_not_retried(self):
+        func = self.failing([OperationalError('no such table: sales_sale')])
+        with self.assertRaises(OperationalError):
+            checkout.with_retry(func)
+        self.sleep.assert_not_called()
+
+
+# Script lancé dans chaque processus : prépare la base (seed), passe des
+# ventes via la vue create_sale (worker) ou relit le résultat (check).
+CHECKOUT_SCRIPT = """
+import json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmanps_alou.settings')
+import django
+django.setup()
+from datetime import date
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+from medications.models import Medication, StockMovement
+from sales.models import Sale, SaleItem
+from sales.views import create_sale
+
+mode = sys.argv[1]
+if mode == 'seed':
+    User.objects.create_user('caisse', password='x')
+    for i in range(2):
+        Medication.objects.create(
+            name=f'Produit {i}', dci='DCI', barcode=f'99{i}', form='comprimé', dosage='1',
+            purchase_price=1, selling_price=2, quantity=int(sys.argv[2]) if len(sys.argv) > 2 else 10000, min_quantity=0,
+            expiry_date=date(2030, 1, 1),
+        )
+elif mode == 'worker':
+    user = User.objects.get(username='caisse')
+    ids = list(Medication.objects.order_by('pk').values_list('pk', flat=True))
+    cart = {'items': [{'medication_id': pk, 'quantity': 1, 'unit_price': 2} for pk in ids],
+            'payment_method': 'especes', 'amount_paid': 10}
+    failures = []
+    for _ in range(int(sys.argv[2])):
+        request = RequestFactory().post('/api/create-sale/', json.dumps(cart), content_type='application/json')
+        request.user = user
+        response = json.loads(create_sale(request).content)
+        if not response['success']:
+            failures.append(response['message'])
+    print(json.dumps(failures))
+else:
+    print(json.dumps({
+        'quantities': list(Medication.objects.order_by('pk').values_list('quantity', flat=True)),
+        'sales': Sale.objects.count(),
+        'items': SaleItem.objects.count(),
+        'movements': StockMovement.objects.filter(movement_type='sortie').count(),
+    }))
+"""
+
+
+class SQLiteConcurrentCheckoutTests(SimpleTestCase):
+    """Ventes simultanées depuis plusieurs processus sur un même fichier SQLite"""
+
+    WORKERS = 4
+    SALES_PER_WORKER = 25
+
+    def run_script(self, env, *args):
+        return subprocess.Popen(
+            [sys.executable, '-c', CHECKOUT_SCRIPT, *args], env=env, cwd=settings.BASE_DIR,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+
+    def communicate(self, process):
+        stdout, stderr = process.communicate(timeout=300)
+        self.assertEqual(process.returncode, 0, stderr[-2000:])
+        return json.loads(stdout.strip().splitlines()[-1]) if stdout.strip() else None
+
+    def prepare(self, directory, *seed_args):
+        """Base SQLite (mode durci) migrée et remplie dans `directory` ; retourne l'environnement"""
+        env = {
+            **os.environ,
+            'DATABASE_URL': f'sqlite:///{Path(directory) / "checkout.sqlite3"}',
+            'SECRET_KEY': settings.SECRET_KEY,
+            'SQLITE_HARDENED': 'True',
+        }
+        env.pop('REPLICA_DATABASE_URL', None)
+        migrate = subprocess.run(
+            [sys.executable, 'manage.py', 'migrate', '-v', '0'], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True,
+        )
+        self.assertEqual(migrate.returncode, 0, migrate.stderr[-2000:])
+        self.communicate(self.run_script(env, 'seed', *seed_args))
+        return env
+
+    def test_no_lost_stock_updates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = self.prepare(directory)
+            workers = [self.run_script(env, 'worker', str(self.SALES_PER_WORKER)) for _ in range(self.WORKERS)]
+            failures = [failure for worker in workers for failure in self.communicate(worker)]
+            result = self.communicate(self.run_script(env, 'check'))
+
+        sold = self.WORKERS * self.SALES_PER_WORKER
+        self.assertEqual(failures, [])
+        self.assertEqual(result['sales'], sold)
+        self.assertEqual(result['items'], sold * 2)
+        self.assertEqual(result['movements'], sold * 2)
+        self.assertEqual(result['quantities'], [10000 - sold, 10000 - sold])
+
+    def test_last_unit_is_sold_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = self.prepare(directory, '1')
+            workers = [self.run_script(env, 'worker', '1') for _ in range(2)]
+            failures = [failure for worker in workers for failure in self.communicate(worker)]
+            result = self.communicate(self.run_script(env, 'check'))
+
+        # Une caisse encaisse la dernière unité, l'autre est refusée sans rien écrire
+        self.assertEqual(len(failures), 1)
+        self.assertIn('Stock insuffisant', failures[0])
+        self.assertEqual(result['sales'], 1)
+        self.assertEqual(result['movements'], 2)
+        self.assertEqual(result['quantities'], [0, 0])
@@ -8,6 +8,10 @@ urlpatterns = [
     path('pos/', views.pos_view, name='pos'),
     path('api/search-medication/', views.search_medication, name='search_medication'),
     path('api/create-sale/', views.create_sale, name='create_sale'),
+    path('api/cart/reserve/', views.reserve_stock, name='reserve_stock'),
+    path('api/cart/release/', views.release_cart, name='release_cart'),
+    path('api/checkout/metrics/', views.checkout_metrics, name='checkout_metrics'),
+    path('api/reports/revenue/', views.revenue_report, name='revenue_report'),
     
     # Ventes
     path('sales/', views.sale_list, name='sale_list'),
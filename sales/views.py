@@ -3,23 +3,35 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.db import DatabaseError
 from django.db.models import Q, Sum
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from pharmanps_alou.db_router import replica_reads
 from .models import Sale, SaleItem, Customer
-from medications.models import Medication
+from . import archive, checkout, documents, reporting
+from medications import reservations, stock_feed
+from medications.models import Category, Medication
 import json
+import uuid
 
 
 @login_required
 def pos_view(request):
     """Interface de Point de Vente (POS)"""
-    medications = Medication.objects.filter(quantity__gt=0)
+    medications = Medication.objects.filter(quantity__gt=0).with_available()
     customers = Customer.objects.all()
     
     context = {
         'medications': medications,
         'customers': customers,
+        # panier de cette page : jeton de ses réservations de stock
+        'cart_token': uuid.uuid4().hex,
+        # point de départ du flux des variations de stock
+        'stock_cursor': stock_feed.current_cursor(),
+        'stock_poll': stock_feed.POS_POLL,
     }
     return render(request, 'sales/pos.html', context)
 
@@ -35,7 +47,7 @@ def search_medication(request):
             Q(dci__icontains=query) |
             Q(barcode__icontains=query),
             quantity__gt=0
-        )[:10]
+        ).with_available()[:10]
         
         results = []
         for med in medications:
@@ -45,7 +57,9 @@ def search_medication(request):
                 'dci': med.dci,
                 'price': float(med.selling_price),
                 'quantity': med.quantity,
+                'available': med.available,
                 'image': med.image_display,
+                'thumbnail': (med.image_sources or {}).get('src', med.image_display),
             })
         
         return JsonResponse({'results': results})
@@ -67,59 +81,15 @@ def create_sale(request):
                     'message': "Le panier est vide."
                 }, status=400)
 
-            with transaction.atomic():
-                # 1) Regrouper les quantités demandées par médicament (au cas où
-                #    le même produit apparaîtrait deux fois dans le panier), afin
-                #    de valider le stock disponible de façon cumulative.
-                requested_quantities = {}
-                for item in items_data:
-                    try:
-                        qty = int(item['quantity'])
-                    except (TypeError, ValueError):
-                        raise ValueError("Quantité invalide dans le panier.")
-                    if qty <= 0:
-                        raise ValueError("Quantité invalide dans le panier.")
-                    med_id = item['medication_id']
-                    requested_quantities[med_id] = requested_quantities.get(med_id, 0) + qty
-
-                # 2) Verrouiller chaque médicament concerné et valider le stock
-                #    AVANT toute écriture, pour éviter la survente et les
-                #    conditions de course entre deux ventes simultanées.
-                medications_cache = {}
-                for med_id, total_qty in requested_quantities.items():
-                    medication = Medication.objects.select_for_update().get(id=med_id)
-                    if total_qty > medication.quantity:
-                        raise ValueError(
-                            f'Stock insuffisant pour "{medication.name}" '
-                            f'(disponible : {medication.quantity}, demandé : {total_qty}).'
-                        )
-                    medications_cache[str(med_id)] = medication
-
-                # 3) Créer la vente
-                sale = Sale.objects.create(
-                    customer_id=data.get('customer_id') if data.get('customer_id') else None,
-                    subtotal=data.get('subtotal', 0),
-                    discount_percentage=data.get('discount_percentage', 0),
-                    payment_method=data.get('payment_method'),
-                    amount_paid=data.get('amount_paid', 0),
-                    created_by=request.user,
-                    # Statut forcé à 'completee' lors de la finalisation
-                    status='completee',
-                )
-
-                # 4) Créer les lignes de vente (le stock est décrémenté dans StockMovement.save())
-                for item in items_data:
-                    medication = medications_cache[str(item['medication_id'])]
-                    SaleItem.objects.create(
-                        sale=sale,
-                        medication=medication,
-                        quantity=int(item['quantity']),
-                        unit_price=item['unit_price'],
-                    )
-
-                # 5) Mettre à jour le sous-total
-                sale.subtotal = sum(item.subtotal for item in sale.items.all())
-                sale.save()
+            # Verrouillage ordonné et reprise sur interblocage : voir sales/checkout.py
+            sale = checkout.with_retry(checkout.place_sale, data, request.user)
+
+            # Facture et détail rendus une fois pour toutes. La vente est déjà
+            # validée : en cas d'échec, ils seront rendus à la première consultation.
+            try:
+                documents.render_documents(sale)
+            except DatabaseError:
+                pass
 
             return JsonResponse({
                 'success': True,
@@ -134,6 +104,13 @@ def create_sale(request):
                 'message': "Un médicament du panier est introuvable."
             }, status=400)
 
+        except checkout.CheckoutConflict:
+            return JsonResponse({
+                'success': False,
+                'retry': True,
+                'message': "La caisse est très sollicitée : la vente n'a pas été enregistrée, veuillez réessayer."
+            }, status=503)
+
         except ValueError as e:
             return JsonResponse({
                 'success': False,
@@ -150,10 +127,58 @@ def create_sale(request):
 
 
 @login_required
+def reserve_stock(request):
+    """API : réserve pour le panier du POS la quantité d'un médicament (0 : libère)"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            cart = str(data['cart'])[:32]
+            medication_id = int(data['medication_id'])
+            quantity = int(data['quantity'])
+            if quantity < 0:
+                raise ValueError("Quantité invalide.")
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({'success': False, 'message': "Réservation invalide."}, status=400)
+
+        try:
+            available, expires_at = reservations.reserve(cart, medication_id, quantity, request.user)
+        except Medication.DoesNotExist:
+            return JsonResponse({'success': False, 'message': "Médicament introuvable."}, status=400)
+        except ValueError as e:
+            available = Medication.objects.with_available(exclude_cart=cart).filter(pk=medication_id).values_list('available', flat=True).first()
+            return JsonResponse({'success': False, 'message': str(e), 'available': max(available or 0, 0)}, status=400)
+
+        return JsonResponse({
+            'success': True,
+            'quantity': quantity,
+            'available': available,
+            'expires_at': expires_at.isoformat(),
+        })
+
+    return JsonResponse({'success': False}, status=400)
+
+
+@login_required
+def release_cart(request):
+    """API : libère les réservations d'un panier vidé ou abandonné (fetch ou sendBeacon)"""
+    if request.method == 'POST':
+        cart = request.POST.get('cart', '')
+        if not cart and request.body:
+            try:
+                cart = str(json.loads(request.body).get('cart', ''))
+            except (ValueError, AttributeError):
+                cart = ''
+        if cart:
+            return JsonResponse({'success': True, 'released': reservations.release(cart[:32])})
+    return JsonResponse({'success': False}, status=400)
+
+
+@login_required
+@replica_reads
 def sale_list(request):
     """Liste des ventes (Historique)"""
     # Filtrer UNIQUEMENT les ventes COMPLÉTÉES pour l'historique
-    sales = Sale.objects.filter(status='completee').order_by('-created_at')
+    sales = Sale.objects.for_listing().filter(status='completee').order_by('-created_at')
     
     # Filtres
     search = request.GET.get('search', '')
@@ -170,10 +195,26 @@ def sale_list(request):
     
     # Statistiques
     total_sales = sales.aggregate(total=Sum('total'))['total'] or 0
+
+    # Ventes archivées (sans client, hors base) : signalées, et comptées dans
+    # le total quand aucun filtre n'est actif
+    archived = None
+    if not date_filter:
+        archived = archive.summary()
+        if archived and not search:
+            total_sales += archived['revenue']
+    else:
+        try:
+            day = parse_date(date_filter)
+        except ValueError:
+            day = None
+        if day:
+            archived = archive.summary(day)
     
     context = {
         'sales': sales,
         'total_sales': total_sales,
+        'archived': archived,
         'search': search,
         'date_filter': date_filter,
     }
@@ -182,22 +223,32 @@ def sale_list(request):
 
 @login_required
 def sale_detail(request, pk):
-    """Détails d'une vente"""
+    """Détails d'une vente (rendu stocké pour les ventes finalisées)"""
     sale = get_object_or_404(Sale, pk=pk)
+    document = documents.get_documents(sale)
+    if document is None:
+        # Vente en cours : rendue à la volée, lignes préchargées
+        sale = Sale.objects.with_details().get(pk=pk)
     
     context = {
         'sale': sale,
+        'document': document,
     }
     return render(request, 'sales/sale_detail.html', context)
 
 
 @login_required
 def sale_invoice(request, pk):
-    """Générer une facture"""
+    """Générer une facture (rendu stocké pour les ventes finalisées)"""
     sale = get_object_or_404(Sale, pk=pk)
     
+    document = documents.get_documents(sale)
+    if document:
+        return HttpResponse(document.invoice_html)
+    
     context = {
-        'sale': sale,
+        # Vente en cours : rendue à la volée, lignes préchargées
+        'sale': Sale.objects.with_details().get(pk=pk),
     }
     return render(request, 'sales/invoice.html', context)
 
@@ -251,7 +302,7 @@ def customer_detail(request, pk):
     """Détails d'un client"""
     customer = get_object_or_404(Customer, pk=pk)
     # On filtre pour afficher uniquement les 10 dernières ventes complétées
-    sales = customer.sales.filter(status='completee').order_by('-created_at')[:10]
+    sales = customer.sales.for_listing().filter(status='completee').order_by('-created_at')[:10]
     
     # Statistiques: On agrège uniquement le total des ventes complétées
     total_spent = customer.sales.filter(status='completee').aggregate(total=Sum('total'))['total'] or 0
@@ -320,11 +371,62 @@ def customer_sales(request, pk):
     customer = get_object_or_404(Customer, pk=pk)
     
     # Récupère toutes les ventes complétées pour ce client
-    all_sales = customer.sales.filter(status='completee').order_by('-created_at')
+    all_sales = customer.sales.for_listing().filter(status='completee').order_by('-created_at')
     
     context = {
         'customer': customer,
         'sales': all_sales,
         'total_sales': all_sales.aggregate(total=Sum('total'))['total'] or 0,
     }
-    return render(request, 'sales/sale_list.html', context) # Utilisation temporaire de sale_list.html
\ No newline at end of file
+    return render(request, 'sales/sale_list.html', context) # Utilisation temporaire de sale_list.html
+
+
+@login_required
+@replica_reads
+def revenue_report(request):
+    """API de reporting : chiffre d'affaires sur une plage de dates quelconque, par axe"""
+    today = timezone.localdate()
+    start = parse_date(request.GET.get('start', '')) or today.replace(day=1)
+    end = parse_date(request.GET.get('end', '')) or today
+    dimension = request.GET.get('by', 'total')
+
+    if dimension not in reporting.DIMENSIONS:
+        return JsonResponse({
+            'success': False,
+            'message': f"Axe inconnu : {dimension}"
+        }, status=400)
+
+    rows = reporting.revenue_between(start, end, dimension)
+
+    # Libellés lisibles pour chaque valeur de l'axe
+    if dimension == 'payment_method':
+        labels = dict(Sale.PAYMENT_METHODS)
+    elif dimension == 'cashier':
+        labels = {str(pk): name for pk, name in User.objects.filter(pk__in=[k for k in rows if k]).values_list('pk', 'username')}
+    elif dimension == 'category':
+        labels = {str(pk): name for pk, name in Category.objects.filter(pk__in=[k for k in rows if k]).values_list('pk', 'name')}
+    else:
+        labels = {'': 'Total'}
+
+    results = []
+    for key, values in sorted(rows.items(), key=lambda kv: kv[1]['revenue'], reverse=True):
+        results.append({
+            'key': key,
+            'label': labels.get(key, key or 'Non renseigné'),
+            'revenue': float(values['revenue']),
+            'sales_count': values['sales_count'],
+            'quantity': values['quantity'],
+        })
+
+    return JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'by': dimension,
+        'results': results,
+    })
+
+
+@login_required
+def checkout_metrics(request):
+    """API : ventes encaissées, reprises sur conflit de verrous (par cause) et abandons"""
+    return JsonResponse(checkout.checkout_metrics())
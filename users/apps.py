@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # Réglages SQLite du mode durci, posés à chaque nouvelle connexion
+        from pharmanps_alou.sqlite import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='configure_sqlite')
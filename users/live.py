@@ -0,0 +1,106 @@
+"""
+Chiffres du tableau de bord en direct : API JSON interrogée par la page.
+
+Un instantané unique (chiffres du jour + derniers événements) est calculé au
+plus une fois toutes les LIVE_STATS_TTL secondes et partagé par tous les
+tableaux de bord ouverts via le cache du projet : le premier lecteur qui le
+trouve périmé prend un verrou (cache.add) et le recalcule, les autres servent
+l'instantané en place. Avec un cache partagé (REDIS_URL), le calcul est unique
+pour tous les workers ; avec le cache mémoire local, il l'est par processus.
+
+Le calcul ne fait que lire : les cumuls pré-calculés (sales.reporting ; le
+jour en cours, marqué par chaque vente, y est lu sur les ventes brutes) et
+le drapeau low_stock ; seuls les
+événements survenus depuis l'instantané précédent sont relus (nouvelles
+ventes, franchissements du seuil d'alerte). Chaque événement porte un numéro
+de version : la page interroge l'API toutes les LIVE_POLL secondes avec
+?since=<dernière version reçue> et ne reçoit que les événements plus récents.
+Pas de connexion longue : un worker gunicorn synchrone n'est tenu que le
+temps d'une requête courte.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+
+LIVE_STATS_TTL = 3          # secondes entre deux calculs de l'instantané
+LIVE_POLL = 10              # secondes entre deux interrogations de la page
+MAX_EVENTS = 50             # événements conservés dans l'instantané
+
+SNAPSHOT_KEY = 'live_stats:snapshot'
+LOCK_KEY = 'live_stats:lock'
+
+
+def compute_snapshot(previous=None):
+    """Nouvel instantané, à partir du précédent pour les événements"""
+    from medications.models import Medication
+    from sales import reporting
+    from sales.models import Customer, Sale
+
+    now = timezone.now()
+    today = timezone.localdate()
+    since = datetime.fromisoformat(previous['computed_at']) if previous else now - timedelta(minutes=5)
+    version = previous['version'] + 1 if previous else 1
+
+    day = reporting.daily_totals(today, today).get(today, {})
+
+    events = list(previous['events']) if previous else []
+    new_sales = (
+        Sale.objects
+        .filter(status='completee', created_at__gte=since, created_at__lt=now)
+        .order_by('created_at')
+        .values_list('sale_number', 'total')[:MAX_EVENTS]
+    )
+    events += [
+        {'version': version, 'type': 'sale', 'sale_number': number, 'total': float(total)}
+        for number, total in new_sales
+    ]
+    crossings = (
+        Medication.objects
+        .filter(low_stock_changed_at__gte=since, low_stock_changed_at__lt=now)
+        .order_by('low_stock_changed_at')
+        .values_list('id', 'name', 'quantity', 'low_stock')[:MAX_EVENTS]
+    )
+    events += [
+        {'version': version, 'type': 'low_stock', 'id': pk, 'name': name, 'quantity': quantity, 'low_stock': low}
+        for pk, name, quantity, low in crossings
+    ]
+
+    return {
+        'version': version,
+        'computed_at': now.isoformat(),
+        'stats': {
+            'total_sales_amount': float(day.get('revenue', 0)),
+            'total_sales': day.get('sales_count', 0),
+            'low_stock_count': Medication.objects.low_stock().count(),
+            'total_medications': Medication.objects.count(),
+            'total_customers': Customer.objects.count(),
+        },
+        'events': events[-MAX_EVENTS:],
+    }
+
+
+def get_snapshot():
+    """Instantané courant, recalculé par un seul lecteur à la fois quand il est périmé"""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot and time.time() - snapshot['_stored_at'] < LIVE_STATS_TTL:
+        return snapshot
+    # Un seul lecteur recalcule ; les autres servent l'instantané (même périmé)
+    if not cache.add(LOCK_KEY, 1, timeout=30):
+        return snapshot or compute_snapshot()
+    try:
+        snapshot = compute_snapshot(snapshot)
+        snapshot['_stored_at'] = time.time()
+        cache.set(SNAPSHOT_KEY, snapshot, timeout=None)
+    finally:
+        cache.delete(LOCK_KEY)
+    return snapshot
+
+
+def public(snapshot, since=0):
+    """Instantané sans les champs internes, avec les seuls événements plus récents que `since`"""
+    payload = {key: value for key, value in snapshot.items() if not key.startswith('_')}
+    payload['events'] = [event for event in snapshot['events'] if event['version'] > since]
+    return payload
@@ -0,0 +1,85 @@
+"""
+Mesure le nombre de requêtes SQL par requête HTTP authentifiée selon le
+mode de session (db, cached_db, signed_cookies), sur quelques pages et sur
+les API appelées en boucle par la caisse (recherche, sondage du stock) et par
+le tableau de bord.
+
+Chaque mode est mesuré avec le client de test de Django, connecté avec un
+utilisateur existant ; la première requête (cache froid) n'est pas comptée.
+
+Usage :  python manage.py profile_sessions [--username admin] [--requests 20]
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = "Compare les requêtes SQL par requête HTTP selon le backend de session."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="Utilisateur utilisé (défaut : premier superutilisateur actif).")
+        parser.add_argument('--requests', type=int, default=20, help="Requêtes mesurées par page (défaut : 20).")
+
+    def get_user(self, username):
+        users = User.objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.order_by('-is_superuser', 'pk').first()
+        if user is None:
+            raise CommandError("Aucun utilisateur actif trouvé.")
+        return user
+
+    def measure(self, mode, user, urls, count):
+        """Retourne {url: (requêtes SQL par appel, dont django_session)}"""
+        overrides = {
+            'SESSION_ENGINE': settings.SESSION_ENGINES[mode],
+            'MESSAGE_STORAGE': (
+                'django.contrib.messages.storage.fallback.FallbackStorage' if mode == 'db'
+                else 'django.contrib.messages.storage.cookie.CookieStorage'
+            ),
+            'ALLOWED_HOSTS': ['testserver'],
+        }
+        results = {}
+        with override_settings(**overrides):
+            client = Client()
+            client.force_login(user)
+            for url in urls:
+                client.get(url, secure=True)  # cache froid
+                with CaptureQueriesContext(connection) as context:
+                    for _ in range(count):
+                        client.get(url, secure=True)
+                session_queries = sum('django_session' in query['sql'] for query in context.captured_queries)
+                results[url] = (len(context) / count, session_queries / count)
+            client.logout()
+        return results
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        count = max(1, options['requests'])
+        urls = [
+            reverse('search_medication') + '?q=para',
+            reverse('stock_changes'),
+            reverse('dashboard_stats_api'),
+            reverse('dashboard'),
+            reverse('medication_list'),
+        ]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Requêtes SQL par requête HTTP ({count} appels par page, utilisateur {user.username})"
+        ))
+        baseline = None
+        for mode in ('db', 'cached_db', 'signed_cookies'):
+            results = self.measure(mode, user, urls, count)
+            marker = ' (actif)' if mode == settings.SESSION_MODE else ''
+            self.stdout.write(f"\n  {mode}{marker}")
+            for url, (total, session) in results.items():
+                saved = f"  ({baseline[url][0] - total:.1f} de moins qu'en db)" if baseline else ''
+                self.stdout.write(f"    {url:<32} {total:5.1f} requêtes  dont session {session:4.1f}{saved}")
+            baseline = baseline or results
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nMode actif : {settings.SESSION_MODE} ({settings.SESSION_ENGINE})"
+        ))
@@ -0,0 +1,121 @@
+"""
+Mesure le coût d'un démarrage à froid, comme sur l'instance gratuite Render
+qui se met en veille puis redémarre :
+
+  1. répartition du temps d'import par paquet (python -X importtime) ;
+  2. temps de chargement de l'application WSGI (settings + apps + URLs) ;
+  3. temps jusqu'au premier octet de la première réponse.
+
+Chaque mesure est faite dans un processus Python neuf, pour ne pas bénéficier
+des modules déjà chargés par cette commande.
+
+Usage :  python manage.py profile_startup [--url /health/] [--top 15] [--runs 3]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Script exécuté dans le processus neuf : charge l'application WSGI puis
+# sert une requête sans passer par le réseau, et affiche les temps en JSON.
+PROBE_SCRIPT = """
+import json, os, sys, time
+from io import BytesIO
+t0 = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmanps_alou.settings')
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+t1 = time.perf_counter()
+status = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '443', 'HTTP_HOST': 'localhost',
+    'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'https',
+    'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.version': (1, 0),
+    'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+}
+body = application(environ, lambda s, h, exc_info=None: status.append(s))
+next(iter(body), b'')
+t2 = time.perf_counter()
+print(json.dumps({
+    'wsgi_ms': (t1 - t0) * 1000,
+    'first_response_ms': (t2 - t1) * 1000,
+    'status': status[0] if status else None,
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Agrège la sortie de `-X importtime` par paquet racine.
+    Retourne {paquet: temps propre cumulé en µs}.
+    """
+    self_times = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            head, _, name = line.split('|', 2)
+            self_us = int(head.split(':')[1])
+        except ValueError:
+            continue
+        self_times[name.strip().split('.')[0]] += self_us
+    return dict(self_times)
+
+
+class Command(BaseCommand):
+    help = "Profile le démarrage à froid : temps d'import par paquet et temps jusqu'à la première réponse."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/health/', help="Chemin servi pour la première réponse (défaut : /health/).")
+        parser.add_argument('--top', type=int, default=15, help="Nombre de paquets affichés (défaut : 15).")
+        parser.add_argument('--runs', type=int, default=3, help="Nombre de démarrages mesurés (défaut : 3).")
+
+    def run_probe(self, url, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        command += ['-c', PROBE_SCRIPT, url]
+
+        start = time.perf_counter()
+        result = subprocess.run(
+            command, capture_output=True, text=True,
+            cwd=settings.BASE_DIR, env=os.environ.copy(),
+        )
+        total_ms = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise CommandError(f"Le processus de mesure a échoué :\n{result.stderr[-2000:]}")
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings['process_ms'] = total_ms
+        return timings, result.stderr
+
+    def handle(self, *args, **options):
+        url = options['url']
+
+        # 1) Répartition des imports (un run dédié : importtime ralentit le processus)
+        _, stderr = self.run_probe(url, importtime=True)
+        packages = parse_importtime(stderr)
+        total_self = sum(packages.values()) or 1
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Temps d'import par paquet (temps propre cumulé)"))
+        ranking = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)
+        for root, self_us in ranking[:options['top']]:
+            self.stdout.write(f"  {root:<28} {self_us / 1000:8.1f} ms  ({self_us * 100 / total_self:4.1f} %)")
+        self.stdout.write(f"  {'TOTAL':<28} {total_self / 1000:8.1f} ms")
+
+        # 2) Démarrages « propres » (sans importtime) pour les temps réels
+        runs = [self.run_probe(url)[0] for _ in range(max(1, options['runs']))]
+        best = min(runs, key=lambda r: r['process_ms'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nDémarrage à froid ({len(runs)} runs, meilleur run)"))
+        self.stdout.write(f"  Chargement WSGI (settings, apps, URLs) : {best['wsgi_ms']:8.1f} ms")
+        self.stdout.write(f"  Première réponse {url} ({best['status']}) : {best['first_response_ms']:8.1f} ms")
+        self.stdout.write(f"  Processus complet (interpréteur inclus) : {best['process_ms']:8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"Temps jusqu'au premier octet : {best['wsgi_ms'] + best['first_response_ms']:.1f} ms"
+        ))
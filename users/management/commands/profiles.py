@@ -0,0 +1,95 @@
+"""
+Liste et agrège les profils enregistrés par SamplingProfilerMiddleware
+(voir pharmanps_alou/profiling.py).
+
+  - sans option : un profil par ligne (vue, statut, temps total / CPU / SQL) ;
+  - --aggregate : par vue, durées médiane et p95, puis fonctions les plus
+    coûteuses (temps propre et temps inclusif, en échantillons) ;
+  - --collapsed FICHIER : piles fusionnées au format « collapsed »
+    (une ligne "cadre;cadre;... nombre"), à ouvrir avec flamegraph.pl ou
+    https://www.speedscope.app.
+
+Usage :  python manage.py profiles [--url-name create_sale] [--aggregate] [--top 20] [--collapsed out.txt]
+"""
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pharmanps_alou.profiling import load_profiles
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = "Liste et agrège les profils échantillonnés (sortie compatible flame graph)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url-name', help="Ne garder que les profils de cette vue.")
+        parser.add_argument('--aggregate', action='store_true', help="Résumé par vue et fonctions les plus coûteuses.")
+        parser.add_argument('--top', type=int, default=20, help="Nombre de fonctions affichées (défaut : 20).")
+        parser.add_argument('--collapsed', metavar='FICHIER', help="Écrit les piles fusionnées au format collapsed.")
+
+    def handle(self, *args, **options):
+        profiles = load_profiles(options['url_name'])
+        if not profiles:
+            raise CommandError("Aucun profil enregistré (PROFILE_URL_NAMES / PROFILE_DIR).")
+
+        if options['aggregate']:
+            self.aggregate(profiles, options['top'])
+        else:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{'Fichier':<59} {'Vue':<18} {'HTTP':>4} {'Total':>9} {'CPU':>9} {'SQL':>12} {'Éch.':>5}"
+            ))
+            for profile in profiles:
+                meta = profile['meta']
+                self.stdout.write(
+                    f"{meta['file']:<59} {meta['url_name']:<18} {meta['status']:>4} "
+                    f"{meta['wall_ms']:>7.1f}ms {meta['cpu_ms']:>7.1f}ms "
+                    f"{meta['sql_count']:>3}/{meta['sql_ms']:>6.1f}ms {meta['samples']:>5}"
+                )
+
+        if options['collapsed']:
+            stacks = Counter()
+            for profile in profiles:
+                stacks.update(profile['stacks'])
+            with open(options['collapsed'], 'w', encoding='utf-8') as output:
+                for stack, count in stacks.most_common():
+                    output.write(f"{stack} {count}\n")
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(stacks)} pile(s) distincte(s) de {len(profiles)} profil(s) écrites dans {options['collapsed']}"
+            ))
+
+    def aggregate(self, profiles, top):
+        by_view = defaultdict(list)
+        for profile in profiles:
+            by_view[profile['meta']['url_name']].append(profile['meta'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Par vue"))
+        for url_name, metas in sorted(by_view.items()):
+            walls = [meta['wall_ms'] for meta in metas]
+            self.stdout.write(
+                f"  {url_name:<20} {len(metas):>4} profil(s)  médiane {percentile(walls, 0.5):7.1f} ms  "
+                f"p95 {percentile(walls, 0.95):7.1f} ms  "
+                f"CPU moyen {sum(meta['cpu_ms'] for meta in metas) / len(metas):6.1f} ms  "
+                f"SQL moyen {sum(meta['sql_ms'] for meta in metas) / len(metas):6.1f} ms "
+                f"({sum(meta['sql_count'] for meta in metas) / len(metas):.0f} requêtes)"
+            )
+
+        own, inclusive = Counter(), Counter()
+        for profile in profiles:
+            for stack, count in profile['stacks'].items():
+                frames = stack.split(';')
+                own[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+        total = sum(own.values()) or 1
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nTemps propre ({total} échantillons)"))
+        for frame, count in own.most_common(top):
+            self.stdout.write(f"  {count * 100 / total:5.1f} %  {frame}")
+        self.stdout.write(self.style.MIGRATE_HEADING("\nTemps inclusif"))
+        for frame, count in inclusive.most_common(top):
+            self.stdout.write(f"  {count * 100 / total:5.1f} %  {frame}")
@@ -0,0 +1,99 @@
+"""
+Navigation par date de l'admin sans SELECT DISTINCT sur la table.
+
+Remplace le tag date_hierarchy de Django pour les grandes tables (voir
+pharmanps_alou/large_tables.py) : seules les bornes MIN/MAX sont lues (index
+sur le champ daté), les mois et les jours sont ensuite générés.
+"""
+import calendar
+import datetime
+
+from django import template
+from django.contrib.admin.utils import get_fields_from_path
+from django.db import models
+from django.utils import formats, timezone
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def light_date_hierarchy(cl):
+    field_name = cl.date_hierarchy
+    field = get_fields_from_path(cl.model, field_name)[-1]
+    year_field = f'{field_name}__year'
+    month_field = f'{field_name}__month'
+    day_field = f'{field_name}__day'
+    year_lookup = cl.params.get(year_field)
+    month_lookup = cl.params.get(month_field)
+    day_lookup = cl.params.get(day_field)
+
+    # Paramètres saisis à la main (?created_at__year=abc) : retour à la liste des années
+    try:
+        if year_lookup and month_lookup and day_lookup:
+            datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        elif year_lookup and month_lookup:
+            datetime.date(int(year_lookup), int(month_lookup), 1)
+        elif year_lookup:
+            datetime.date(int(year_lookup), 1, 1)
+    except (TypeError, ValueError):
+        year_lookup = month_lookup = day_lookup = None
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{field_name}__'])
+
+    if year_lookup and month_lookup and day_lookup:
+        day = datetime.date(int(year_lookup), int(month_lookup), int(day_lookup))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year_lookup, month_field: month_lookup}),
+                'title': capfirst(formats.date_format(day, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT'))}],
+        }
+
+    if year_lookup and month_lookup:
+        year, month = int(year_lookup), int(month_lookup)
+        days = [datetime.date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year_lookup}), 'title': str(year_lookup)},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month_lookup, day_field: day.day}),
+                    'title': capfirst(formats.date_format(day, 'MONTH_DAY_FORMAT')),
+                }
+                for day in days
+            ],
+        }
+
+    if year_lookup:
+        months = [datetime.date(int(year_lookup), month, 1) for month in range(1, 13)]
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [
+                {
+                    'link': link({year_field: year_lookup, month_field: month.month}),
+                    'title': capfirst(formats.date_format(month, 'YEAR_MONTH_FORMAT')),
+                }
+                for month in months
+            ],
+        }
+
+    # Premier niveau : les années entre la plus ancienne et la plus récente ligne
+    bounds = cl.queryset.order_by().aggregate(first=models.Min(field_name), last=models.Max(field_name))
+    if not (bounds['first'] and bounds['last']):
+        return {'show': False}
+    if isinstance(field, models.DateTimeField):
+        bounds = {key: timezone.localtime(value) if timezone.is_aware(value) else value for key, value in bounds.items()}
+    return {
+        'show': True,
+        'back': None,
+        'choices': [
+            {'link': link({year_field: str(year)}), 'title': str(year)}
+            for year in range(bounds['last'].year, bounds['first'].year - 1, -1)
+        ],
+    }
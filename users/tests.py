@@ -1,3 +1,70 @@
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from medications.models import Category
+from pharmanps_alou.large_tables import estimated_row_count
+from sales.models import Sale
+from .management.commands import profile_sessions
+from .templatetags.admin_dates import light_date_hierarchy
+
+
+class LargeTableAdminTests(TestCase):
+    """Total estimé et navigation par date des grandes tables de l'admin"""
+
+    def changelist(self, **params):
+        return SimpleNamespace(
+            date_hierarchy='created_at', model=Sale, params=params, queryset=Sale.objects.all(),
+            get_query_string=lambda new_params, remove: '?',
+        )
+
+    def test_invalid_date_params_fall_back_to_year_list(self):
+        for params in (
+            {'created_at__year': 'abc'},
+            {'created_at__year': '2025', 'created_at__month': '13'},
+            {'created_at__year': '2025', 'created_at__month': '2', 'created_at__day': '31'},
+        ):
+            with self.subTest(params=params):
+                context = light_date_hierarchy(self.changelist(**params))
+                self.assertEqual(context, {'show': False})
+
+    def test_sqlite_estimate_follows_deletions(self):
+        cache.clear()
+        categories = [Category.objects.create(name=f'Catégorie {i}') for i in range(3)]
+        Category.objects.filter(pk__in=[category.pk for category in categories[:2]]).delete()
+        self.assertEqual(estimated_row_count(Category), 1)
+
+
+class SessionModeTests(TestCase):
+    """Coût en requêtes des modes de session (profile_sessions)"""
+
+    def test_cookie_modes_skip_the_session_query(self):
+        user = User.objects.create_superuser('admin', password='x')
+        urls = [reverse('stock_changes'), reverse('dashboard_stats_api')]
+        command = profile_sessions.Command()
+        for mode, session_queries in (('db', 1), ('cached_db', 0), ('signed_cookies', 0)):
+            with self.subTest(mode=mode):
+                results = command.measure(mode, user, urls, 2)
+                self.assertEqual([session for _, session in results.values()], [session_queries] * len(urls))
+
+
+class DashboardTests(TestCase):
+    """Le tableau de bord ne fait que lire"""
 
-# Create your tests here.
+    def test_dashboard_writes_nothing(self):
+        user = User.objects.create_user('caisse', password='x')
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('dashboard'), secure=True)
+        self.assertEqual(response.status_code, 200)
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+            and 'django_session' not in query['sql']
+        ]
+        self.assertEqual(writes, [])
@@ -6,4 +6,5 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
+    path('api/dashboard/stats/', views.dashboard_stats_api, name='dashboard_stats_api'),
 ]
\ No newline at end of file
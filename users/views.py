@@ -1,12 +1,15 @@
 from django.shortcuts import render, redirect
+from django.http import JsonResponse
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from django.db.models import Sum, F
 from django.utils import timezone
+from datetime import timedelta
+from pharmanps_alou.db_router import replica_reads
+from . import live
 
 
 def login_view(request):
@@ -84,75 +87,63 @@ def logout_view(request):
 
 
 @login_required
+@replica_reads
 def dashboard_view(request):
     """Vue du tableau de bord"""
     from medications.models import Medication
-    from sales.models import Sale, Customer
+    from sales.models import Customer
     
     # Statistiques médicaments
     total_medications = Medication.objects.count()
-    low_stock_count = Medication.objects.filter(quantity__lte=F('min_quantity')).count()
+    low_stock_count = Medication.objects.low_stock().count()
     
-    # Statistiques ventes (aujourd'hui)
-    today = timezone.now().date()
-    today_sales = Sale.objects.filter(created_at__date=today, status='completee')
-    total_sales_today = today_sales.aggregate(total=Sum('total'))['total'] or 0
-    sales_count_today = today_sales.count()
+    # Statistiques ventes (aujourd'hui) — lues dans les cumuls pré-calculés
+    # (jours pas encore recalculés lus sur les ventes, voir sales/reporting.py)
+    from sales import reporting
+    today = timezone.localdate()
+    jours = reporting.daily_totals(today - timedelta(days=6), today)
+    aujourd_hui = jours.get(today, {})
+    total_sales_today = aujourd_hui.get('revenue', 0)
+    sales_count_today = aujourd_hui.get('sales_count', 0)
     
     # Statistiques clients
     total_customers = Customer.objects.count()
 
     # --- Données pour les graphiques ---
     import json
-    from datetime import timedelta
-    from sales.models import SaleItem
 
     # 1) Évolution des ventes sur les 7 derniers jours
     labels_jours = []
     donnees_ventes = []
     for i in range(6, -1, -1):
         jour = today - timedelta(days=i)
-        total_jour = Sale.objects.filter(
-            created_at__date=jour, status='completee'
-        ).aggregate(total=Sum('total'))['total'] or 0
         labels_jours.append(jour.strftime('%d/%m'))
-        donnees_ventes.append(float(total_jour))
-
-    # 2) Top 5 des médicaments les plus vendus (par quantité)
-    from django.db.models import Sum as SumAgg
-    top_items = (
-        SaleItem.objects
-        .values('medication__name')
-        .annotate(qte=SumAgg('quantity'))
-        .order_by('-qte')[:5]
-    )
-    labels_produits = [t['medication__name'] for t in top_items]
-    donnees_produits = [int(t['qte']) for t in top_items]
+        donnees_ventes.append(float(jours.get(jour, {}).get('revenue', 0)))
 
-    # --- Cumuls du chiffre d'affaires par période (ventes complétées) ---
-    from datetime import timedelta as _td
-    ventes_ok = Sale.objects.filter(status='completee')
+    # 2) Top 5 des médicaments les plus vendus sur 30 jours (compteurs glissants,
+    # recalculés par la commande refresh_sales_counters : la page ne fait que lire)
+    top_items = reporting.top_sellers(window=30, limit=5)
+    labels_produits = [t.medication.name for t in top_items]
+    donnees_produits = [t.quantity_30d for t in top_items]
 
-    debut_semaine = today - _td(days=today.weekday())   # lundi de cette semaine
+    # --- Cumuls du chiffre d'affaires par période (ventes complétées) ---
+    debut_semaine = today - timedelta(days=today.weekday())   # lundi de cette semaine
     debut_mois = today.replace(day=1)
 
-    ca_jour = ventes_ok.filter(created_at__date=today).aggregate(t=Sum('total'))['t'] or 0
-    ca_semaine = ventes_ok.filter(created_at__date__gte=debut_semaine).aggregate(t=Sum('total'))['t'] or 0
-    ca_mois = ventes_ok.filter(created_at__date__gte=debut_mois).aggregate(t=Sum('total'))['t'] or 0
-    ca_total = ventes_ok.aggregate(t=Sum('total'))['t'] or 0
+    ca_jour = total_sales_today
+    ca_semaine = reporting.total_between(debut_semaine, today)
+    ca_mois = reporting.total_between(debut_mois, today)
+    ca_total = reporting.total_between(reporting.first_sale_date(), today)
 
     # Détail jour par jour des 7 derniers jours (pour le tableau récapitulatif)
     recap_jours = []
-    for i in range(6, -1, -1):
-        jour = today - _td(days=i)
-        montant = ventes_ok.filter(created_at__date=jour).aggregate(t=Sum('total'))['t'] or 0
-        nb = ventes_ok.filter(created_at__date=jour).count()
+    for i in range(7):
+        jour = today - timedelta(days=i)  # plus récent en premier
         recap_jours.append({
             'date': jour.strftime('%d/%m/%Y'),
-            'montant': float(montant),
-            'nombre': nb,
+            'montant': float(jours.get(jour, {}).get('revenue', 0)),
+            'nombre': jours.get(jour, {}).get('sales_count', 0),
         })
-    recap_jours.reverse()  # plus récent en premier
 
     context = {
         'total_medications': total_medications,
@@ -171,5 +162,17 @@ def dashboard_view(request):
         'ca_mois': ca_mois,
         'ca_total': ca_total,
         'recap_jours': recap_jours,
+        # intervalle d'interrogation de l'API des chiffres en direct
+        'live_poll': live.LIVE_POLL,
     }
-    return render(request, 'users/dashboard.html', context)
\ No newline at end of file
+    return render(request, 'users/dashboard.html', context)
+
+
+@login_required
+def dashboard_stats_api(request):
+    """API : chiffres du tableau de bord (instantané partagé, voir users/live.py)"""
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        since = 0
+    return JsonResponse(live.public(live.get_snapshot(), since))